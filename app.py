@@ -1,59 +1,97 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_from_directory, flash
+from flask import Flask, Blueprint, current_app, render_template, request, jsonify, redirect, url_for, session, send_from_directory, flash, g, has_request_context, make_response
+import functools
+import hashlib
 import json
+import math
 import os
 from datetime import datetime, date, timedelta
 import re
 import uuid
-from flask_mail import Mail, Message
+import smtplib
+import socket
 from dotenv import load_dotenv
 from models.topic import Topic
 from models.resource import Resource
 from models.test import Test
+from services.storage import VersionConflict, create_storage, document_version
+from services.sqlite_storage import SqliteStorage, migrate_storage
+from services import dashboard, file_service, past_test_summaries, reminders, resource_index, subject_manifest
+from services.test_service import progress_percentage, required_resources, resource_scores
+from services.unit_of_work import UnitOfWork
+from services.email_outbox import EmailOutbox, OutboxWorker
+from services.reminders import ReminderSchedule, ReminderScheduler
+import click
+import threading
 import time
 
-load_dotenv()
-
 # Configuration
 SUBJECTS_FILE = 'subjects_data.json'
 DETAILS_DIR = 'subject_details'
 STATIC_DIR = 'static'
 PROGRESS_DIR = 'progress_records'
+META_DIR = 'meta'
+SUBJECT_DATA_DIR = 'subjects'
+
+# Fold a test's progress log back into its records file once it grows past this size
+PROGRESS_LOG_COMPACT_BYTES = 256 * 1024
 
 # Default subjects to use if file doesn't exist
 DEFAULT_SUBJECTS = ['Math', 'Science', 'History', 'English']
 
 def ensure_file_structure():
-    """Ensure all required directories exist and create them if they don't"""
+    """Ensure all required directories exist and create them if they don't (once per app)"""
+    state = app_state()
+    if state.file_structure_ready:
+        return True
+
     # Required directories
+    config = current_app.config
     dirs = [
-        DETAILS_DIR,     # subject_details
-        STATIC_DIR,      # static
-        PROGRESS_DIR,    # progress_records
+        config['DATA_DIR'],          # data directory
+        config['DETAILS_DIR'],       # subject_details
+        current_app.static_folder,   # static
+        config['PROGRESS_DIR'],      # progress_records
+        config['META_DIR'],          # meta (indexes)
+        config['SUBJECT_DATA_DIR'],  # subjects (one directory per subject)
     ]
     
-    # Create directories if they don't exist
+    # Create directories if they don't exist (several workers may start at once)
     for directory in dirs:
         if not os.path.exists(directory):
-            os.makedirs(directory)
+            os.makedirs(directory, exist_ok=True)
             print(f"Created directory: {directory}")
     
-    # Check if subjects file exists, create it if not
-    if not os.path.exists(SUBJECTS_FILE):
+    # Check if a subject list exists, create it if not
+    storage = get_storage()
+    if not storage.has_subjects():
         save_subjects(DEFAULT_SUBJECTS)
-        print(f"Created subjects file with default subjects: {SUBJECTS_FILE}")
+        print(f"Created subject list with default subjects: {DEFAULT_SUBJECTS}")
         
-        # Also create empty subject details files for each default subject
+        # Also create empty subject details for each default subject
         for subject in DEFAULT_SUBJECTS:
-            if not os.path.exists(get_subject_details_file(subject)):
+            if not storage.has_subject_details(subject):
                 save_subject_details(subject, {"resources": [], "tests": [], "study_materials": []})
                 print(f"Created empty details file for subject: {subject}")
     
+    state.file_structure_ready = True
     return True
 
-# Initialize the app
-app = Flask(__name__, static_folder='static')
-app.secret_key = 'your_secret_key'  # Required for session
+# Data files and directories, placed under DATA_DIR unless configured on their own
+DATA_PATHS = {
+    'SUBJECTS_FILE': SUBJECTS_FILE,
+    'DETAILS_DIR': DETAILS_DIR,
+    'PROGRESS_DIR': PROGRESS_DIR,
+    'META_DIR': META_DIR,
+    'SUBJECT_DATA_DIR': SUBJECT_DATA_DIR,
+    'SQLITE_PATH': 'neko_study_quest.db',
+    'EMAIL_OUTBOX_PATH': 'email_outbox.db',
+}
+
+# Routes, hooks and commands; create_app registers them on each app. There is no
+# module-level app, so the commands run against wsgi.py's: flask --app wsgi <command>
+# (or flask --app "app:create_app()" <command>, without setting up the data files)
+bp = Blueprint('main', __name__, cli_group=None)
 
 # Add custom strptime filter
 def strptime_filter(date_str, format_str):
@@ -63,69 +101,382 @@ def strptime_filter(date_str, format_str):
         return None
 
 # Register the strptime filter
-app.jinja_env.filters['strptime'] = strptime_filter
+bp.add_app_template_filter(strptime_filter, 'strptime')
 
 # Make timedelta available in templates
-app.jinja_env.globals['timedelta'] = timedelta
-
-# Email configuration
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_MAX_EMAILS'] = 100  # Limit number of emails sent in a single connection
-app.config['MAIL_SUPPRESS_SEND'] = False  # Set to True in testing environment
-app.config['MAIL_ASCII_ATTACHMENTS'] = False  # Allow UTF-8 attachments
-
-# Initialize Mail with error handling
-try:
-    mail = Mail(app)
-except Exception as e:
-    print(f"Error initializing email configuration: {str(e)}")
-    mail = None
+bp.add_app_template_global(timedelta, 'timedelta')
+
+
+def default_config():
+    """The configuration every app starts from, read from the environment and .env"""
+    load_dotenv()
+    return {
+        # Where the study data lives
+        'DATA_DIR': os.getenv('DATA_DIR', '.'),
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'your_secret_key'),  # Required for session
+
+        # Storage configuration ('json' files or a 'sqlite' database)
+        'STORAGE_BACKEND': os.getenv('STORAGE_BACKEND', 'json'),
+        'SQLITE_PATH': os.getenv('SQLITE_PATH'),
+        'PROGRESS_LOG_COMPACT_BYTES': PROGRESS_LOG_COMPACT_BYTES,
+        # Parsed JSON documents the app's JSON storage keeps in memory
+        'JSON_CACHE_SIZE': int(os.getenv('JSON_CACHE_SIZE', file_service.JSON_CACHE_SIZE)),
+
+        # Email configuration
+        'MAIL_SERVER': os.getenv('MAIL_SERVER', 'smtp.gmail.com'),
+        'MAIL_PORT': int(os.getenv('MAIL_PORT', 587)),
+        'MAIL_USE_TLS': os.getenv('MAIL_USE_TLS', 'true').lower() == 'true',
+        'MAIL_USERNAME': os.getenv('MAIL_USERNAME'),
+        'MAIL_PASSWORD': os.getenv('MAIL_PASSWORD'),
+        'MAIL_DEFAULT_SENDER': os.getenv('MAIL_USERNAME'),
+        'MAIL_MAX_EMAILS': 100,  # Limit number of emails sent in a single connection
+        'MAIL_SUPPRESS_SEND': False,  # Set to True in testing environment
+        'MAIL_ASCII_ATTACHMENTS': False,  # Allow UTF-8 attachments
+
+        # Outgoing emails are queued here and sent by a background thread
+        'EMAIL_OUTBOX_PATH': os.getenv('EMAIL_OUTBOX_PATH'),
+        'EMAIL_OUTBOX_MAX_ATTEMPTS': 5,  # Dead-letter a message after this many failed sends
+        'EMAIL_OUTBOX_RETRY_DELAY': 30,  # Seconds before the first retry; doubles on each failure
+        'EMAIL_OUTBOX_POLL_INTERVAL': int(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', 30)),
+        'EMAIL_OUTBOX_BATCH_SIZE': int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100)),
+
+        # Send test reminders from a background thread instead of waiting for /check-upcoming-tests
+        'REMINDER_SCHEDULER_ENABLED': os.getenv('REMINDER_SCHEDULER_ENABLED', 'true').lower() == 'true',
+        'REMINDER_POLL_INTERVAL': int(os.getenv('REMINDER_POLL_INTERVAL', 60 * 60)),
+
+        # Load the data and compile the templates in a background thread when the app is created
+        'PREWARM_CACHES': os.getenv('PREWARM_CACHES', 'false').lower() == 'true',
+    }
+
+
+class AppState:
+    """
+    What one app keeps between requests: its storage backend, email outbox,
+    reminder schedule, background threads and cached listings. Mail, storage
+    and threads are created on first use, so each worker process gets its own.
+    """
+
+    def __init__(self):
+        self.file_structure_ready = False
+        self.mail = None
+        self.storage = None
+        self.outbox = None
+        self.outbox_worker = None
+        self.outbox_lock = threading.Lock()
+        self.reminder_schedule = ReminderSchedule()
+        self.reminder_scheduler = None
+        self.reminder_lock = threading.Lock()
+        self.timer_resources = None
+        self.dashboard = None
+
+
+def app_state():
+    """Return the current app's AppState"""
+    return current_app.extensions['neko_study_quest']
+
+
+def with_app_context(func):
+    """Wrap func to run inside the current app's context, for use from background threads"""
+    app = current_app._get_current_object()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def create_app(config=None):
+    """
+    Create an app from default_config() updated with config. Apps don't share
+    data, so several can run side by side in one process with different DATA_DIRs.
+    """
+    app = Flask(__name__, static_folder='static')
+    app.config.update(default_config())
+    app.config.update(config or {})
+
+    for key, name in DATA_PATHS.items():
+        if not app.config.get(key):
+            app.config[key] = os.path.normpath(os.path.join(app.config['DATA_DIR'], name))
+
+    # Storage writes land here before ensure_file_structure has run
+    os.makedirs(app.config['DATA_DIR'], exist_ok=True)
+
+    app.extensions['neko_study_quest'] = AppState()
+    app.register_blueprint(bp)
+
+    if app.config['PREWARM_CACHES']:
+        with app.app_context():
+            threading.Thread(target=with_app_context(prewarm_caches), name='cache-prewarm', daemon=True).start()
+
+    return app
+
+
+def prewarm_caches():
+    """
+    Load what the first pages need (subject details, progress totals, rollups,
+    the timer listing) and compile the page templates, so the first requests
+    after a start find them cached.
+    """
+    start = time.perf_counter()
+    try:
+        subjects = load_subjects()
+        for subject_name in subjects:
+            for test in load_subject_details(subject_name).get('tests', []):
+                load_progress_aggregates(subject_name, test['id'])
+        load_subject_manifest(subjects)
+        load_dashboard(subjects)
+        load_past_test_summaries()
+        load_resource_index()
+        load_timer_resources()
+
+        jinja_env = current_app.jinja_env
+        for template_name in jinja_env.list_templates(extensions=['html']):
+            jinja_env.get_template(template_name)
+    except Exception as e:
+        print(f"Error pre-warming caches: {str(e)}")
+        return
+
+    print(f"Pre-warmed caches for {len(subjects)} subjects in {time.perf_counter() - start:.2f}s")
+
+
+def get_mail():
+    """Return the app's Flask-Mail instance, setting it up on first use (None if that fails)"""
+    state = app_state()
+    if state.mail is None:
+        # Imported here so starting the app doesn't load the email packages
+        from flask_mail import Mail
+
+        # Initialize Mail with error handling
+        try:
+            state.mail = Mail(current_app._get_current_object())
+        except Exception as e:
+            print(f"Error initializing email configuration: {str(e)}")
+    return state.mail
 
 def validate_email_config():
     """Validate email configuration and return status"""
-    if not app.config['MAIL_USERNAME'] or not app.config['MAIL_PASSWORD']:
+    if not current_app.config['MAIL_USERNAME'] or not current_app.config['MAIL_PASSWORD']:
         return False, "Email configuration is incomplete. Please check MAIL_USERNAME and MAIL_PASSWORD in .env file."
     
     try:
-        with mail.connect() as conn:
+        with get_mail().connect() as conn:
             return True, "Email configuration is valid and connection successful."
     except Exception as e:
         return False, f"Email configuration error: {str(e)}"
 
-def send_email_with_retry(subject, recipients, html_body, max_retries=3, retry_delay=1):
-    """Send an email with retry mechanism"""
-    if not mail:
-        flash("Email service is not configured properly.", "error")
-        return False
+def get_outbox():
+    """Return the persistent email outbox, creating it on first use"""
+    state = app_state()
+    with state.outbox_lock:
+        if state.outbox is None:
+            state.outbox = EmailOutbox(current_app.config['EMAIL_OUTBOX_PATH'],
+                                       max_attempts=current_app.config['EMAIL_OUTBOX_MAX_ATTEMPTS'],
+                                       base_delay=current_app.config['EMAIL_OUTBOX_RETRY_DELAY'])
+        return state.outbox
 
-    for attempt in range(max_retries):
+
+def deliver_emails(messages):
+    """
+    Send a batch of queued messages over one SMTP connection (Flask-Mail reconnects
+    every MAIL_MAX_EMAILS messages). Returns {message id: error, or None if sent}.
+    """
+    results = {}
+    remaining = list(messages)
+
+    while remaining:
+        unsent = len(remaining)
         try:
-            msg = Message(
-                subject=subject,
-                recipients=recipients,
-                html=html_body,
-                sender=app.config['MAIL_USERNAME']
-            )
-            mail.send(msg)
-            return True
+            with get_mail().connect() as connection:
+                send_over_connection(connection, remaining, results)
         except Exception as e:
-            print(f"Email send attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                flash(f"Failed to send email after {max_retries} attempts: {str(e)}", "error")
-                return False
+            if len(remaining) == unsent:
+                # No connection means none of the remaining messages can go out
+                for message in remaining:
+                    results[message['id']] = str(e)
+                break
+            # Closing a connection that dropped fails as well; carry on with a fresh one
+
+    return results
+
+
+def send_over_connection(connection, remaining, results):
+    """Send messages from the front of remaining until there are none left or the connection drops"""
+    from flask_mail import Message
+
+    while remaining:
+        message = remaining.pop(0)
+        try:
+            connection.send(Message(
+                subject=message['subject'],
+                recipients=message['recipients'],
+                html=message['html'],
+                sender=current_app.config['MAIL_USERNAME']
+            ))
+            results[message['id']] = None
+        except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout) as e:
+            results[message['id']] = str(e)
+            # The connection dropped
+            return
+        except smtplib.SMTPResponseException as e:
+            results[message['id']] = str(e)
+            if e.smtp_code == 421:
+                # The server is closing the connection
+                return
+        except Exception as e:
+            # e.g. refused recipients (SMTPRecipientsRefused) - the connection is still usable
+            results[message['id']] = str(e)
+
+
+def start_outbox_worker():
+    """Start the background thread that sends queued emails, if it isn't running yet"""
+    state = app_state()
+    outbox = get_outbox()
+    with state.outbox_lock:
+        if state.outbox_worker is None or not state.outbox_worker.is_alive():
+            state.outbox_worker = OutboxWorker(outbox, with_app_context(deliver_emails),
+                                               poll_interval=current_app.config['EMAIL_OUTBOX_POLL_INTERVAL'],
+                                               batch_size=current_app.config['EMAIL_OUTBOX_BATCH_SIZE'])
+            state.outbox_worker.start()
+        return state.outbox_worker
+
+
+def queue_email(subject, recipients, html_body):
+    """Queue an email for the background sender, which retries failures with backoff"""
+    if not get_mail():
+        if has_request_context():
+            flash("Email service is not configured properly.", "error")
+        return False
+
+    try:
+        get_outbox().enqueue(subject, recipients, html_body)
+    except Exception as e:
+        print(f"Error queueing email: {str(e)}")
+        if has_request_context():
+            flash(f"Failed to queue email: {str(e)}", "error")
+        return False
+
+    start_outbox_worker().notify()
+    return True
+
+def schedule_reminders(subject_name, details=None):
+    """Put a subject's test dates in the reminder schedule, or take the subject out if details is None"""
+    state = app_state()
+    if details is None:
+        state.reminder_schedule.remove_subject(subject_name)
+        return
+
+    state.reminder_schedule.set_subject(subject_name, subject_manifest.manifest_entries(details.get('tests', [])))
+    if state.reminder_scheduler is not None:
+        state.reminder_scheduler.notify()
+
+
+def send_due_reminders(due):
+    """
+    Queue the reminder emails the scheduler found due and record them as sent.
+    Returns (number queued, the due reminders that couldn't be queued).
+    """
+    # After some downtime a test can have several reminders due; only one is sent
+    by_test = {}
+    for subject_name, test_id, days, entry in due:
+        by_test.setdefault((subject_name, test_id), (entry, []))[1].append(days)
+
+    # Claim the reminders before queueing them: the record is updated with a compare-and-swap,
+    # so the scheduler and /check-upcoming-tests (in this or another process) never both send one
+    claimed = []
+
+    def claim(sent):
+        sent = sent or reminders.empty_sent_reminders()
+        claimed.clear()
+        for (subject_name, test_id), (entry, days_due) in by_test.items():
+            if any(reminders.was_sent(sent, subject_name, test_id, entry['date'], days) for days in days_due):
+                continue
+            for days in days_due:
+                reminders.mark_sent(sent, subject_name, test_id, entry['date'], days)
+            claimed.append((subject_name, test_id, entry, days_due))
+        return sent if claimed else None
+
+    # Read and write the backend directly: the scheduler thread and requests share this document
+    get_backend().update_document(reminders.SENT_REMINDERS_DOCUMENT, claim)
+
+    queued = 0
+    failed = []
+    for subject_name, test_id, entry, days_due in claimed:
+        aggregates = load_progress_aggregates(subject_name, test_id)
+        progress = progress_percentage(aggregates['total'], entry['required'])
+        if send_test_reminder_email(subject_name, entry['name'], entry['date'], progress):
+            queued += 1
+        else:
+            failed.append((subject_name, test_id, entry, days_due))
+
+    if failed:
+        def release(sent):
+            for subject_name, test_id, entry, days_due in failed:
+                for days in days_due:
+                    reminders.unmark_sent(sent, subject_name, test_id, entry['date'], days)
+            return sent
+
+        get_backend().update_document(reminders.SENT_REMINDERS_DOCUMENT, release)
+
+    return queued, [(subject_name, test_id, days, entry)
+                    for subject_name, test_id, entry, days_due in failed for days in days_due]
+
+
+def update_sent_reminders(change, *args):
+    """Apply one of the reminders rename_/remove_ functions to the sent-reminders record"""
+    def apply(sent):
+        if sent is None:
+            return None
+        change(sent, *args)
+        return sent
+
+    get_backend().update_document(reminders.SENT_REMINDERS_DOCUMENT, apply)
+
+
+def get_reminder_scheduler():
+    """
+    Return the reminder scheduler, loading every test date into its schedule first.
+    Its thread is started (or restarted) only when REMINDER_SCHEDULER_ENABLED is set;
+    otherwise reminders go out only when check() is called, e.g. by /check-upcoming-tests.
+    """
+    state = app_state()
+    enabled = current_app.config['REMINDER_SCHEDULER_ENABLED']
+    with state.reminder_lock:
+        scheduler = state.reminder_scheduler
+        if scheduler is None or enabled and not scheduler.is_alive():
+            manifest = load_subject_manifest(load_subjects())
+            for subject_name, entries in manifest['subjects'].items():
+                state.reminder_schedule.set_subject(subject_name, entries)
+
+            scheduler = state.reminder_scheduler = ReminderScheduler(
+                state.reminder_schedule, with_app_context(send_due_reminders),
+                poll_interval=current_app.config['REMINDER_POLL_INTERVAL'])
+            if enabled:
+                scheduler.start()
+        return scheduler
+
+
+@bp.before_app_request
+def start_background_workers():
+    """Start the reminder scheduler with the first request"""
+    if current_app.config['REMINDER_SCHEDULER_ENABLED'] and app_state().reminder_scheduler is None:
+        get_reminder_scheduler()
 
 # ===== Email Functions =====
 
+def render_email(template_name, **context):
+    """
+    Render an email body from templates/emails/. Goes through the app's Jinja
+    environment, which compiles each template once and caches it, and doesn't
+    need a request context (reminders are sent from a background thread).
+    """
+    return current_app.jinja_env.get_template(f'emails/{template_name}').render(**context)
+
+
 def send_test_reminder_email(subject_name, test_name, test_date, progress):
     """Send a reminder email for an upcoming test"""
-    recipient = app.config['MAIL_USERNAME']
+    recipient = current_app.config['MAIL_USERNAME']
 
     # Calculate days until test
     test_date_obj = datetime.strptime(test_date, '%Y-%m-%d').date()
@@ -133,306 +484,530 @@ def send_test_reminder_email(subject_name, test_name, test_date, progress):
     days_remaining = (test_date_obj - today).days
 
     subject = f"📚 Test Reminder: {test_name} - {subject_name}"
-    
-    body = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f9f9f9;">
-        <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; border-top: 5px solid #6b58cd; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);">
-            <h1 style="color: #6b58cd;">Test Reminder</h1>
-            <p>Hello! This is a reminder about your upcoming test:</p>
-            <div style="background-color: #f0f0f0; padding: 15px; border-radius: 8px; margin: 15px 0;">
-                <h2 style="margin-top: 0; color: #ff5f8f;">{test_name}</h2>
-                <p><strong>Subject:</strong> {subject_name}</p>
-                <p><strong>Date:</strong> {test_date}</p>
-                <p><strong>Days Remaining:</strong> {days_remaining}</p>
-                <div style="background-color: white; border-radius: 5px; padding: 10px; margin-top: 10px;">
-                    <h3 style="color: #66bb6a;">Current Progress: {progress}%</h3>
-                    <div style="background-color: #f5f5f5; border-radius: 10px; height: 20px; overflow: hidden;">
-                        <div style="width: {progress}%; height: 100%; background-color: #66bb6a;"></div>
-                    </div>
-                </div>
-            </div>
-            <p>Keep up the great work! Remember to:</p>
-            <ul style="color: #555;">
-                <li>Review your study materials</li>
-                <li>Take practice tests</li>
-                <li>Get enough rest before the test</li>
-            </ul>
-            <p>Nya~ 😺</p>
-            <div style="margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #999;">
-                <p>This is an automated reminder from your Neko Study Quest app.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    body = render_email('test_reminder.html', subject_name=subject_name, test_name=test_name,
+                        test_date=test_date, days_remaining=days_remaining, progress=progress)
 
-    if send_email_with_retry(subject, [recipient], body):
-        flash(f"Test reminder email sent for {test_name}!", "success")
+    if queue_email(subject, [recipient], body):
+        if has_request_context():
+            flash(f"Test reminder email queued for {test_name}!", "success")
         return True
     return False
 
 def send_daily_progress_email(subject_name, test_name, resources_completed):
     """Send a daily progress summary email"""
-    recipient = app.config['MAIL_USERNAME']
+    recipient = current_app.config['MAIL_USERNAME']
 
     subject = f"📊 Daily Progress: {test_name} - {subject_name}"
+    body = render_email('daily_progress.html', subject_name=subject_name, test_name=test_name,
+                        today=date.today().strftime('%Y-%m-%d'), resources_completed=resources_completed)
 
-    body = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f9f9f9;">
-        <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; border-top: 5px solid #6b58cd; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);">
-            <h1 style="color: #6b58cd;">Daily Progress Summary</h1>
-            <p>Hello! Here's your daily progress update:</p>
-            <div style="background-color: #f0f0f0; padding: 15px; border-radius: 8px; margin: 15px 0;">
-                <h2 style="margin-top: 0; color: #ff5f8f;">{test_name}</h2>
-                <p><strong>Subject:</strong> {subject_name}</p>
-                <p><strong>Date:</strong> {date.today().strftime('%Y-%m-%d')}</p>
-                <h3 style="color: #66bb6a;">Resources Completed Today: {len(resources_completed)}</h3>
-                <ul style="padding-left: 20px;">
-                    {''.join(['<li><strong>' + r['topic_name'] + ':</strong> ' + r['resource_name'] + '</li>' for r in resources_completed])}
-                </ul>
-            </div>
-            <p>Great job on your progress today!</p>
-            <p>Nya~ 😺</p>
-            <div style="margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #999;">
-                <p>This is an automated message from your Neko Study Quest app.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-
-    if send_email_with_retry(subject, [recipient], body):
-        flash(f"Daily progress email sent for {test_name}!", "success")
+    if queue_email(subject, [recipient], body):
+        flash(f"Daily progress email queued for {test_name}!", "success")
         return True
     return False
 
 def send_test_complete_email(subject_name, test_name, progress, completed_resources, total_resources):
     """Send an email when a test is completed"""
-    recipient = app.config['MAIL_USERNAME']
+    recipient = current_app.config['MAIL_USERNAME']
 
     subject = f"🎉 Test Complete: {test_name} - {subject_name}"
     
     completion_percentage = (completed_resources / total_resources) * 100 if total_resources > 0 else 0
     
-    body = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f9f9f9;">
-        <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; border-top: 5px solid #6b58cd; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);">
-            <h1 style="color: #6b58cd;">Test Preparation Complete! 🎊</h1>
-            <p>Congratulations! You've completed your preparation for:</p>
-            <div style="background-color: #f0f0f0; padding: 15px; border-radius: 8px; margin: 15px 0;">
-                <h2 style="margin-top: 0; color: #ff5f8f;">{test_name}</h2>
-                <p><strong>Subject:</strong> {subject_name}</p>
-                <p><strong>Date:</strong> {date.today().strftime('%Y-%m-%d')}</p>
-                <div style="background-color: white; border-radius: 5px; padding: 10px; margin-top: 10px;">
-                    <h3 style="color: #66bb6a;">Final Progress: {progress}%</h3>
-                    <div style="background-color: #f5f5f5; border-radius: 10px; height: 20px; overflow: hidden;">
-                        <div style="width: {progress}%; height: 100%; background-color: #66bb6a;"></div>
-                    </div>
-                </div>
-                <div style="margin-top: 15px;">
-                    <h3 style="color: #66bb6a;">Resources Completed: {completed_resources}/{total_resources} ({completion_percentage:.1f}%)</h3>
-                </div>
-            </div>
-            <p>You're well prepared for your test! Remember to:</p>
-            <ul style="color: #555;">
-                <li>Review any challenging topics</li>
-                <li>Get a good night's sleep</li>
-                <li>Arrive early to your test location</li>
-                <li>Stay calm and confident!</li>
-            </ul>
-            <p>Best of luck on your test! 🍀</p>
-            <p>Nya~ 😺</p>
-            <div style="margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #999;">
-                <p>This is an automated message from your Neko Study Quest app.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    body = render_email('test_complete.html', subject_name=subject_name, test_name=test_name,
+                        today=date.today().strftime('%Y-%m-%d'), progress=progress,
+                        completed_resources=completed_resources, total_resources=total_resources,
+                        completion_percentage=completion_percentage)
 
-    if send_email_with_retry(subject, [recipient], body):
-        flash(f"Test completion email sent for {test_name}!", "success")
+    if queue_email(subject, [recipient], body):
+        flash(f"Test completion email queued for {test_name}!", "success")
         return True
     return False
 
 def send_upcoming_tests_summary_email(upcoming_tests):
     """Send a summary email for all upcoming tests"""
-    recipient = app.config['MAIL_USERNAME']
+    recipient = current_app.config['MAIL_USERNAME']
     
     subject = f"📅 Upcoming Tests Summary ({len(upcoming_tests)} tests)"
     
     # Sort tests by date
-    upcoming_tests.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
-    
-    # Generate test list HTML
-    test_list_html = ""
-    for test in upcoming_tests:
-        days_until = (datetime.strptime(test['date'], '%Y-%m-%d').date() - date.today()).days
-        test_list_html += f"""
-        <div style="background-color: #f0f0f0; padding: 15px; border-radius: 8px; margin: 15px 0;">
-            <h3 style="margin-top: 0; color: #ff5f8f;">{test['name']}</h3>
-            <p><strong>Subject:</strong> {test['subject']}</p>
-            <p><strong>Date:</strong> {test['date']} ({days_until} days away)</p>
-            <div style="background-color: white; border-radius: 5px; padding: 10px;">
-                <h4 style="color: #66bb6a; margin: 0;">Progress: {test['progress']}%</h4>
-                <div style="background-color: #f5f5f5; border-radius: 10px; height: 20px; overflow: hidden; margin-top: 5px;">
-                    <div style="width: {test['progress']}%; height: 100%; background-color: #66bb6a;"></div>
-                </div>
-            </div>
-        </div>
-        """
-    
-    body = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f9f9f9;">
-        <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; border-top: 5px solid #6b58cd; box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);">
-            <h1 style="color: #6b58cd;">Upcoming Tests Summary</h1>
-            <p>Hello! Here are your upcoming tests:</p>
-            {test_list_html}
-            <p>Keep up the great work with your studies!</p>
-            <p>Nya~ 😺</p>
-            <div style="margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #999;">
-                <p>This is an automated summary from your Neko Study Quest app.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    upcoming_tests.sort(key=lambda x: x['date'])
+
+    # One render for the whole digest; the template loops over the tests
+    body = render_email('upcoming_summary.html', upcoming_tests=upcoming_tests)
     
-    if send_email_with_retry(subject, [recipient], body):
-        flash(f"Summary email sent for {len(upcoming_tests)} upcoming tests!", "success")
+    if queue_email(subject, [recipient], body):
+        flash(f"Summary email queued for {len(upcoming_tests)} upcoming tests!", "success")
         return True
     return False
 
 
 # ===== Data Model Functions =====
 
-def load_subjects():
-    """Load subjects from the JSON file or return defaults if file doesn't exist"""
-    if os.path.exists(SUBJECTS_FILE):
-        try:
-            with open(SUBJECTS_FILE, 'r') as file:
-                return json.load(file)
-        except (json.JSONDecodeError, IOError):
-            # If file is corrupted or can't be read, use defaults
-            return DEFAULT_SUBJECTS
-    else:
-        # If file doesn't exist yet, use defaults and create it
-        save_subjects(DEFAULT_SUBJECTS)
-        return DEFAULT_SUBJECTS
+def get_backend():
+    """Return the storage backend selected by STORAGE_BACKEND, creating it on first use"""
+    state = app_state()
+    if state.storage is None:
+        state.storage = create_storage(current_app.config)
+    return state.storage
 
 
-def save_subjects(subjects):
-    """Save subjects to the JSON file"""
-    with open(SUBJECTS_FILE, 'w') as file:
-        json.dump(subjects, file)
+def get_storage():
+    """
+    Return the storage to use for data access. Inside a request this is the
+    request's unit of work, so each document is loaded once and saved once.
+    """
+    if not has_request_context():
+        return get_backend()
 
+    if 'unit_of_work' not in g:
+        g.unit_of_work = UnitOfWork(get_backend())
+    return g.unit_of_work
 
-def get_subject_details_file(subject_name):
-    """Get the path to the subject details JSON file"""
-    safe_name = re.sub(r'[^\w]', '_', subject_name)
-    return os.path.join(DETAILS_DIR, f"{safe_name}.json")
 
+def flush_request_documents():
+    """Write the bookkeeping documents the request changed; failures only mean they get rebuilt"""
+    unit_of_work = g.pop('unit_of_work', None)
+    if unit_of_work is not None:
+        for name, error in unit_of_work.flush():
+            print(f"Error updating {name}, it will be rebuilt: {str(error)}")
 
-def get_progress_records_file(subject_name, test_id):
-    """Get the path to the progress records JSON file for a specific test"""
-    safe_name = re.sub(r'[^\w]', '_', subject_name)
-    return os.path.join(PROGRESS_DIR, f"{safe_name}_{test_id}_progress.json")
+    # Only now are the derived documents up to date, so this is when the data version moves on
+    if g.pop('data_changed', False):
+        get_backend().bump_data_version()
+
+
+@bp.after_app_request
+def flush_unit_of_work(response):
+    """
+    Bring the bookkeeping documents up to date before the response goes out. The
+    request's own changes are already stored by now, so this never turns into an
+    error response: a document that can't be updated is rebuilt on its next read.
+    """
+    flush_request_documents()
+    return response
+
+
+@bp.teardown_app_request
+def finish_unit_of_work(exc):
+    """Flush whatever is left from a request whose response was never finished"""
+    flush_request_documents()
+
+
+def load_subjects():
+    """Load subjects from storage or return defaults if none have been saved yet"""
+    try:
+        subjects = get_storage().load_subjects()
+    except (ValueError, IOError):
+        # If the subject list is corrupted or can't be read, use defaults
+        return DEFAULT_SUBJECTS
+
+    if subjects is None:
+        # If no subject list exists yet, use defaults and create it
+        save_subjects(DEFAULT_SUBJECTS)
+        return DEFAULT_SUBJECTS
+
+    return subjects
+
+
+def save_subjects(subjects):
+    """Save the subject list"""
+    get_storage().save_subjects(subjects)
+    data_changed()
 
 
 def load_subject_details(subject_name):
     """Load details for a specific subject"""
-    file_path = get_subject_details_file(subject_name)
+    details = get_storage().load_subject_details(subject_name)
 
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as file:
-                return json.load(file)
-        except (json.JSONDecodeError, IOError):
-            # Return empty structure if file is corrupted
-            return {"resources": [], "tests": [], "study_materials": []}
-    else:
-        # Return empty structure if file doesn't exist
+    if details is None:
+        # Return empty structure if the subject has no (readable) details
         return {"resources": [], "tests": [], "study_materials": []}
 
+    return details
+
 
 def save_subject_details(subject_name, details):
-    """Save details for a specific subject"""
-    file_path = get_subject_details_file(subject_name)
+    """Save details for a specific subject, replacing whatever is stored (see modify_subject_details)"""
+    get_storage().save_subject_details(subject_name, details)
+    subject_details_changed(subject_name, details)
+
+
+# How many times a compare-and-swap save is tried before giving up
+SAVE_RETRIES = 5
 
-    with open(file_path, 'w') as file:
-        json.dump(details, file)
+
+def modify_subject_details(subject_name, change, expected_version=None):
+    """
+    Apply change(details) to a subject's details and save them with a compare-and-swap
+    on their version. If another request saved the subject in the meantime, change
+    runs again on the fresh details, so concurrent edits to different parts of a
+    subject are all kept. With expected_version (a client's If-Match) a newer version
+    raises VersionConflict instead. Returns (what change returned, the new version).
+    """
+    for attempt in range(SAVE_RETRIES):
+        details = load_subject_details(subject_name)
+        version = document_version(details)
+        if expected_version is not None and version != expected_version:
+            raise VersionConflict(f"{subject_name} is at version {version}, not {expected_version}")
+
+        result = change(details)
+        try:
+            get_storage().save_subject_details(subject_name, details, expected_version=version)
+        except VersionConflict:
+            continue
+
+        subject_details_changed(subject_name, details)
+        return result, details['version']
+
+    raise VersionConflict(f"Gave up saving {subject_name} after {SAVE_RETRIES} conflicting saves")
 
 
 def load_progress_records(subject_name, test_id):
     """Load progress records for a specific test"""
-    file_path = get_progress_records_file(subject_name, test_id)
+    return get_storage().load_progress_records(subject_name, test_id)
+
+
+def save_progress_records(subject_name, test_id, records):
+    """Replace all progress records for a specific test"""
+    get_storage().save_progress_records(subject_name, test_id, records)
+    progress_records_changed(subject_name, test_id)
+
 
-    if os.path.exists(file_path):
+def modify_progress_records(subject_name, test_id, change):
+    """
+    Apply change(progress_data) to a test's records and save them with a
+    compare-and-swap, like modify_subject_details. Returns what change returned.
+    """
+    for attempt in range(SAVE_RETRIES):
+        progress_data = load_progress_records(subject_name, test_id)
+        version = document_version(progress_data)
+
+        result = change(progress_data)
         try:
-            with open(file_path, 'r') as file:
-                return json.load(file)
-        except (json.JSONDecodeError, IOError):
-            # Return empty structure if file is corrupted
-            return {"records": []}
+            get_storage().save_progress_records(subject_name, test_id, progress_data, expected_version=version)
+        except VersionConflict:
+            continue
+
+        progress_records_changed(subject_name, test_id)
+        return result
+
+    raise VersionConflict(f"Gave up saving progress for test {test_id} after {SAVE_RETRIES} conflicting saves")
+
+
+def append_progress_record(subject_name, test_id, record):
+    """Add one progress record without rewriting the test's history"""
+    get_storage().append_progress_record(subject_name, test_id, record)
+    progress_records_changed(subject_name, test_id)
+
+
+def delete_progress_record(subject_name, test_id, record):
+    """Remove one progress record (matched by its id)"""
+    get_storage().delete_progress_record(subject_name, test_id, record)
+    progress_records_changed(subject_name, test_id)
+
+
+def remove_latest_progress_record(subject_name, test_id, resource_id):
+    """Remove the newest progress record for a resource, returning it (or None)"""
+    removed = get_storage().remove_latest_progress_record(subject_name, test_id, resource_id)
+    if removed is not None:
+        progress_records_changed(subject_name, test_id)
+    return removed
+
+
+def update_progress_records(subject_name, test_id, added, removed, expected_version=None):
+    """Append and remove a batch of a test's progress records with one write (see Storage)"""
+    deleted = get_storage().update_progress_records(subject_name, test_id, added, removed, expected_version)
+    if added or deleted:
+        progress_records_changed(subject_name, test_id)
+    return deleted
+
+
+def data_changed():
+    """
+    Note that subjects, details or progress records changed, so pages and listings built
+    from them are out of date. Inside a request the data version moves on once the
+    request's writes have been flushed (see flush_unit_of_work).
+    """
+    if has_request_context():
+        g.data_changed = True
     else:
-        # Return empty structure if file doesn't exist
-        return {"records": []}
+        get_backend().bump_data_version()
 
 
-def save_progress_records(subject_name, test_id, records):
-    """Save progress records for a specific test"""
-    file_path = get_progress_records_file(subject_name, test_id)
+def subject_details_changed(subject_name, details):
+    """Bring the derived data for a subject up to date after its details were saved"""
+    refresh_dashboard_subject(subject_name)
+    refresh_subject_manifest(subject_name)
+    schedule_reminders(subject_name, details)
+    data_changed()
+
+
+def progress_records_changed(subject_name, test_id):
+    """Bring the derived data for a test up to date after its records changed"""
+    # Past test summaries aren't touched: they are checked against the dashboard entry's progress version
+    refresh_dashboard_test(subject_name, test_id)
+    data_changed()
+
+
+def load_progress_aggregates(subject_name, test_id):
+    """Load the running totals for a test (completed per resource, per date, per topic, scores)"""
+    return get_storage().load_progress_aggregates(subject_name, test_id)
+
+
+def load_resource_index():
+    """Load the id -> owner index, building it if it doesn't exist yet"""
+    index = get_storage().load_document(resource_index.INDEX_DOCUMENT)
+    if index is None:
+        index = rebuild_resource_index()
+    return index
+
+
+def rebuild_resource_index():
+    """Rebuild the id -> owner index from every subject's details"""
+    index = resource_index.build_index(
+        (subject_name, load_subject_details(subject_name)) for subject_name in load_subjects())
+
+    # Skip the write if nothing was missing
+    get_storage().update_document(resource_index.INDEX_DOCUMENT, lambda stored: index if index != stored else None)
+    return index
+
+
+def update_resource_index(change, *args):
+    """Apply one of the resource_index add_/remove_/rename_ functions to the stored index"""
+    def apply(index):
+        if index is None:
+            # Built in full the first time it is needed
+            return None
+        change(index, *args)
+        return index
+
+    load_resource_index()
+    get_storage().update_document(resource_index.INDEX_DOCUMENT, apply)
+
+
+def find_resource(resource_id):
+    """
+    Find a resource by id using the resource index.
+    Returns (subject_name, test, topic, resource) or None if it doesn't exist.
+    """
+    index = load_resource_index()
+
+    for attempt in range(2):
+        owner = index['resources'].get(resource_id)
+        if owner:
+            subject_name, test_id, topic_id = owner
+            subject_data = load_subject_details(subject_name)
+
+            test = next((t for t in subject_data.get('tests', [])
+                         if isinstance(t, dict) and t.get('id') == test_id and 'topics' in t), None)
+            topic = next((t for t in (test or {}).get('topics', [])
+                          if isinstance(t, dict) and t.get('id') == topic_id and 'resources' in t), None)
+            resource = next((r for r in (topic or {}).get('resources', [])
+                             if isinstance(r, dict) and r.get('id') == resource_id), None)
+
+            if resource:
+                return subject_name, test, topic, resource
+
+        # The index may predate this resource or be stale; rebuild it (once per request) and retry
+        if attempt == 0 and not g.get('resource_index_rebuilt'):
+            g.resource_index_rebuilt = True
+            index = rebuild_resource_index()
+
+    return None
+
+
+def build_dashboard_section(subject_name, details=None, storage=None):
+    """Summarise a subject's tests and progress from scratch, reading from storage (the request's by default)"""
+    storage = storage or get_storage()
+    if details is None:
+        details = storage.load_subject_details(subject_name) or {}
+
+    return dashboard.build_section(
+        dashboard.test_entry(test, storage.load_progress_aggregates(subject_name, test['id']))
+        for test in details.get('tests', []) if isinstance(test, dict) and 'id' in test)
+
+
+def load_dashboard_section(subject_name):
+    """Load a subject's section of the dashboard, building it if it is missing"""
+    name = dashboard.section_document(subject_name)
+    section = dashboard.stored_section(get_storage().load_document(name))
+    if section is None:
+        section = dashboard.stored_section(get_storage().update_document(
+            name, lambda stored: fill_dashboard_section(stored, subject_name)))
+    return section
+
+
+def load_dashboard(subjects):
+    """
+    Return ([(subject_name, section)], totals over all of them) for the home page and
+    statistics. Both are reused until the data version changes, so repeat visits
+    don't read and add up every section again.
+    """
+    state = app_state()
+    # Read the version first: sections loaded from newer data than their version are only reloaded early
+    key = (get_backend().load_data_version(), tuple(subjects))
+    cached = state.dashboard
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+
+    sections = [(subject_name, load_dashboard_section(subject_name)) for subject_name in subjects]
+    totals = dashboard.merge_sections(section for _, section in sections)
+    state.dashboard = (key, sections, totals)
+    return sections, totals
+
+
+# The dashboard changes below read the details and progress they summarise from the
+# backend, not the request's copies: they are replayed on the stored section when
+# the request is flushed, and must see what is stored by then.
+
+def fill_dashboard_section(document, subject_name):
+    """Build a subject's section if the stored one is missing; None if it isn't"""
+    if dashboard.stored_section(document) is not None:
+        return None
+    return dashboard.section_data(subject_name, build_dashboard_section(subject_name, storage=get_backend()))
 
-    with open(file_path, 'w') as file:
-        json.dump(records, file)
 
+def refresh_dashboard_subject(subject_name):
+    """Re-summarise one subject after its details changed"""
+    get_storage().update_document(
+        dashboard.section_document(subject_name),
+        lambda document: dashboard.section_data(subject_name,
+                                                build_dashboard_section(subject_name, storage=get_backend())))
 
-def calculate_progress(test, subject_name):
+
+def refresh_dashboard_test(subject_name, test_id):
+    """Update one test's progress numbers after its records changed"""
+    def refresh(document):
+        section = dashboard.stored_section(document)
+
+        # Always save, so a section built from older progress by another request loses its compare-and-swap
+        aggregates = get_backend().load_progress_aggregates(subject_name, test_id)
+        if section is None or not dashboard.update_test_progress(section, test_id, aggregates):
+            section = build_dashboard_section(subject_name, storage=get_backend())
+        return dashboard.section_data(subject_name, section)
+
+    get_storage().update_document(dashboard.section_document(subject_name), refresh)
+
+
+def remove_dashboard_subject(subject_name):
+    """Drop a subject's section after the subject was deleted or renamed"""
+    get_storage().delete_document(dashboard.section_document(subject_name))
+
+
+def load_past_test_summaries():
+    """Load the frozen record summaries of past tests"""
+    summaries = get_storage().load_document(past_test_summaries.SUMMARIES_DOCUMENT)
+    if summaries is None:
+        summaries = past_test_summaries.empty_summaries()
+    return summaries
+
+
+def past_test_summary(summaries, subject_name, test_id, version):
+    """
+    Return a past test's record summary, summarising (and freezing) it if there
+    isn't one for the test's progress version (from its dashboard entry) yet
+    """
+    summary = past_test_summaries.get_summary(summaries, subject_name, test_id)
+    if summary is None or past_test_summaries.summary_version(summary) < version:
+        progress_data = load_progress_records(subject_name, test_id)
+        summary = past_test_summaries.summarize_records(progress_data.get('records', []))
+        summary['version'] = document_version(progress_data)
+
+        # Kept only if nothing newer was frozen in the meantime
+        get_storage().update_document(
+            past_test_summaries.SUMMARIES_DOCUMENT,
+            lambda stored: past_test_summaries.freeze_summary(stored, subject_name, test_id, summary))
+    return summary
+
+
+def update_past_test_summaries(change, *args):
+    """Apply one of the past_test_summaries rename_/remove_ functions to the stored summaries"""
+    def apply(summaries):
+        summaries = summaries or past_test_summaries.empty_summaries()
+        change(summaries, *args)
+        return summaries
+
+    get_storage().update_document(past_test_summaries.SUMMARIES_DOCUMENT, apply)
+
+
+def load_subject_manifest(subjects):
+    """Load the dated-test manifest, adding any listed subject that isn't in it yet"""
+    manifest = get_storage().load_document(subject_manifest.MANIFEST_DOCUMENT)
+
+    if manifest is None or any(subject_name not in manifest['subjects'] for subject_name in subjects):
+        manifest = get_storage().update_document(subject_manifest.MANIFEST_DOCUMENT,
+                                                 lambda stored: fill_subject_manifest(stored, subjects))
+    return manifest
+
+
+# Like the dashboard changes, these read details from the backend as they are
+# replayed on the stored manifest when the request is flushed.
+
+def fill_subject_manifest(manifest, subjects):
+    """List the subjects missing from a stored manifest; None if none were missing"""
+    missing = [subject_name for subject_name in subjects
+               if manifest is None or subject_name not in manifest['subjects']]
+    if manifest is not None and not missing:
+        return None
+
+    manifest = manifest or subject_manifest.empty_manifest()
+    for subject_name in missing:
+        details = get_backend().load_subject_details(subject_name) or {}
+        subject_manifest.set_subject(manifest, subject_name, details.get('tests', []))
+    return manifest
+
+
+def refresh_subject_manifest(subject_name):
+    """Re-list one subject's tests after its details changed"""
+    def refresh(manifest):
+        # Always save, so a listing made from older details by another request loses its compare-and-swap
+        manifest = manifest or subject_manifest.empty_manifest()
+        details = get_backend().load_subject_details(subject_name) or {}
+        subject_manifest.set_subject(manifest, subject_name, details.get('tests', []))
+        return manifest
+
+    get_storage().update_document(subject_manifest.MANIFEST_DOCUMENT, refresh)
+
+
+def update_subject_manifest(change, *args):
+    """Apply one of the subject_manifest rename_/remove_ functions to the stored manifest"""
+    def apply(manifest):
+        manifest = manifest or subject_manifest.empty_manifest()
+        change(manifest, *args)
+        return manifest
+
+    get_storage().update_document(subject_manifest.MANIFEST_DOCUMENT, apply)
+
+
+def rebuild_dashboard():
+    """Rebuild every subject's dashboard section from its details and progress; returns {subject_name: section}"""
+    sections = {}
+    for subject_name in load_subjects():
+        section = sections[subject_name] = build_dashboard_section(subject_name)
+        get_storage().update_document(dashboard.section_document(subject_name),
+                                      lambda document: dashboard.section_data(subject_name, section))
+
+    get_storage().delete_document(dashboard.OLD_SNAPSHOT_DOCUMENT)
+    return sections
+
+
+def calculate_progress(test, subject_name, aggregates=None):
     """Calculate progress percentage for a specific test"""
     # Make sure test has an id before proceeding
     if 'id' not in test:
         return 0  # Return 0% progress if test has no id
 
-    # Load progress records
-    progress_records = load_progress_records(subject_name, test['id'])
-
-    # Count total resources required
-    total_required = 0
-
-    # Check if topics is a list of dictionaries or a string
-    if isinstance(test.get('topics', []), list):
-        for topic in test.get('topics', []):
-            # Make sure topic is a dictionary with resources
-            if isinstance(topic, dict) and 'resources' in topic:
-                for resource in topic.get('resources', []):
-                    total_required += resource.get('count', 1)
-
     # Count completed resources
-    completed = len(progress_records.get('records', []))
+    if aggregates is None:
+        aggregates = load_progress_aggregates(subject_name, test['id'])
 
-    # Calculate percentage
-    if total_required > 0:
-        percentage = (completed / total_required) * 100
-        return round(percentage, 1)
-    else:
-        return 0
+    return progress_percentage(aggregates['total'], required_resources(test))
 
 
 def get_date_counts(subject_name, test_id):
     """Get counts of resources completed by date"""
-    progress_records = load_progress_records(subject_name, test_id)
-    date_counts = {}
-
-    for record in progress_records.get('records', []):
-        record_date = record.get('date')
-        if record_date in date_counts:
-            date_counts[record_date] += 1
-        else:
-            date_counts[record_date] = 1
+    date_counts = load_progress_aggregates(subject_name, test_id)['by_date']
 
     # Sort by date
     sorted_dates = sorted(date_counts.items(), key=lambda x: datetime.strptime(x[0], '%Y-%m-%d'))
@@ -442,17 +1017,7 @@ def get_date_counts(subject_name, test_id):
 
 def get_topic_counts(subject_name, test_id):
     """Get counts of resources completed by topic"""
-    progress_records = load_progress_records(subject_name, test_id)
-    topic_counts = {}
-
-    for record in progress_records.get('records', []):
-        topic_name = record.get('topic_name')
-        if topic_name in topic_counts:
-            topic_counts[topic_name] += 1  # Fixed from A1 to 1
-        else:
-            topic_counts[topic_name] = 1
-
-    return topic_counts
+    return load_progress_aggregates(subject_name, test_id)['by_topic']
 
 
 def is_past_test(test_date):
@@ -472,36 +1037,165 @@ def get_upcoming_tests(days=7):
     today = date.today()
     end_date = today + timedelta(days=days)
 
+    # Look the date range up in the manifest instead of opening every details file
+    manifest = load_subject_manifest(subjects)
+    listed = set(subjects)
+    for subject_name, test_id, entry in subject_manifest.tests_between(manifest, today, end_date):
+        if subject_name not in listed:
+            continue
+
+        # Add subject name and progress
+        aggregates = load_progress_aggregates(subject_name, test_id)
+        upcoming_tests.append({
+            'id': test_id,
+            'name': entry['name'],
+            'date': entry['date'],
+            'subject_name': subject_name,
+            'days_remaining': entry['ordinal'] - today.toordinal(),
+            'progress': progress_percentage(aggregates['total'], entry['required'])
+        })
+
+    return upcoming_tests
+
+
+def build_timer_resources(today):
+    """
+    List the resources still to do for the study timer dropdown:
+    [{"name", "tests": [{"id", "name", "topics": [{"id", "name", "resources": [...]}]}]}],
+    leaving out past tests and anything already completed.
+    """
+    subjects = load_subjects()
+    result = []
+
+    # Process each subject
     for subject_name in subjects:
         subject_data = load_subject_details(subject_name)
-
+        
+        subject_entry = {
+            "name": subject_name,
+            "tests": []
+        }
+        
+        # Process each test in this subject
         for test in subject_data.get('tests', []):
-            if not isinstance(test, dict) or 'date' not in test:
+            # Skip invalid tests
+            if not isinstance(test, dict) or 'id' not in test or 'name' not in test:
                 continue
-
-            try:
-                test_date = datetime.strptime(test['date'], '%Y-%m-%d').date()
-
-                # Check if test is upcoming
-                if today <= test_date <= end_date:
-                    # Add subject name and progress
-                    test['subject_name'] = subject_name
-                    test['progress'] = calculate_progress(test, subject_name)
-                    upcoming_tests.append(test)
-            except (ValueError, TypeError):
+                
+            # Check if test is in the past
+            is_past = False
+            if 'date' in test:
+                try:
+                    test_date = datetime.strptime(test['date'], '%Y-%m-%d').date()
+                    is_past = test_date < today
+                except:
+                    pass
+            
+            # Skip past tests
+            if is_past:
                 continue
+            
+            test_entry = {
+                "id": test['id'],
+                "name": test['name'],
+                "topics": []
+            }
+            
+            # Count completed instances per resource for this test
+            completed_counts = load_progress_aggregates(subject_name, test['id'])['by_resource']
+            
+            # Process topics
+            for topic in test.get('topics', []):
+                # Skip invalid topics
+                if not isinstance(topic, dict) or 'id' not in topic or 'name' not in topic:
+                    continue
+                
+                topic_entry = {
+                    "id": topic['id'],
+                    "name": topic['name'],
+                    "resources": []
+                }
+                
+                # Process resources
+                for resource in topic.get('resources', []):
+                    # Skip invalid resources
+                    if not isinstance(resource, dict) or 'id' not in resource or 'name' not in resource:
+                        continue
+                    
+                    completed = completed_counts.get(resource['id'], 0)
+                    
+                    count = resource.get('count', 1)
+                    
+                    # Only add if not fully completed
+                    if completed < count:
+                        resource_entry = {
+                            "id": resource['id'],
+                            "name": resource['name'],
+                            "count": count,
+                            "completed": completed
+                        }
+                        topic_entry["resources"].append(resource_entry)
+                
+                # Only add topics with resources
+                if topic_entry["resources"]:
+                    test_entry["topics"].append(topic_entry)
+            
+            # Only add tests with topics
+            if test_entry["topics"]:
+                subject_entry["tests"].append(test_entry)
+        
+        # Only add subjects with tests
+        if subject_entry["tests"]:
+            result.append(subject_entry)
 
-    # Sort by date
-    upcoming_tests.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
+    return result
+
+
+def load_timer_resources():
+    """
+    Return (subjects, etag) for the timer dropdown. The listing is built once and
+    reused until the data version or the day changes.
+    """
+    state = app_state()
+    # Read the version first: a listing built from newer data than its version is only rebuilt early
+    key = (get_backend().load_data_version(), date.today())
+    cached = state.timer_resources
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+
+    subjects = build_timer_resources(key[1])
+    etag = hashlib.sha1(json.dumps(subjects, sort_keys=True).encode('utf-8')).hexdigest()
+    state.timer_resources = (key, subjects, etag)
+    return subjects, etag
 
-    return upcoming_tests
+
+def timer_resources_response():
+    """The timer listing as JSON with an ETag, or 304 Not Modified if the client's copy is current"""
+    subjects, etag = load_timer_resources()
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify({
+            "success": True,
+            "subjects": subjects
+        })
+    response.set_etag(etag)
+    # Let the browser keep a copy but check it every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 def get_todays_resources(subject_name, test_id):
     """Get resources completed today for a specific test"""
-    progress_records = load_progress_records(subject_name, test_id)
     today = date.today().strftime('%Y-%m-%d')
 
+    # Skip loading the history if nothing was recorded today
+    if not load_progress_aggregates(subject_name, test_id)['by_date'].get(today):
+        return []
+
+    progress_records = load_progress_records(subject_name, test_id)
+
     today_resources = []
     for record in progress_records.get('records', []):
         if record.get('date') == today:
@@ -510,87 +1204,123 @@ def get_todays_resources(subject_name, test_id):
     return today_resources
 
 
+_templates_version = None
+
+
+def templates_version():
+    """Fingerprint of the app code and templates, so a deploy doesn't leave browsers on old pages"""
+    global _templates_version
+    if _templates_version is None:
+        mtimes = [os.path.getmtime(__file__)]
+        for folder, _, files in os.walk(current_app.template_folder):
+            mtimes.extend(os.path.getmtime(os.path.join(folder, name)) for name in files)
+        _templates_version = str(max(mtimes))
+    return _templates_version
+
+
+def conditional_view(view):
+    """
+    Answer GET requests with 304 Not Modified, without loading or rendering anything,
+    when the client's copy of the page was made from the current data. The ETag is
+    the data version plus the date (pages count days to tests) and the page's URL.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = '|'.join([str(get_backend().load_data_version()), date.today().isoformat(),
+                        templates_version(), request.full_path])
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            # Redirects and errors aren't worth revalidating
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
+
+
+def if_match_version():
+    """
+    Return the document version the client's If-Match header names, or None if it
+    sent none. AJAX responses that change a subject or its progress carry the new
+    version as their ETag, so a client can send it back to make sure nobody else
+    changed the document in between.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    try:
+        return int(next(iter(request.if_match.as_set())))
+    except (StopIteration, ValueError):
+        # A tag that isn't one of our versions can never match
+        return -1
+
+
+def versioned_response(payload, version):
+    """JSON response tagged with a document version for the next If-Match"""
+    response = jsonify(payload)
+    response.set_etag(str(version))
+    return response
+
+
+@bp.app_errorhandler(VersionConflict)
+def version_conflict(e):
+    """
+    Another request changed the document first: 412 Precondition Failed if the
+    client's If-Match was out of date, 409 Conflict if the save kept losing races.
+    """
+    status = 412 if request.if_match else 409
+    message = 'This was changed somewhere else in the meantime. Please reload and try again.'
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json:
+        return jsonify({'success': False, 'message': message}), status
+
+    flash(message, 'error')
+    # Back to the page the form was on, as long as it is one of ours
+    referrer = request.referrer or ''
+    return redirect(referrer if referrer.startswith(request.host_url) else url_for('main.index'))
+
+
 # ===== Routes =====
-@app.route('/all-statistics')
+@bp.route('/all-statistics')
+@conditional_view
 def all_statistics():
     """Show statistics for all subjects and tests with detailed analytics"""
     subjects = load_subjects()
     all_tests = []
 
-    # Statistics summary data
-    total_resources_completed = 0
-    total_resources_required = 0
-    total_topics = 0
-    total_tests = 0
-
-    # Resource completion by subject
+    # Resource completion and performance by subject, straight from the subject rollups
     subject_completion = {}
-    for subject_name in subjects:
-        subject_completion[subject_name] = {'completed': 0, 'total': 0}
-
-    # Collect progress by date across all tests
-    date_progress = {}
-
-    # Subject performance data
     subject_performance = {}
-    for subject_name in subjects:
-        subject_performance[subject_name] = {'tests': 0, 'avg_progress': 0, 'total_progress': 0}
 
-    for subject_name in subjects:
-        # Load details for the subject
-        subject_data = load_subject_details(subject_name)
+    sections, totals = load_dashboard(subjects)
+    for subject_name, section in sections:
+        subject_completion[subject_name] = {'completed': section['completed'], 'total': section['required']}
+        subject_performance[subject_name] = {'tests': len(section['tests']), 'avg_progress': 0, 'total_progress': 0}
 
         # Process tests
-        for test in subject_data.get('tests', []):
-            # Make sure test is a dictionary with an id
-            if isinstance(test, dict) and 'id' in test:
-                # Count total tests
-                total_tests += 1
-                subject_performance[subject_name]['tests'] += 1
-
-                # Calculate progress
-                test['progress'] = calculate_progress(test, subject_name)
-                subject_performance[subject_name]['total_progress'] += test['progress']
-
-                # Add subject name to test
-                test['subject_name'] = subject_name
-
-                # Check if test is in the past
-                if 'date' in test:
-                    test['is_past'] = is_past_test(test['date'])
-
-                # Load progress records for this test
-                progress_records = load_progress_records(subject_name, test['id'])
-                test['records_count'] = len(progress_records.get('records', []))
-
-                # Count resources completed and gather date data
-                for record in progress_records.get('records', []):
-                    total_resources_completed += 1
-                    subject_completion[subject_name]['completed'] += 1
-
-                    # Add to date progress
-                    record_date = record.get('date')
-                    if record_date:
-                        if record_date in date_progress:
-                            date_progress[record_date] += 1
-                        else:
-                            date_progress[record_date] = 1
-
-                # Count total topics
-                if 'topics' in test and isinstance(test.get('topics'), list):
-                    test_topics = len(test.get('topics', []))
-                    total_topics += test_topics
-
-                    # Count total resources required
-                    for topic in test.get('topics', []):
-                        if isinstance(topic, dict) and 'resources' in topic:
-                            for resource in topic.get('resources', []):
-                                resource_count = resource.get('count', 1)
-                                total_resources_required += resource_count
-                                subject_completion[subject_name]['total'] += resource_count
+        for entry in section['tests']:
+            test = {
+                'id': entry['id'],
+                'subject_name': subject_name,
+                'progress': progress_percentage(entry['completed'], entry['required'])
+            }
+            for key in ('name', 'date'):
+                if key in entry:
+                    test[key] = entry[key]
 
-                # Add test to the list
-                all_tests.append(test)
+            subject_performance[subject_name]['total_progress'] += test['progress']
+
+            # Check if test is in the past
+            if 'date' in test:
+                test['is_past'] = is_past_test(test['date'])
+
+            # Add test to the list
+            all_tests.append(test)
 
     # Calculate average progress per subject
     for subject_name in subjects:
@@ -598,24 +1328,22 @@ def all_statistics():
             subject_performance[subject_name]['avg_progress'] = round(
                 subject_performance[subject_name]['total_progress'] / subject_performance[subject_name]['tests'], 1)
 
-    # Sort tests by date
+    # Sort tests by date (YYYY-MM-DD strings sort by date)
     all_tests_with_dates = [t for t in all_tests if 'date' in t]
     all_tests_without_dates = [t for t in all_tests if 'date' not in t]
 
     if all_tests_with_dates:
-        all_tests_with_dates = sorted(all_tests_with_dates,
-                                      key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
+        all_tests_with_dates = sorted(all_tests_with_dates, key=lambda x: x['date'])
 
     all_tests = all_tests_with_dates + all_tests_without_dates
 
     # Convert date progress to sorted list
-    date_progress_list = sorted(date_progress.items(),
-                                key=lambda x: datetime.strptime(x[0], '%Y-%m-%d'))
+    date_progress_list = sorted(totals['by_date'].items())
 
     # Calculate overall completion percentage
     overall_completion = 0
-    if total_resources_required > 0:
-        overall_completion = round((total_resources_completed / total_resources_required) * 100, 1)
+    if totals['required'] > 0:
+        overall_completion = round((totals['completed'] / totals['required']) * 100, 1)
 
     # Calculate average progress across all tests
     avg_test_progress = 0
@@ -623,22 +1351,15 @@ def all_statistics():
         total_progress = sum(test.get('progress', 0) for test in all_tests)
         avg_test_progress = round(total_progress / len(all_tests), 1)
 
-    # Get upcoming tests (next 7 days)
+    # Get upcoming tests (next 7 days) as a date range lookup in the manifest
     today = date.today()
     upcoming_deadline = today + timedelta(days=7)
-    upcoming_tests = []
-
-    for test in all_tests:
-        if 'date' in test and not test.get('is_past', False):
-            try:
-                test_date = datetime.strptime(test['date'], '%Y-%m-%d').date()
-                if test_date <= upcoming_deadline:
-                    upcoming_tests.append(test)
-            except (ValueError, TypeError):
-                continue
+    tests_by_id = {(test['subject_name'], test['id']): test for test in all_tests}
 
-    # Sort upcoming tests by date
-    upcoming_tests.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
+    manifest = load_subject_manifest(subjects)
+    upcoming_tests = [tests_by_id[(subject_name, test_id)]
+                      for subject_name, test_id, _ in subject_manifest.tests_between(manifest, today, upcoming_deadline)
+                      if (subject_name, test_id) in tests_by_id]
 
     return render_template('all_statistics.html',
                            all_tests=all_tests,
@@ -646,17 +1367,18 @@ def all_statistics():
                            subject_completion=subject_completion,
                            subject_performance=subject_performance,
                            stats_summary={
-                               'total_tests': total_tests,
-                               'total_topics': total_topics,
-                               'total_resources': total_resources_required,
-                               'completed_resources': total_resources_completed,
+                               'total_tests': totals['tests'],
+                               'total_topics': totals['topics'],
+                               'total_resources': totals['required'],
+                               'completed_resources': totals['completed'],
                                'overall_completion': overall_completion,
                                'avg_test_progress': avg_test_progress
                            },
                            upcoming_tests=upcoming_tests)
 
 
-@app.route('/')
+@bp.route('/')
+@conditional_view
 def index():
     """Main page showing all subjects and tests"""
     subjects = load_subjects()
@@ -678,76 +1400,50 @@ def index():
         'total_score_sum': 0.0
     }
 
-    for subject_name in subjects:
-        subject_counts[subject_name] = 0
+    # Render from the precomputed snapshot instead of walking every test's history
+    sections, totals = load_dashboard(subjects)
+    for subject_name, section in sections:
+        # Process tests
+        for entry in section['tests']:
+            # Format test data for display
+            test_data = {
+                'test_id': entry['id'],
+                'test_name': entry.get('name'),
+                'date': entry.get('date'),
+                'subject_name': subject_name,
+                'progress': progress_percentage(entry['completed'], entry['required']),
+                'is_past': False
+            }
 
-        # Load details for the subject
-        subject_data = load_subject_details(subject_name)
+            # Check if test is in the past
+            if 'date' in entry:
+                test_data['is_past'] = is_past_test(entry['date'])
+                # Count upcoming tests
+                if not test_data['is_past']:
+                    stats_summary['upcoming_tests'] += 1
 
-        # Process tests
-        for test in subject_data.get('tests', []):
-            # Make sure test is a dictionary with an id
-            if isinstance(test, dict) and 'id' in test:
-                # Calculate progress
-                test['progress'] = calculate_progress(test, subject_name)
-
-                # Add subject name to test
-                test['subject_name'] = subject_name
-
-                # Format test data for display
-                test_data = {
-                    'test_id': test.get('id'),
-                    'test_name': test.get('name'),
-                    'date': test.get('date'),
-                    'subject_name': subject_name,
-                    'progress': test['progress'],
-                    'is_past': False
-                }
+            all_tests.append(test_data)
 
-                # Check if test is in the past
-                if 'date' in test:
-                    test_data['is_past'] = is_past_test(test['date'])
-                    # Count upcoming tests
-                    if not test_data['is_past']:
-                        stats_summary['upcoming_tests'] += 1
-
-                all_tests.append(test_data)
-
-                # Load progress records for this test
-                progress_records = load_progress_records(subject_name, test['id'])
-
-                # Count completed resources for this subject
-                completed_resources = len(progress_records.get('records', []))
-                subject_counts[subject_name] += completed_resources
-                stats_summary['completed_resources'] += completed_resources
-
-                # Collect daily progress data and sum up scores
-                for record in progress_records.get('records', []):
-                    record_date = record.get('date')
-                    if record_date:
-                        if record_date in daily_progress:
-                            daily_progress[record_date] += 1
-                        else:
-                            daily_progress[record_date] = 1
-
-                    # Sum scores for average calculation
-                    if record.get('score') is not None:
-                        stats_summary['total_score_sum'] += record.get('score')
-                        stats_summary['total_score_count'] += 1
+        # Count completed resources for this subject
+        subject_counts[subject_name] = section['completed']
 
-    # Sort tests by date
+    # The subject rollups added up, for the summary, daily progress and score average
+    stats_summary['completed_resources'] = totals['completed']
+    stats_summary['total_score_sum'] = totals['score_sum']
+    stats_summary['total_score_count'] = totals['score_count']
+    daily_progress = totals['by_date']
+
+    # Sort tests by date (YYYY-MM-DD strings sort by date)
     tests_with_dates = [t for t in all_tests if 'date' in t]
     tests_without_dates = [t for t in all_tests if 'date' not in t]
 
     if tests_with_dates:
-        tests_with_dates = sorted(tests_with_dates,
-                                  key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
+        tests_with_dates = sorted(tests_with_dates, key=lambda x: x['date'])
 
     all_tests = tests_with_dates + tests_without_dates
 
-    # Convert daily progress to sorted list for charts
-    daily_progress_list = sorted(daily_progress.items(),
-                                 key=lambda x: datetime.strptime(x[0], '%Y-%m-%d'))
+    # Convert daily progress to sorted list for charts (YYYY-MM-DD strings sort by date)
+    daily_progress_list = sorted(daily_progress.items())
 
     # Get last 7 days if available, otherwise use what we have
     if len(daily_progress_list) > 7:
@@ -804,79 +1500,88 @@ def calculate_streak(daily_progress_list):
     return streak
 
 
-@app.route('/subject/<subject_name>')
+@bp.route('/subject/<subject_name>')
+@conditional_view
 def subject_details(subject_name):
     """Show details for a specific subject"""
     # Load details for the subject
     subject_data = load_subject_details(subject_name)
 
-    # Initialize tests if not present
-    if 'tests' not in subject_data:
-        subject_data['tests'] = []
+    # Only write the file back if normalising it actually changed something
+    if normalize_subject_details(subject_name, subject_data):
+        # Saved with a compare-and-swap so a page view can't overwrite an edit made meanwhile
+        modify_subject_details(subject_name, lambda details: normalize_subject_details(subject_name, details))
+        subject_data = load_subject_details(subject_name)
 
     # Process each test
-    for test in subject_data.get('tests', []):
-        # Make sure each test is a dictionary
-        if not isinstance(test, dict):
-            continue
-
-        # Make sure each test has an id
-        if 'id' not in test:
-            test['id'] = str(uuid.uuid4())  # Generate an id if missing
+    for test in subject_data['tests']:
+        # Load the running totals once per test
+        aggregates = load_progress_aggregates(subject_name, test['id'])
 
         # Calculate progress for each test
-        test['progress'] = calculate_progress(test, subject_name)
+        test['progress'] = calculate_progress(test, subject_name, aggregates)
 
-        # Make sure each topic has resources initialized
-        if 'topics' in test and isinstance(test['topics'], list):
+        # Initialize completed count and scores for each resource
+        if isinstance(test.get('topics'), list):
             for topic in test['topics']:
-                if isinstance(topic, dict) and 'resources' not in topic:
-                    topic['resources'] = []
-
-                # Initialize completed count and scores for each resource
-                if isinstance(topic, dict) and 'resources' in topic:
-                    progress_records = load_progress_records(subject_name, test['id'])
+                if isinstance(topic, dict):
                     for resource in topic['resources']:
                         if isinstance(resource, dict):
-                            # Count completed instances in progress records
-                            completed_records = [r for r in progress_records.get('records', [])
-                                                 if r.get('resource_id') == resource.get('id')]
-                            resource['completed'] = len(completed_records)
+                            # Count completed instances from the running totals
+                            resource['completed'] = aggregates['by_resource'].get(resource.get('id'), 0)
 
                             # Add scores if they exist
-                            resource['scores'] = []
-                            for record in completed_records:
-                                if 'score' in record:
-                                    resource['scores'].append(record['score'])
+                            resource['scores'] = resource_scores(aggregates, resource.get('id'))
 
-    # Save any updates to IDs or initialized structures
-    save_subject_details(subject_name, subject_data)
+    return render_template('subject_details.html',
+                           subject_name=subject_name,
+                           subject_data=subject_data)
 
-    # Sort tests by date (upcoming first)
-    if subject_data.get('tests'):
-        # Filter out any non-dictionary tests
-        subject_data['tests'] = [t for t in subject_data.get('tests', []) if isinstance(t, dict)]
 
-        # Make sure each test has a date field before sorting
-        tests_with_dates = [t for t in subject_data['tests'] if 'date' in t]
+def normalize_subject_details(subject_name, subject_data):
+    """
+    Fill in missing ids and resource lists and sort tests by date (upcoming first).
+    Returns True if subject_data was changed and needs saving.
+    """
+    changed = False
 
-        # Sort by date
-        if tests_with_dates:
-            tests_with_dates = sorted(tests_with_dates,
-                                      key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
+    # Initialize tests if not present
+    if 'tests' not in subject_data:
+        subject_data['tests'] = []
+        changed = True
 
-            # Add back any tests without dates at the end
-            tests_without_dates = [t for t in subject_data['tests'] if 'date' not in t]
-            subject_data['tests'] = tests_with_dates + tests_without_dates
+    # Filter out any non-dictionary tests
+    tests = [t for t in subject_data['tests'] if isinstance(t, dict)]
+    if len(tests) != len(subject_data['tests']):
+        changed = True
 
-    # Save sorted tests back to the file
-    save_subject_details(subject_name, subject_data)
+    for test in tests:
+        # Make sure each test has an id
+        if 'id' not in test:
+            test['id'] = str(uuid.uuid4())  # Generate an id if missing
+            update_resource_index(resource_index.add_test, subject_name, test)
+            changed = True
 
-    return render_template('subject_details.html',
-                           subject_name=subject_name,
-                           subject_data=subject_data)
+        # Make sure each topic has resources initialized
+        if isinstance(test.get('topics'), list):
+            for topic in test['topics']:
+                if isinstance(topic, dict) and 'resources' not in topic:
+                    topic['resources'] = []
+                    changed = True
+
+    # Sort by date, adding back any tests without dates at the end
+    tests_with_dates = sorted([t for t in tests if 'date' in t],
+                              key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'))
+    tests_without_dates = [t for t in tests if 'date' not in t]
+    tests = tests_with_dates + tests_without_dates
+
+    if [id(t) for t in tests] != [id(t) for t in subject_data['tests']]:
+        subject_data['tests'] = tests
+        changed = True
 
-@app.route('/edit_test', methods=['POST'])
+    return changed
+
+@bp.route('/edit_test', methods=['POST'])
 def edit_test():
     """Edit a test name and date"""
     subject_name = request.form.get('subject_name', '').strip()
@@ -885,50 +1590,46 @@ def edit_test():
     test_date = request.form.get('test_date', '').strip()
 
     if name and test_date and subject_name and test_id:
-        # Load existing details
-        details = load_subject_details(subject_name)
-
-        # Find the test to update
-        for test in details.get('tests', []):
-            if isinstance(test, dict) and test.get('id') == test_id:
-                test['name'] = name
-                test['date'] = test_date
-                break
+        def change(details):
+            # Find the test to update
+            for test in details.get('tests', []):
+                if isinstance(test, dict) and test.get('id') == test_id:
+                    test['name'] = name
+                    test['date'] = test_date
+                    break
 
         # Save updated details
-        save_subject_details(subject_name, details)
+        modify_subject_details(subject_name, change)
         flash('Test updated successfully!', 'success')
     else:
         flash('Please enter a valid test name and date!', 'error')
 
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
-@app.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/edit', methods=['POST'])
+@bp.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/edit', methods=['POST'])
 def edit_test_topic(subject_name, test_id, topic_id):
     """Edit a topic name"""
     topic_name = request.form.get('topic_name', '').strip()
 
     if topic_name:
-        # Load existing details
-        details = load_subject_details(subject_name)
-
-        # Find the test and the topic to update
-        for test in details.get('tests', []):
-            if isinstance(test, dict) and test.get('id') == test_id:
-                for topic in test.get('topics', []):
-                    if isinstance(topic, dict) and topic.get('id') == topic_id:
-                        topic['name'] = topic_name
-                        break
+        def change(details):
+            # Find the test and the topic to update
+            for test in details.get('tests', []):
+                if isinstance(test, dict) and test.get('id') == test_id:
+                    for topic in test.get('topics', []):
+                        if isinstance(topic, dict) and topic.get('id') == topic_id:
+                            topic['name'] = topic_name
+                            break
 
         # Save updated details
-        save_subject_details(subject_name, details)
+        modify_subject_details(subject_name, change)
         flash(f'Topic "{topic_name}" updated successfully!', 'success')
     else:
         flash('Please enter a valid topic name!', 'error')
 
-    return redirect(url_for('edit_test_topics', subject_name=subject_name, test_id=test_id))
+    return redirect(url_for('main.edit_test_topics', subject_name=subject_name, test_id=test_id))
 
-@app.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/resource/<resource_id>/edit', methods=['POST'])
+@bp.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/resource/<resource_id>/edit', methods=['POST'])
 def edit_topic_resource(subject_name, test_id, topic_id, resource_id):
     """Edit a resource name and count"""
     resource_name = request.form.get('resource_name', '').strip()
@@ -943,30 +1644,28 @@ def edit_topic_resource(subject_name, test_id, topic_id, resource_id):
         count = 1
 
     if resource_name:
-        # Load existing details
-        details = load_subject_details(subject_name)
-
-        # Find the test, topic and resource to update
-        for test in details.get('tests', []):
-            if isinstance(test, dict) and test.get('id') == test_id:
-                for topic in test.get('topics', []):
-                    if isinstance(topic, dict) and topic.get('id') == topic_id:
-                        for resource in topic.get('resources', []):
-                            if isinstance(resource, dict) and resource.get('id') == resource_id:
-                                resource['name'] = resource_name
-                                resource['count'] = count
-                                break
+        def change(details):
+            # Find the test, topic and resource to update
+            for test in details.get('tests', []):
+                if isinstance(test, dict) and test.get('id') == test_id:
+                    for topic in test.get('topics', []):
+                        if isinstance(topic, dict) and topic.get('id') == topic_id:
+                            for resource in topic.get('resources', []):
+                                if isinstance(resource, dict) and resource.get('id') == resource_id:
+                                    resource['name'] = resource_name
+                                    resource['count'] = count
+                                    break
 
         # Save updated details
-        save_subject_details(subject_name, details)
+        modify_subject_details(subject_name, change)
         flash(f'Resource "{resource_name}" updated successfully!', 'success')
     else:
         flash('Please enter a valid resource name!', 'error')
 
-    return redirect(url_for('edit_test_topics', subject_name=subject_name, test_id=test_id))
+    return redirect(url_for('main.edit_test_topics', subject_name=subject_name, test_id=test_id))
 
 
-@app.route('/subject/<subject_name>/test/<test_id>/topics', methods=['GET'])
+@bp.route('/subject/<subject_name>/test/<test_id>/topics', methods=['GET'])
 def edit_test_topics(subject_name, test_id):
     """Edit topics for a test"""
     # Load details for the subject
@@ -981,87 +1680,91 @@ def edit_test_topics(subject_name, test_id):
                                test=test)
 
     flash('Test not found!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
 
 
 
-@app.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/delete_resource/<resource_id>', methods=['POST'])
+@bp.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/delete_resource/<resource_id>', methods=['POST'])
 def delete_topic_resource(subject_name, test_id, topic_id, resource_id):
     """Delete a resource from a topic"""
-    # Load existing details
-    details = load_subject_details(subject_name)
-    
-    # Load progress records
-    progress_records = load_progress_records(subject_name, test_id)
+    def change(details):
+        # Find the test
+        test = next((t for t in details.get('tests', []) if isinstance(t, dict) and t.get('id') == test_id), None)
 
-    # Find the test
-    test = next((t for t in details.get('tests', []) if isinstance(t, dict) and t.get('id') == test_id), None)
+        if test and isinstance(test.get('topics'), list):
+            # Find the topic
+            topic = next((t for t in test['topics'] if isinstance(t, dict) and t.get('id') == topic_id), None)
 
-    if test and isinstance(test.get('topics'), list):
-        # Find the topic
-        topic = next((t for t in test['topics'] if isinstance(t, dict) and t.get('id') == topic_id), None)
+            if topic and isinstance(topic.get('resources'), list):
+                # Remove the resource
+                topic['resources'] = [r for r in topic['resources'] if r.get('id') != resource_id]
+                return True
+        return False
 
-        if topic and isinstance(topic.get('resources'), list):
-            # Remove the resource
-            topic['resources'] = [r for r in topic['resources'] if r.get('id') != resource_id]
-            
-            # Remove progress records for this resource
-            if 'records' in progress_records:
-                progress_records['records'] = [r for r in progress_records['records'] 
-                                              if r.get('resource_id') != resource_id]
-                
-                # Save updated progress records
-                save_progress_records(subject_name, test_id, progress_records)
+    def remove_records(progress_records):
+        # Remove progress records for this resource
+        if 'records' in progress_records:
+            progress_records['records'] = [r for r in progress_records['records']
+                                           if r.get('resource_id') != resource_id]
 
-            # Save updated details
-            save_subject_details(subject_name, details)
-            flash('Resource deleted successfully!', 'success')
+    # Save updated details
+    removed, version = modify_subject_details(subject_name, change)
+    if removed:
+        # Save updated progress records
+        modify_progress_records(subject_name, test_id, remove_records)
+        update_resource_index(resource_index.remove_resource, resource_id)
+        flash('Resource deleted successfully!', 'success')
 
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
 
-@app.route('/subject/<subject_name>/test/<test_id>/delete_topic/<topic_id>', methods=['POST'])
+@bp.route('/subject/<subject_name>/test/<test_id>/delete_topic/<topic_id>', methods=['POST'])
 def delete_test_topic(subject_name, test_id, topic_id):
     """Delete a topic from a test"""
-    # Load existing details
-    details = load_subject_details(subject_name)
-    
-    # Load progress records
-    progress_records = load_progress_records(subject_name, test_id)
+    def change(details):
+        """Remove the topic; returns the ids of its resources, or None if the test wasn't found"""
+        # Find the test
+        test = next((t for t in details.get('tests', []) if isinstance(t, dict) and t.get('id') == test_id), None)
 
-    # Find the test
-    test = next((t for t in details.get('tests', []) if isinstance(t, dict) and t.get('id') == test_id), None)
+        if test and isinstance(test.get('topics'), list):
+            # Find the topic to be deleted
+            topic_to_delete = next((t for t in test['topics'] if isinstance(t, dict) and t.get('id') == topic_id),
+                                   None)
 
-    if test and isinstance(test.get('topics'), list):
-        # Find the topic to be deleted
-        topic_to_delete = next((t for t in test['topics'] if isinstance(t, dict) and t.get('id') == topic_id), None)
-        
-        if topic_to_delete and isinstance(topic_to_delete.get('resources'), list):
             # Get all resource IDs from the topic to be deleted
-            resource_ids = [r.get('id') for r in topic_to_delete.get('resources') if isinstance(r, dict) and 'id' in r]
-            
+            resource_ids = []
+            if topic_to_delete and isinstance(topic_to_delete.get('resources'), list):
+                resource_ids = [r.get('id') for r in topic_to_delete.get('resources')
+                                if isinstance(r, dict) and 'id' in r]
+
+            # Remove the topic
+            test['topics'] = [t for t in test['topics'] if t.get('id') != topic_id]
+            return resource_ids
+        return None
+
+    # Save updated details
+    resource_ids, version = modify_subject_details(subject_name, change)
+    if resource_ids is not None:
+        def remove_records(progress_records):
             # Remove progress records for all resources in the topic
             if 'records' in progress_records:
-                progress_records['records'] = [r for r in progress_records['records'] 
-                                              if r.get('resource_id') not in resource_ids]
-                
-                # Save updated progress records
-                save_progress_records(subject_name, test_id, progress_records)
-        
-        # Remove the topic
-        test['topics'] = [t for t in test['topics'] if t.get('id') != topic_id]
+                progress_records['records'] = [r for r in progress_records['records']
+                                               if r.get('resource_id') not in resource_ids]
 
-        # Save updated details
-        save_subject_details(subject_name, details)
+        # Save updated progress records
+        if resource_ids:
+            modify_progress_records(subject_name, test_id, remove_records)
+        update_resource_index(resource_index.remove_topic, topic_id)
         flash('Topic deleted successfully!', 'success')
 
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/track-progress/<subject_name>/<test_id>', methods=['GET'])
+@bp.route('/track-progress/<subject_name>/<test_id>', methods=['GET'])
+@conditional_view
 def track_progress(subject_name, test_id):
     """Track progress for a test"""
     # Load details for the subject
@@ -1075,22 +1778,19 @@ def track_progress(subject_name, test_id):
         progress_percentage = calculate_progress(test, subject_name)
         test['progress'] = progress_percentage
 
-        # Load progress records
+        # Load progress records and their running totals
         progress_records = load_progress_records(subject_name, test_id)
+        aggregates = load_progress_aggregates(subject_name, test_id)
 
         # Process resources to include scores
         for topic in test.get('topics', []):
             if isinstance(topic, dict) and 'resources' in topic:
                 for resource in topic.get('resources', []):
                     # Count completed resources
-                    resource['completed'] = len([r for r in progress_records.get('records', [])
-                                                 if r.get('resource_id') == resource.get('id')])
+                    resource['completed'] = aggregates['by_resource'].get(resource.get('id'), 0)
 
                     # Add scores if they exist
-                    resource['scores'] = []
-                    for record in progress_records.get('records', []):
-                        if record.get('resource_id') == resource.get('id') and 'score' in record:
-                            resource['scores'].append(record['score'])
+                    resource['scores'] = resource_scores(aggregates, resource.get('id'))
 
         # Get date counts for chart
         date_counts = get_date_counts(subject_name, test_id)
@@ -1106,9 +1806,9 @@ def track_progress(subject_name, test_id):
                                topic_counts=topic_counts)
 
     flash('Test not found!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
-@app.route('/track-progress/<subject_name>/<test_id>/add_record', methods=['POST'])
+@bp.route('/track-progress/<subject_name>/<test_id>/add_record', methods=['POST'])
 def add_progress_record(subject_name, test_id):
     """Add a progress record for a test"""
     topic_id = request.form.get('topic_id', '').strip()
@@ -1116,9 +1816,8 @@ def add_progress_record(subject_name, test_id):
     notes = request.form.get('notes', '').strip()
 
     if topic_id and resource_id:
-        # Load subject details and progress records
+        # Load subject details
         subject_data = load_subject_details(subject_name)
-        progress_data = load_progress_records(subject_name, test_id)
 
         # Find the test
         test = next((t for t in subject_data.get('tests', []) if isinstance(t, dict) and t.get('id') == test_id), None)
@@ -1133,10 +1832,6 @@ def add_progress_record(subject_name, test_id):
                                 None)
 
                 if resource:
-                    # Initialize records list if not exists
-                    if 'records' not in progress_data:
-                        progress_data['records'] = []
-
                     # Add record with timestamp
                     now = datetime.now()
                     record = {
@@ -1150,16 +1845,12 @@ def add_progress_record(subject_name, test_id):
                         'timestamp': now.strftime('%Y-%m-%d %H:%M:%S')
                     }
 
-                    progress_data['records'].append(record)
-
-                    # Save progress records
-                    save_progress_records(subject_name, test_id, progress_data)
-
-                    # Get today's completed resources for this test
-                    todays_resources = get_todays_resources(subject_name, test_id)
+                    # Append the record to the progress log
+                    append_progress_record(subject_name, test_id, record)
+                    aggregates = load_progress_aggregates(subject_name, test_id)
 
                     # If this is the first record today, send a daily progress email
-                    if len(todays_resources) == 1:
+                    if aggregates['by_date'].get(record['date']) == 1:
                         send_daily_progress_email(subject_name, test['name'], [record])
 
                     # Check if test progress is complete (100%)
@@ -1173,10 +1864,10 @@ def add_progress_record(subject_name, test_id):
 
                         # Send completion email
                         send_test_complete_email(subject_name, test['name'], progress_percentage,
-                                                 len(progress_data['records']), total_resources)
+                                                 aggregates['total'], total_resources)
 
                     flash('Progress recorded successfully!', 'success')
-                    return redirect(url_for('track_progress', subject_name=subject_name, test_id=test_id))
+                    return redirect(url_for('main.track_progress', subject_name=subject_name, test_id=test_id))
 
                 flash('Resource not found!', 'error')
             else:
@@ -1186,10 +1877,11 @@ def add_progress_record(subject_name, test_id):
     else:
         flash('Please select a topic and resource!', 'error')
 
-    return redirect(url_for('track_progress', subject_name=subject_name, test_id=test_id))
+    return redirect(url_for('main.track_progress', subject_name=subject_name, test_id=test_id))
 
 
-@app.route('/test-statistics/<subject_name>/<test_id>')
+@bp.route('/test-statistics/<subject_name>/<test_id>')
+@conditional_view
 def test_statistics(subject_name, test_id):
     """Show statistics for a test"""
     # Load details for the subject
@@ -1224,23 +1916,16 @@ def test_statistics(subject_name, test_id):
                                today=date.today())  # Pass today's date to template
 
     flash('Test not found!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/subject/<subject_name>/add_test', methods=['POST'])
+@bp.route('/subject/<subject_name>/add_test', methods=['POST'])
 def add_test(subject_name):
     """Add a new test for a subject"""
     name = request.form.get('test_name', '').strip()
     test_date = request.form.get('test_date', '').strip()
 
     if name and test_date:
-        # Load existing details
-        details = load_subject_details(subject_name)
-
-        # Initialize tests list if not exists
-        if 'tests' not in details:
-            details['tests'] = []
-
         # Generate a unique ID for the test
         test_id = str(uuid.uuid4())
 
@@ -1253,21 +1938,27 @@ def add_test(subject_name):
             'progress': 0  # Initialize progress at 0%
         }
 
-        details['tests'].append(new_test)
+        def change(details):
+            # Initialize tests list if not exists
+            if 'tests' not in details:
+                details['tests'] = []
+            details['tests'].append(new_test)
 
         # Save updated details
-        save_subject_details(subject_name, details)
+        _, version = modify_subject_details(subject_name, change, if_match_version())
+        update_resource_index(resource_index.add_test, subject_name, new_test)
 
         # Return JSON response instead of redirect for AJAX
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({
+            return versioned_response({
                 'success': True,
                 'message': 'Test added successfully!',
-                'test': new_test
-            })
+                'test': new_test,
+                'version': version
+            }, version)
 
         flash('Test added successfully!', 'success')
-        return redirect(url_for('subject_details', subject_name=subject_name))
+        return redirect(url_for('main.subject_details', subject_name=subject_name))
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({
@@ -1276,10 +1967,10 @@ def add_test(subject_name):
         }), 400
 
     flash('Please enter a valid test name and date!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/subject/<subject_name>/test/<test_id>/add_topic', methods=['POST'])
+@bp.route('/subject/<subject_name>/test/<test_id>/add_topic', methods=['POST'])
 def add_test_topic(subject_name, test_id):
     """Add a new topic to a test"""
     topic_name = request.form.get('topic_name', '').strip()
@@ -1315,25 +2006,35 @@ def add_test_topic(subject_name, test_id):
                     'name': topic_name,
                     'resources': []
                 }
-                test['topics'].append(new_topic)
+
+                def change(details):
+                    # Add it to the current copy of the test
+                    for test in details.get('tests', []):
+                        if isinstance(test, dict) and test.get('id') == test_id:
+                            if not isinstance(test.get('topics'), list):
+                                test['topics'] = []
+                            test['topics'].append(new_topic)
+                            break
 
                 # Save updated details
-                save_subject_details(subject_name, details)
+                _, version = modify_subject_details(subject_name, change, if_match_version())
+                update_resource_index(resource_index.add_topic, subject_name, test_id, new_topic)
 
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return jsonify({
+                    return versioned_response({
                         'success': True,
                         'message': f'Topic "{topic_name}" added successfully!',
                         'topic': new_topic,
-                        'test_id': test_id
-                    })
+                        'test_id': test_id,
+                        'version': version
+                    }, version)
 
                 flash(f'Topic "{topic_name}" added successfully!', 'success')
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return jsonify({'redirect': url_for('edit_test_topics', subject_name=subject_name, test_id=test_id)})
+                return jsonify({'redirect': url_for('main.edit_test_topics', subject_name=subject_name, test_id=test_id)})
 
-            return redirect(url_for('edit_test_topics', subject_name=subject_name, test_id=test_id))
+            return redirect(url_for('main.edit_test_topics', subject_name=subject_name, test_id=test_id))
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({
@@ -1351,10 +2052,10 @@ def add_test_topic(subject_name, test_id):
 
         flash('Please enter a valid topic name!', 'error')
 
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/add_resource', methods=['POST'])
+@bp.route('/subject/<subject_name>/test/<test_id>/topic/<topic_id>/add_resource', methods=['POST'])
 def add_topic_resource(subject_name, test_id, topic_id):
     """Add a new resource to a topic"""
     resource_name = request.form.get('resource_name', '').strip()
@@ -1392,22 +2093,32 @@ def add_topic_resource(subject_name, test_id, topic_id):
                     'count': count,
                     'completed': 0  # Initialize completed at 0
                 }
-                topic['resources'].append(new_resource)
+
+                def change(details):
+                    # Add it to the current copy of the topic
+                    for test in details.get('tests', []):
+                        if isinstance(test, dict) and test.get('id') == test_id:
+                            for topic in test.get('topics', []):
+                                if isinstance(topic, dict) and topic.get('id') == topic_id:
+                                    topic.setdefault('resources', []).append(new_resource)
+                                    return
 
                 # Save updated details
-                save_subject_details(subject_name, details)
+                _, version = modify_subject_details(subject_name, change, if_match_version())
+                update_resource_index(resource_index.add_resource, subject_name, test_id, topic_id, new_resource)
 
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return jsonify({
+                    return versioned_response({
                         'success': True,
                         'message': f'Resource "{resource_name}" added successfully!',
                         'resource': new_resource,
                         'topic_id': topic_id,
-                        'test_id': test_id
-                    })
+                        'test_id': test_id,
+                        'version': version
+                    }, version)
 
                 flash(f'Resource "{resource_name}" added successfully!', 'success')
-                return redirect(url_for('edit_test_topics', subject_name=subject_name, test_id=test_id))
+                return redirect(url_for('main.edit_test_topics', subject_name=subject_name, test_id=test_id))
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({
@@ -1433,50 +2144,46 @@ def add_topic_resource(subject_name, test_id, topic_id):
 
         flash('Please enter a valid resource name!', 'error')
 
-    return redirect(url_for('edit_test_topics', subject_name=subject_name, test_id=test_id))
+    return redirect(url_for('main.edit_test_topics', subject_name=subject_name, test_id=test_id))
 
 
 
 
-@app.route('/subject/<subject_name>/delete_topic/<topic_id>', methods=['POST'])
+@bp.route('/subject/<subject_name>/delete_topic/<topic_id>', methods=['POST'])
 def delete_subject_topic(subject_name, topic_id):
     """Delete a topic from a subject"""
-    # Load existing details
-    details = load_subject_details(subject_name)
-
-    # Remove the topic
-    details['topics'] = [
-        topic for topic in details.get('topics', []) 
-        if topic.get('id') != topic_id
-    ]
+    def change(details):
+        # Remove the topic
+        details['topics'] = [
+            topic for topic in details.get('topics', [])
+            if topic.get('id') != topic_id
+        ]
 
     # Save updated details
-    save_subject_details(subject_name, details)
+    modify_subject_details(subject_name, change)
     
     flash('Topic deleted successfully!', 'success')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
-@app.route('/subject/<subject_name>/topic/<topic_id>/delete_resource/<resource_id>', methods=['POST'])
+@bp.route('/subject/<subject_name>/topic/<topic_id>/delete_resource/<resource_id>', methods=['POST'])
 def delete_subject_topic_resource(subject_name, topic_id, resource_id):
     """Delete a resource from a subject's topic"""
-    # Load existing details
-    details = load_subject_details(subject_name)
-
-    # Find the topic
-    for topic in details.get('topics', []):
-        if topic.get('id') == topic_id:
-            # Remove the resource
-            topic['resources'] = [
-                resource for resource in topic.get('resources', [])
-                if resource.get('id') != resource_id
-            ]
-            break
+    def change(details):
+        # Find the topic
+        for topic in details.get('topics', []):
+            if topic.get('id') == topic_id:
+                # Remove the resource
+                topic['resources'] = [
+                    resource for resource in topic.get('resources', [])
+                    if resource.get('id') != resource_id
+                ]
+                break
 
     # Save updated details
-    save_subject_details(subject_name, details)
+    modify_subject_details(subject_name, change)
     
     flash('Resource deleted successfully!', 'success')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
 
@@ -1491,7 +2198,7 @@ def delete_subject_topic_resource(subject_name, topic_id, resource_id):
 
 
 
-@app.route('/edit-subject-name', methods=['POST'])
+@bp.route('/edit-subject-name', methods=['POST'])
 def edit_subject_name():
     """
     Edit a subject's name.
@@ -1507,7 +2214,7 @@ def edit_subject_name():
             return jsonify({'success': False, 'message': 'Both original and new subject names are required!'})
         else:
             flash('Both original and new subject names are required!', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
 
     # Load subjects
     subjects = load_subjects()
@@ -1518,54 +2225,34 @@ def edit_subject_name():
             return jsonify({'success': False, 'message': f'Subject "{original_subject_name}" not found!'})
         else:
             flash(f'Subject "{original_subject_name}" not found!', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
 
-    # Check if new subject name already exists
-    if new_subject_name in subjects and new_subject_name != original_subject_name:
+    # Check if new subject name already exists (or still has data stored under it)
+    if new_subject_name != original_subject_name and (
+            new_subject_name in subjects or get_storage().has_subject_details(new_subject_name)):
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': False, 'message': f'Subject "{new_subject_name}" already exists!'})
         else:
             flash(f'Subject "{new_subject_name}" already exists!', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
 
     try:
+        # Move the subject's details and progress records to the new name (first, in case it is refused)
+        get_storage().rename_subject(original_subject_name, new_subject_name)
+
         # Update the subject name in the subjects list
         subjects[subjects.index(original_subject_name)] = new_subject_name
         save_subjects(subjects)
 
-        # Update the subject details file
-        original_file_path = get_subject_details_file(original_subject_name)
-        if os.path.exists(original_file_path):
-            # Load original subject details
-            subject_details = load_subject_details(original_subject_name)
-            
-            # Save with new name
-            save_subject_details(new_subject_name, subject_details)
-            
-            # Remove original file
-            os.remove(original_file_path)
-
-        # Update any progress records
-        safe_original = re.sub(r'[^\w]', '_', original_subject_name)
-        safe_new = re.sub(r'[^\w]', '_', new_subject_name)
-        
-        for filename in os.listdir(PROGRESS_DIR):
-            if filename.startswith(f"{safe_original}_"):
-                # Get the test_id part
-                test_id = filename.replace(f"{safe_original}_", "").split("_")[0]
-                
-                # Load progress data
-                progress_file = os.path.join(PROGRESS_DIR, filename)
-                with open(progress_file, 'r') as file:
-                    progress_data = json.load(file)
-                
-                # Save to new file
-                new_progress_file = os.path.join(PROGRESS_DIR, f"{safe_new}_{test_id}_progress.json")
-                with open(new_progress_file, 'w') as file:
-                    json.dump(progress_data, file)
-                
-                # Remove original file
-                os.remove(progress_file)
+        # Move it in the derived documents and reminders too
+        update_resource_index(resource_index.rename_subject, original_subject_name, new_subject_name)
+        remove_dashboard_subject(original_subject_name)
+        refresh_dashboard_subject(new_subject_name)
+        update_past_test_summaries(past_test_summaries.rename_subject, original_subject_name, new_subject_name)
+        update_subject_manifest(subject_manifest.rename_subject, original_subject_name, new_subject_name)
+        update_sent_reminders(reminders.rename_subject, original_subject_name, new_subject_name)
+        schedule_reminders(original_subject_name)
+        schedule_reminders(new_subject_name, load_subject_details(new_subject_name))
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({
@@ -1582,9 +2269,9 @@ def edit_subject_name():
         else:
             flash(f'Error updating subject: {str(e)}', 'error')
 
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/edit-subjects')
+@bp.route('/edit-subjects')
 def edit_subjects():
     """Edit subjects"""
     subjects = load_subjects()
@@ -1613,7 +2300,7 @@ def edit_subjects():
     return render_template('edit_subjects.html', subjects=subjects, subject_stats=subject_stats)
 
 
-@app.route('/add-subject', methods=['POST'])
+@bp.route('/add-subject', methods=['POST'])
 def add_subject():
     """
     Add a new subject.
@@ -1654,9 +2341,9 @@ def add_subject():
             flash('Please enter a valid subject name!', 'error')
 
     # Redirect to index page instead of edit_subjects
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/delete_subject', methods=['POST'])
+@bp.route('/delete_subject', methods=['POST'])
 def delete_subject():
     """
     Delete a subject and all its associated data.
@@ -1677,20 +2364,14 @@ def delete_subject():
         # Save the updated subjects list
         save_subjects(subjects)
 
-        # Clean up: Delete the subject details file
-        file_path = get_subject_details_file(subject_to_delete)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            
-        # Clean up: Delete all related progress files
-        # First create a safe version of the subject name for filename matching
-        safe_name = re.sub(r'[^\w]', '_', subject_to_delete)
-        
-        # Loop through all files in the progress directory
-        for filename in os.listdir(PROGRESS_DIR):
-            # If the file belongs to this subject, delete it
-            if filename.startswith(f"{safe_name}_"):
-                os.remove(os.path.join(PROGRESS_DIR, filename))
+        # Clean up: Delete the subject details and all related progress records
+        get_storage().delete_subject(subject_to_delete)
+        update_resource_index(resource_index.remove_subject, subject_to_delete)
+        remove_dashboard_subject(subject_to_delete)
+        update_past_test_summaries(past_test_summaries.remove_subject, subject_to_delete)
+        update_subject_manifest(subject_manifest.remove_subject, subject_to_delete)
+        update_sent_reminders(reminders.remove_subject, subject_to_delete)
+        schedule_reminders(subject_to_delete)
                 
         # Show a success message
         flash(f'Subject "{subject_to_delete}" deleted successfully!', 'success')
@@ -1699,101 +2380,59 @@ def delete_subject():
         flash(f'Subject "{subject_to_delete}" not found!', 'error')
 
     # Redirect back to the index page
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
 
-@app.template_filter('today')
+@bp.app_template_filter('today')
 def today():
     """Return today's date as a datetime object for use in templates"""
     return datetime.now().date()
 
 # Make today() available as a function in templates
-app.jinja_env.globals['today'] = today
+bp.add_app_template_global(today, 'today')
 
-@app.route('/past-tests')
+@bp.route('/past-tests')
+@conditional_view
 def past_tests():
     """Show statistics for past tests"""
     subjects = load_subjects()
     past_tests = []
-    
-    for subject_name in subjects:
-        # Load details for the subject
-        subject_data = load_subject_details(subject_name)
-        
+
+    # Frozen record summaries, so past tests' histories aren't reloaded on every visit
+    summaries = load_past_test_summaries()
+
+    sections, _ = load_dashboard(subjects)
+    for subject_name, section in sections:
         # Process tests
-        for test in subject_data.get('tests', []):
-            # Make sure test is a dictionary with an id and date
-            if isinstance(test, dict) and 'id' in test and 'date' in test:
-                # Check if test is in the past
-                if is_past_test(test['date']):
-                    # Calculate progress
-                    test['progress'] = calculate_progress(test, subject_name)
-                    
-                    # Add subject name to test
-                    test['subject_name'] = subject_name
-                    
-                    # Load records for the test
-                    progress_records = load_progress_records(subject_name, test['id'])
-                    test['records'] = progress_records.get('records', [])
-                    
-                    # Get topic counts for the test explicitly
-                    topic_counts = get_topic_counts(subject_name, test['id'])
-                    test['topic_counts'] = topic_counts
-                    
-                    # Process each topic to include completion data
-                    if isinstance(test.get('topics'), list):
-                        for topic in test.get('topics', []):
-                            if isinstance(topic, dict) and 'resources' in topic:
-                                for resource in topic.get('resources', []):
-                                    # Count completed resources
-                                    resource['completed'] = len([r for r in test['records'] 
-                                                                if r.get('resource_id') == resource.get('id')])
-
-                    # Compute date statistics - Sort dates and get unique dates
-                    unique_dates = set()
-                    for record in test['records']:
-                        record_date = record.get('date')
-                        if record_date:
-                            unique_dates.add(record_date)
-                    
-                    test['unique_dates'] = sorted(list(unique_dates))
-                    
-                    # Create date_counts dictionary for the timeline
-                    date_counts = {}
-                    for record in test['records']:
-                        record_date = record.get('date')
-                        if record_date:
-                            if record_date in date_counts:
-                                date_counts[record_date] += 1
-                            else:
-                                date_counts[record_date] = 1
-                    
-                    test['date_counts'] = date_counts
-                    
-                    # Calculate scores statistics if available
-                    scores = []
-                    for record in test['records']:
-                        if 'score' in record and record['score'] is not None:
-                            scores.append(record['score'])
-                    
-                    test['scores'] = scores
-                    test['avg_score'] = sum(scores) / len(scores) if scores else 0
-                    
-                    past_tests.append(test)
-    
+        for entry in section['tests']:
+            # Make sure test has a date and is in the past
+            if 'date' in entry and is_past_test(entry['date']):
+                test = {
+                    'id': entry['id'],
+                    'date': entry['date'],
+                    'subject_name': subject_name,
+                    'progress': progress_percentage(entry['completed'], entry['required']),
+                    'completed_resources': entry['completed'],
+                    'total_resources': entry['required']
+                }
+                if 'name' in entry:
+                    test['name'] = entry['name']
+
+                # Add study dates, per-date and per-topic counts and scores
+                test.update(past_test_summary(summaries, subject_name, entry['id'], entry['version']))
+
+                past_tests.append(test)
+
     # Sort tests by date (most recent first)
-    if past_tests:
-        past_tests = sorted(past_tests,
-                            key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d'),
-                            reverse=True)
-    
+    past_tests.sort(key=lambda x: x['date'], reverse=True)
+
     return render_template('past_tests.html', past_tests=past_tests)
 
 
 # === Email Notification Routes ===
 
-@app.route('/send-test-reminder/<subject_name>/<test_id>', methods=['POST'])
+@bp.route('/send-test-reminder/<subject_name>/<test_id>', methods=['POST'])
 def send_test_reminder(subject_name, test_id):
     """Send a test reminder email"""
     # Load subject details
@@ -1809,13 +2448,13 @@ def send_test_reminder(subject_name, test_id):
         # Send reminder email
         send_test_reminder_email(subject_name, test['name'], test['date'], progress)
 
-        return redirect(url_for('track_progress', subject_name=subject_name, test_id=test_id))
+        return redirect(url_for('main.track_progress', subject_name=subject_name, test_id=test_id))
 
     flash('Test not found!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/send-progress-summary/<subject_name>/<test_id>', methods=['POST'])
+@bp.route('/send-progress-summary/<subject_name>/<test_id>', methods=['POST'])
 def send_progress_summary(subject_name, test_id):
     """Send a progress summary email"""
     # Load subject details
@@ -1835,127 +2474,221 @@ def send_progress_summary(subject_name, test_id):
         else:
             flash('No progress recorded today!', 'error')
 
-        return redirect(url_for('track_progress', subject_name=subject_name, test_id=test_id))
+        return redirect(url_for('main.track_progress', subject_name=subject_name, test_id=test_id))
 
     flash('Test not found!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/check-upcoming-tests')
+@bp.route('/check-upcoming-tests')
 def check_upcoming_tests():
-    """Check for upcoming tests and send reminders"""
-    upcoming_tests = get_upcoming_tests(days=7)
-
-    for test in upcoming_tests:
-        subject_name = test['subject_name']
-        test_date_obj = datetime.strptime(test['date'], '%Y-%m-%d').date()
-        today = date.today()
-        days_remaining = (test_date_obj - today).days
-
-        # Send reminder for tests that are 7, 3, or 1 day away
-        if days_remaining in [7, 3, 1]:
-            send_test_reminder_email(subject_name, test['name'], test['date'], test['progress'])
+    """Send any test reminders that are due now (the scheduler also does this in the background)"""
+    # A one-off check when the scheduler thread is turned off
+    get_reminder_scheduler().check()
 
     flash('Checked for upcoming tests and sent reminders!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
-@app.route('/static/<path:filename>')
+@bp.route('/static/<path:filename>')
 def serve_static(filename):
     """Serve static files"""
-    return send_from_directory(app.static_folder, filename)
+    return send_from_directory(current_app.static_folder, filename)
+
+
+def new_progress_record(topic, resource, score=None):
+    """Build a progress record for one completion of a resource, stamped with the current time"""
+    now = datetime.now()
+    record = {
+        'id': str(uuid.uuid4()),
+        'topic_id': topic['id'],
+        'topic_name': topic['name'],
+        'resource_id': resource['id'],
+        'resource_name': resource['name'],
+        'notes': '',
+        'date': now.strftime('%Y-%m-%d'),
+        'timestamp': now.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+    # Add score if provided
+    if score is not None:
+        record['score'] = float(score)
+
+    return record
+
+
+def parse_progress_operations(operations):
+    """
+    Check every {resource_id, change, score} operation before any of them is applied:
+    resource_id a string, change an integer (0 if left out, as /update-progress has
+    always taken it) and score a number or empty. Returns (operations with the score
+    as a float or None, None), or (None, error message).
+    """
+    if not isinstance(operations, list):
+        return None, 'Expected a list of operations'
+
+    parsed = []
+    for number, operation in enumerate(operations, 1):
+        if not isinstance(operation, dict):
+            return None, f"Operation {number} is not an object"
+
+        resource_id = operation.get('resource_id')
+        if not isinstance(resource_id, str) or not resource_id:
+            return None, f"Operation {number}: resource_id must be a string"
+
+        change = operation.get('change')
+        if change is None:
+            change = 0
+        if type(change) is not int:
+            return None, f"Operation {number}: change must be an integer"
+
+        score = operation.get('score')
+        if score == '':
+            score = None
+        if score is not None:
+            try:
+                if isinstance(score, bool):
+                    raise ValueError(score)
+                score = float(score)
+            except (TypeError, ValueError):
+                return None, f"Operation {number}: score must be a number"
+            if not math.isfinite(score):
+                return None, f"Operation {number}: score must be a number"
+
+        parsed.append({'resource_id': resource_id, 'change': change, 'score': score})
+
+    return parsed, None
+
+
+def apply_progress_changes(operations, expected_version=None):
+    """
+    Apply a list of {resource_id, change, score} operations (checked by
+    parse_progress_operations) in order: a positive change adds one record and a
+    negative one removes the latest, within the resource's count; 0 changes nothing.
+    Operations are grouped by test and each test's records are written once, with a
+    compare-and-swap on the test's progress version so the completed counts can't be
+    pushed past a resource's count by concurrent updates. With expected_version (a client's If-Match) a test whose progress has
+    moved on raises VersionConflict. Returns {resource_id: {'completed', 'total',
+    'progress', 'version'}} for every resource that was found.
+    """
+    # Group the operations by the test their resource belongs to
+    groups = {}
+    for operation in operations:
+        found = find_resource(operation.get('resource_id'))
+        if found:
+            subject_name, test, topic, resource = found
+            groups.setdefault((subject_name, test['id']), (test, []))[1].append((operation, topic, resource))
+
+    results = {}
+    for (subject_name, test_id), (test, changes) in groups.items():
+        for attempt in range(SAVE_RETRIES):
+            aggregates = load_progress_aggregates(subject_name, test_id)
+            version = document_version(aggregates)
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"Progress for test {test_id} is at version {version}, not {expected_version}")
+
+            completed_counts = dict(aggregates['by_resource'])
+            test_results = {}
+            added = []
+            removed = {}
+
+            for operation, topic, resource in changes:
+                resource_id = resource['id']
+                change = operation['change']
+                completed = completed_counts.get(resource_id, 0)
+
+                # Calculate new completion count, kept within bounds
+                total = resource.get('count', 1)
+                new_completed = min(max(completed + change, 0), total)
+
+                # If incrementing, add a new record
+                if change > 0 and new_completed > completed:
+                    added.append(new_progress_record(topic, resource, operation['score']))
+
+                # If decrementing, remove the latest record (one added earlier in this batch if there is one)
+                elif change < 0 and new_completed < completed:
+                    pending = [record for record in added if record['resource_id'] == resource_id]
+                    if pending:
+                        added.remove(pending[-1])
+                    else:
+                        removed[resource_id] = removed.get(resource_id, 0) + 1
+
+                completed_counts[resource_id] = new_completed
+                test_results[resource_id] = {'completed': new_completed, 'total': total}
+
+            if not added and not removed:
+                break
+            try:
+                update_progress_records(subject_name, test_id, added, removed, expected_version=version)
+                break
+            except VersionConflict:
+                # Someone else changed this test's progress; work it out again from their counts
+                continue
+        else:
+            raise VersionConflict(f"Gave up saving progress for test {test_id} after {SAVE_RETRIES} conflicting saves")
+
+        # Calculate new progress percentage
+        progress = calculate_progress(test, subject_name)
+        version = document_version(get_backend().load_progress_aggregates(subject_name, test_id))
+        for resource_id, result in test_results.items():
+            results[resource_id] = dict(result, progress=progress, version=version)
+
+    return results
 
 
-@app.route('/update-progress', methods=['POST'])
+@bp.route('/update-progress', methods=['POST'])
 def update_progress():
     """Update progress for a resource (increment or decrement) with optional score"""
     try:
-        data = request.get_json()
-        resource_id = data.get('resource_id')
-        change = data.get('change', 0)  # 1 for increment, -1 for decrement
-        score = data.get('score')  # Optional score (percentage)
-
-        # We need to find which subject and test this resource belongs to
-        subjects = load_subjects()
-        for subject_name in subjects:
-            subject_data = load_subject_details(subject_name)
-            for test in subject_data.get('tests', []):
-                if isinstance(test, dict) and 'topics' in test and 'id' in test:
-                    for topic in test.get('topics', []):
-                        if isinstance(topic, dict) and 'resources' in topic:
-                            for resource in topic.get('resources', []):
-                                if isinstance(resource, dict) and resource.get('id') == resource_id:
-                                    # Found the resource - now update progress
-                                    progress_data = load_progress_records(subject_name, test['id'])
-
-                                    # Get current completed count
-                                    completed = 0
-                                    for record in progress_data.get('records', []):
-                                        if record.get('resource_id') == resource_id:
-                                            completed += 1
-
-                                    # Calculate new completion count
-                                    total = resource.get('count', 1)
-                                    new_completed = completed + change
-
-                                    # Ensure completed count is within bounds
-                                    if new_completed < 0:
-                                        new_completed = 0
-                                    if new_completed > total:
-                                        new_completed = total
-
-                                    # If incrementing, add a new record
-                                    if change > 0 and new_completed > completed:
-                                        # Initialize records list if not exists
-                                        if 'records' not in progress_data:
-                                            progress_data['records'] = []
-
-                                        # Add record with timestamp
-                                        now = datetime.now()
-                                        record = {
-                                            'id': str(uuid.uuid4()),
-                                            'topic_id': topic['id'],
-                                            'topic_name': topic['name'],
-                                            'resource_id': resource_id,
-                                            'resource_name': resource['name'],
-                                            'notes': '',
-                                            'date': now.strftime('%Y-%m-%d'),
-                                            'timestamp': now.strftime('%Y-%m-%d %H:%M:%S')
-                                        }
-
-                                        # Add score if provided
-                                        if score is not None:
-                                            record['score'] = float(score)
-
-                                        progress_data['records'].append(record)
-
-                                    # If decrementing, remove the latest record
-                                    elif change < 0 and new_completed < completed:
-                                        # Find and remove the last record for this resource
-                                        for i in range(len(progress_data.get('records', [])) - 1, -1, -1):
-                                            if progress_data['records'][i].get('resource_id') == resource_id:
-                                                del progress_data['records'][i]
-                                                break
-
-                                    # Save progress records
-                                    save_progress_records(subject_name, test['id'], progress_data)
-
-                                    # Calculate new progress percentage
-                                    progress_percentage = calculate_progress(test, subject_name)
-
-                                    return jsonify({
-                                        'success': True,
-                                        'completed': new_completed,
-                                        'total': total,
-                                        'progress': progress_percentage
-                                    })
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Expected a JSON object'}), 400
+
+        operations, error = parse_progress_operations([{
+            'resource_id': data.get('resource_id'),
+            'change': data.get('change'),  # 1 for increment, -1 for decrement
+            'score': data.get('score')  # Optional score (percentage)
+        }])
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+
+        resource_id = operations[0]['resource_id']
+        results = apply_progress_changes(operations, if_match_version())
+        if resource_id in results:
+            return versioned_response({'success': True, **results[resource_id]}, results[resource_id]['version'])
 
         return jsonify({'success': False, 'message': 'Resource not found'}), 404
+    except VersionConflict:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@bp.route('/update-progress-batch', methods=['POST'])
+def update_progress_batch():
+    """
+    Apply several progress updates in one request. Expects
+    {"operations": [{"resource_id", "change", "score"}, ...]} and returns the new
+    completed/total/progress of each resource, plus the ids that weren't found.
+    """
+    try:
+        data = request.get_json(silent=True)
+        operations, error = parse_progress_operations(data.get('operations') if isinstance(data, dict) else None)
+        if error:
+            # Nothing is applied unless every operation is valid
+            return jsonify({'success': False, 'message': error}), 400
+
+        results = apply_progress_changes(operations)
+        not_found = sorted({op['resource_id'] for op in operations if op['resource_id'] not in results})
+
+        return jsonify({'success': True, 'resources': results, 'not_found': not_found})
+    except VersionConflict:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/send-reminder', methods=['POST'])
+@bp.route('/send-reminder', methods=['POST'])
 def send_reminder():
     """Send a study reminder email"""
     try:
@@ -1964,19 +2697,20 @@ def send_reminder():
         message = data.get('message')
         recipient = data.get('recipient')
 
+        from flask_mail import Message
         msg = Message(
             subject=f'Study Reminder: {subject}',
-            sender=app.config['MAIL_USERNAME'],
+            sender=current_app.config['MAIL_USERNAME'],
             recipients=[recipient]
         )
         msg.body = message
-        mail.send(msg)
+        get_mail().send(msg)
         
         return jsonify({'success': True, 'message': 'Reminder sent successfully!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/add-todo', methods=['POST'])
+@bp.route('/add-todo', methods=['POST'])
 def add_todo():
     """Add a new task to the To-Do List."""
     task_text = request.form.get('task_text', '').strip()
@@ -2001,7 +2735,7 @@ def add_todo():
 
     return jsonify({'success': True, 'task_id': task_id, 'message': 'Task added successfully.'})
 
-@app.route('/toggle-todo/<task_id>', methods=['POST'])
+@bp.route('/toggle-todo/<task_id>', methods=['POST'])
 def toggle_todo(task_id):
     """Toggle the completion status of a task."""
     if 'todo_data' not in session:
@@ -2015,45 +2749,44 @@ def toggle_todo(task_id):
 
     return jsonify({'success': False, 'message': 'Task not found.'}), 404
 
-@app.context_processor
+@bp.app_context_processor
 def inject_todo_data():
     """Inject To-Do List data into templates."""
     return {'todo_data': session.get('todo_data', {'tasks': []})}
 
-@app.route('/subject/<subject_name>/delete_test/<test_id>', methods=['POST'])
+@bp.route('/subject/<subject_name>/delete_test/<test_id>', methods=['POST'])
 def delete_subject_test(subject_name, test_id):
     """Delete a test from a subject"""
-    # Load existing details
-    details = load_subject_details(subject_name)
-
-    # Find and remove the test
-    if 'tests' in details:
-        details['tests'] = [test for test in details['tests'] if test.get('id') != test_id]
+    def change(details):
+        # Find and remove the test
+        if 'tests' in details:
+            details['tests'] = [test for test in details['tests'] if test.get('id') != test_id]
 
     # Save updated details
-    save_subject_details(subject_name, details)
+    modify_subject_details(subject_name, change)
+    update_resource_index(resource_index.remove_test, test_id)
 
     flash('Test deleted successfully!', 'success')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
 
-@app.route('/email-config')
+@bp.route('/email-config')
 def email_config():
     """Show email configuration page"""
     status, message = validate_email_config()
     email_settings = {
-        'server': app.config['MAIL_SERVER'],
-        'port': app.config['MAIL_PORT'],
-        'use_tls': app.config['MAIL_USE_TLS'],
-        'username': app.config['MAIL_USERNAME'],
-        'sender': app.config['MAIL_DEFAULT_SENDER'],
+        'server': current_app.config['MAIL_SERVER'],
+        'port': current_app.config['MAIL_PORT'],
+        'use_tls': current_app.config['MAIL_USE_TLS'],
+        'username': current_app.config['MAIL_USERNAME'],
+        'sender': current_app.config['MAIL_DEFAULT_SENDER'],
         'status': status,
         'message': message
     }
     return render_template('email_config.html', email_settings=email_settings)
 
-@app.route('/validate-email-config')
+@bp.route('/validate-email-config')
 def validate_email_configuration():
     """Validate email configuration and return status"""
     status, message = validate_email_config()
@@ -2062,10 +2795,10 @@ def validate_email_configuration():
         'message': message
     })
 
-@app.route('/send-test-email', methods=['POST'])
+@bp.route('/send-test-email', methods=['POST'])
 def send_test_email():
     """Send a test email to verify configuration"""
-    recipient = app.config['MAIL_USERNAME']
+    recipient = current_app.config['MAIL_USERNAME']
     subject = "🐱 Test Email from Neko Study Quest"
     
     body = """
@@ -2095,7 +2828,7 @@ def send_test_email():
     """
     
     try:
-        if send_email_with_retry(subject, [recipient], body):
+        if queue_email(subject, [recipient], body):
             return jsonify({
                 'success': True,
                 'message': 'Test email sent successfully! Please check your inbox.'
@@ -2111,17 +2844,37 @@ def send_test_email():
             'message': f'Error sending test email: {str(e)}'
         }), 500
 
-@app.route('/email-test')
+@bp.route('/email-test')
 def email_test_page():
     """Show email test page"""
     return render_template('email_test.html')
 
-@app.route('/email-dashboard')
+@bp.route('/email-dashboard')
 def email_dashboard():
     """Show email dashboard"""
-    return render_template('email_dashboard.html')
+    try:
+        outbox_stats = get_outbox().stats()
+        outbox_failures = get_outbox().failures()
+    except Exception as e:
+        print(f"Error reading email outbox: {str(e)}")
+        outbox_stats, outbox_failures = None, []
+
+    return render_template('email_dashboard.html',
+                           outbox_stats=outbox_stats,
+                           outbox_failures=outbox_failures)
 
-@app.route('/send-upcoming-summary', methods=['POST'])
+
+@bp.route('/email-outbox/<int:message_id>/retry', methods=['POST'])
+def retry_outbox_email(message_id):
+    """Put a dead-lettered email back in the outbox"""
+    if get_outbox().retry(message_id):
+        start_outbox_worker().notify()
+        flash('Email queued for another try!', 'success')
+    else:
+        flash('Email not found in the dead-letter queue!', 'error')
+    return redirect(url_for('main.email_dashboard'))
+
+@bp.route('/send-upcoming-summary', methods=['POST'])
 def send_upcoming_summary():
     """Send a summary email for all upcoming tests"""
     days = int(request.form.get('days', 7))
@@ -2133,7 +2886,7 @@ def send_upcoming_summary():
         flash(f"No upcoming tests in the next {days} days!", "warning")
     
     # Redirect back to email dashboard
-    return redirect(url_for('email_dashboard'))
+    return redirect(url_for('main.email_dashboard'))
 
 def validate_subject_name(subject_name):
     """Validate and clean a subject name for storage"""
@@ -2156,35 +2909,7 @@ def validate_subject_name(subject_name):
     
     return cleaned_name, None
 
-def ensure_file_structure():
-    """Ensure all required directories exist and create them if they don't"""
-    # Required directories
-    dirs = [
-        DETAILS_DIR,     # subject_details
-        STATIC_DIR,      # static
-        PROGRESS_DIR,    # progress_records
-    ]
-    
-    # Create directories if they don't exist
-    for directory in dirs:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-            print(f"Created directory: {directory}")
-    
-    # Check if subjects file exists, create it if not
-    if not os.path.exists(SUBJECTS_FILE):
-        save_subjects(DEFAULT_SUBJECTS)
-        print(f"Created subjects file with default subjects: {SUBJECTS_FILE}")
-        
-        # Also create empty subject details files for each default subject
-        for subject in DEFAULT_SUBJECTS:
-            if not os.path.exists(get_subject_details_file(subject)):
-                save_subject_details(subject, {"resources": [], "tests": [], "study_materials": []})
-                print(f"Created empty details file for subject: {subject}")
-    
-    return True
-
-@app.route('/send-test-reminder-sample', methods=['POST'])
+@bp.route('/send-test-reminder-sample', methods=['POST'])
 def send_test_reminder_sample():
     """Send a sample test reminder email"""
     subject_name = request.form.get('subject_name')
@@ -2196,9 +2921,9 @@ def send_test_reminder_sample():
     send_test_reminder_email(subject_name, test_name, test_date, progress)
     
     flash('Test reminder email sent successfully!', 'success')
-    return redirect(url_for('email_test_page'))
+    return redirect(url_for('main.email_test_page'))
 
-@app.route('/send-daily-progress-sample', methods=['POST'])
+@bp.route('/send-daily-progress-sample', methods=['POST'])
 def send_daily_progress_sample():
     """Send a sample daily progress email"""
     subject_name = request.form.get('subject_name')
@@ -2217,9 +2942,9 @@ def send_daily_progress_sample():
     send_daily_progress_email(subject_name, test_name, resources)
     
     flash('Daily progress email sent successfully!', 'success')
-    return redirect(url_for('email_test_page'))
+    return redirect(url_for('main.email_test_page'))
 
-@app.route('/send-test-complete-sample', methods=['POST'])
+@bp.route('/send-test-complete-sample', methods=['POST'])
 def send_test_complete_sample():
     """Send a sample test completion email"""
     subject_name = request.form.get('subject_name')
@@ -2232,28 +2957,21 @@ def send_test_complete_sample():
     send_test_complete_email(subject_name, test_name, progress, completed, total)
     
     flash('Test completion email sent successfully!', 'success')
-    return redirect(url_for('email_test_page'))
+    return redirect(url_for('main.email_test_page'))
 
-@app.route('/send-custom-email', methods=['POST'])
+@bp.route('/send-custom-email', methods=['POST'])
 def send_custom_email():
     """Send a custom email to test email functionality"""
     try:
         subject = request.form.get('subject', 'Test Email')
         body = request.form.get('body', 'This is a test email.')
-        send_email_with_retry(subject, [app.config['EMAIL_USERNAME']], body)
+        queue_email(subject, [current_app.config['EMAIL_USERNAME']], body)
         flash('Custom email sent successfully!', 'success')
     except Exception as e:
         flash(f'Failed to send custom email: {str(e)}', 'error')
-    return redirect(url_for('email_dashboard'))
+    return redirect(url_for('main.email_dashboard'))
 
-@app.template_filter('today')
-def today():
-    """Return today's date as a datetime object for use in templates"""
-    return datetime.now().date()
-
-
-
-@app.route('/subject/<subject_name>/test/<test_id>', methods=['GET'])
+@bp.route('/subject/<subject_name>/test/<test_id>', methods=['GET'])
 def test_details(subject_name, test_id):
     """Show details for a specific test"""
     # Load details for the subject
@@ -2266,22 +2984,18 @@ def test_details(subject_name, test_id):
         # Calculate progress
         test['progress'] = calculate_progress(test, subject_name)
         
-        # Load progress records
-        progress_records = load_progress_records(subject_name, test_id)
+        # Load the running totals for the test
+        aggregates = load_progress_aggregates(subject_name, test_id)
         
         # Process resources to include scores
         for topic in test.get('topics', []):
             if isinstance(topic, dict) and 'resources' in topic:
                 for resource in topic.get('resources', []):
                     # Count completed resources
-                    resource['completed'] = len([r for r in progress_records.get('records', [])
-                                              if r.get('resource_id') == resource.get('id')])
+                    resource['completed'] = aggregates['by_resource'].get(resource.get('id'), 0)
                     
                     # Add scores if they exist
-                    resource['scores'] = []
-                    for record in progress_records.get('records', []):
-                        if record.get('resource_id') == resource.get('id') and 'score' in record:
-                            resource['scores'].append(record['score'])
+                    resource['scores'] = resource_scores(aggregates, resource.get('id'))
         
         # Get date counts for chart
         date_counts = get_date_counts(subject_name, test_id)
@@ -2293,112 +3007,19 @@ def test_details(subject_name, test_id):
         return render_template('test_statistics.html',
                              subject_name=subject_name,
                              test=test,
-                             progress_records=progress_records,
                              date_counts=date_counts,
                              topic_counts=topic_counts)
     
     # If the test is not found, redirect to subject details
     flash('Test not found!', 'error')
-    return redirect(url_for('subject_details', subject_name=subject_name))
+    return redirect(url_for('main.subject_details', subject_name=subject_name))
 
 
-@app.route('/api/get-resources')
+@bp.route('/api/get-resources')
 def get_resources_api():
     """Get all resources for the study timer dropdown"""
-    subjects = load_subjects()
-    result = []
-
     try:
-        # Process each subject
-        for subject_name in subjects:
-            subject_data = load_subject_details(subject_name)
-            
-            subject_entry = {
-                "name": subject_name,
-                "tests": []
-            }
-            
-            # Process each test in this subject
-            for test in subject_data.get('tests', []):
-                # Skip invalid tests
-                if not isinstance(test, dict) or 'id' not in test or 'name' not in test:
-                    continue
-                    
-                # Check if test is in the past
-                is_past = False
-                if 'date' in test:
-                    try:
-                        test_date = datetime.strptime(test['date'], '%Y-%m-%d').date()
-                        today = date.today()
-                        is_past = test_date < today
-                    except:
-                        pass
-                
-                # Skip past tests
-                if is_past:
-                    continue
-                
-                test_entry = {
-                    "id": test['id'],
-                    "name": test['name'],
-                    "topics": []
-                }
-                
-                # Load progress records for this test
-                progress_records = load_progress_records(subject_name, test['id'])
-                
-                # Process topics
-                for topic in test.get('topics', []):
-                    # Skip invalid topics
-                    if not isinstance(topic, dict) or 'id' not in topic or 'name' not in topic:
-                        continue
-                    
-                    topic_entry = {
-                        "id": topic['id'],
-                        "name": topic['name'],
-                        "resources": []
-                    }
-                    
-                    # Process resources
-                    for resource in topic.get('resources', []):
-                        # Skip invalid resources
-                        if not isinstance(resource, dict) or 'id' not in resource or 'name' not in resource:
-                            continue
-                        
-                        # Count completed instances
-                        completed = 0
-                        for record in progress_records.get('records', []):
-                            if record.get('resource_id') == resource['id']:
-                                completed += 1
-                        
-                        count = resource.get('count', 1)
-                        
-                        # Only add if not fully completed
-                        if completed < count:
-                            resource_entry = {
-                                "id": resource['id'],
-                                "name": resource['name'],
-                                "count": count,
-                                "completed": completed
-                            }
-                            topic_entry["resources"].append(resource_entry)
-                    
-                    # Only add topics with resources
-                    if topic_entry["resources"]:
-                        test_entry["topics"].append(topic_entry)
-                
-                # Only add tests with topics
-                if test_entry["topics"]:
-                    subject_entry["tests"].append(test_entry)
-            
-            # Only add subjects with tests
-            if subject_entry["tests"]:
-                result.append(subject_entry)
-        
-        return jsonify({
-            "success": True,
-            "subjects": result
-        })
+        return timer_resources_response()
     except Exception as e:
         print(f"Error in get_resources_api: {str(e)}")
         return jsonify({
@@ -2406,7 +3027,31 @@ def get_resources_api():
             "error": str(e)
         }), 500
 
-@app.route('/api/log-study-time', methods=['POST'])
+def study_session_record(record_id, topic_id, topic_name, resource, duration_minutes, study_date, completed):
+    """
+    Build the progress record for a timed study session. A session that completes
+    the resource counts toward progress; otherwise it is flagged study_only.
+    """
+    record = {
+        'id': record_id,
+        'topic_id': topic_id,
+        'topic_name': topic_name,
+        'resource_id': resource.get('id'),
+        'resource_name': resource.get('name'),
+        'notes': (f"Completed after studying for {duration_minutes:.1f} minutes" if completed
+                  else f"Studied for {duration_minutes:.1f} minutes"),
+        'date': study_date,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'study_duration': duration_minutes
+    }
+    if completed:
+        record['auto_completed'] = True
+    else:
+        record['study_only'] = True  # Flag to indicate this doesn't count toward completion
+    return record
+
+
+@bp.route('/api/log-study-time', methods=['POST'])
 def log_study_time():
     """Record study time for a resource and optionally mark progress"""
     try:
@@ -2466,41 +3111,20 @@ def log_study_time():
                 "error": f"Resource not found in test {test.get('name')}"
             }), 404
             
-        # Load progress records
-        progress_data = load_progress_records(subject_name, test_id)
-        
-        # Initialize records list if not exists
-        if 'records' not in progress_data:
-            progress_data['records'] = []
-            
         # Check if we should auto-complete a resource based on timer
         if auto_complete:
             # Count completed instances
-            completed = len([r for r in progress_data.get('records', [])
-                            if r.get('resource_id') == resource_id])
+            completed = load_progress_aggregates(subject_name, test_id)['by_resource'].get(resource_id, 0)
                             
             # Check if not already complete
             total = found_resource.get('count', 1)
             if completed < total:
                 # Add a progress record
-                now = datetime.now()
-                record = {
-                    'id': str(uuid.uuid4()),
-                    'topic_id': topic_id,
-                    'topic_name': topic_name,
-                    'resource_id': resource_id,
-                    'resource_name': resource_name,
-                    'notes': f"Completed after studying for {duration_minutes:.1f} minutes",
-                    'date': study_date,
-                    'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
-                    'study_duration': duration_minutes,
-                    'auto_completed': True
-                }
-                
-                progress_data['records'].append(record)
+                record = study_session_record(str(uuid.uuid4()), topic_id, topic_name, found_resource,
+                                              duration_minutes, study_date, True)
                 
-                # Save progress records
-                save_progress_records(subject_name, test_id, progress_data)
+                # Append the record to the progress log
+                append_progress_record(subject_name, test_id, record)
                 
                 # Calculate new progress
                 new_progress = calculate_progress(test, subject_name)
@@ -2515,25 +3139,13 @@ def log_study_time():
         
         # Just log the study time without marking complete
         # Add a study session record (without incrementing progress)
-        study_record = {
-            'id': str(uuid.uuid4()),
-            'topic_id': topic_id,
-            'topic_name': topic_name,
-            'resource_id': resource_id,
-            'resource_name': resource_name,
-            'notes': f"Studied for {duration_minutes:.1f} minutes",
-            'date': study_date,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'study_duration': duration_minutes,
-            'study_only': True  # Flag to indicate this doesn't count toward completion
-        }
+        study_record = study_session_record(str(uuid.uuid4()), topic_id, topic_name, found_resource,
+                                            duration_minutes, study_date, False)
         
         # We could store these in a separate collection, but for simplicity
         # we'll add them to the regular progress records with a flag
-        progress_data['records'].append(study_record)
-        
-        # Save progress records
-        save_progress_records(subject_name, test_id, progress_data)
+        # Append the record to the progress log
+        append_progress_record(subject_name, test_id, study_record)
         
         return jsonify({
             "success": True,
@@ -2547,103 +3159,113 @@ def log_study_time():
             "error": str(e)
         }), 500
         
-@app.route('/get-resources')  # Notice: NO /api prefix
-def get_resources():
-    """Get all resources for the study timer dropdown"""
-    subjects = load_subjects()
-    result = []
-
+@bp.route('/api/sync-study-sessions', methods=['POST'])
+def sync_study_sessions():
+    """
+    Record a backlog of timer sessions in one request. Expects
+    {"sessions": [{"session_id", "resource_id", "duration", "date", "auto_complete"}, ...]}
+    where session_id is generated by the client. It becomes the progress record's id,
+    so a session that was already synced is skipped instead of counted twice.
+    Returns the session ids that were synced, were already there, or were rejected.
+    """
     try:
-        # Process each subject
-        for subject_name in subjects:
-            subject_data = load_subject_details(subject_name)
-            
-            subject_entry = {
-                "name": subject_name,
-                "tests": []
-            }
-            
-            # Process each test in this subject
-            for test in subject_data.get('tests', []):
-                # Skip invalid tests
-                if not isinstance(test, dict) or 'id' not in test or 'name' not in test:
-                    continue
-                    
-                # Check if test is in the past
-                is_past = False
-                if 'date' in test:
-                    try:
-                        test_date = datetime.strptime(test['date'], '%Y-%m-%d').date()
-                        today = date.today()
-                        is_past = test_date < today
-                    except:
-                        pass
-                
-                # Skip past tests
-                if is_past:
-                    continue
-                
-                test_entry = {
-                    "id": test['id'],
-                    "name": test['name'],
-                    "topics": []
-                }
-                
-                # Load progress records for this test
-                progress_records = load_progress_records(subject_name, test['id'])
-                
-                # Process topics
-                for topic in test.get('topics', []):
-                    # Skip invalid topics
-                    if not isinstance(topic, dict) or 'id' not in topic or 'name' not in topic:
+        data = request.get_json()
+        sessions = data.get('sessions') if isinstance(data, dict) else None
+        if not isinstance(sessions, list) or not all(isinstance(session, dict) for session in sessions):
+            return jsonify({"success": False, "error": "Expected a list of sessions"}), 400
+
+        synced = []
+        duplicates = []
+        rejected = []
+
+        # Group the sessions by the test their resource belongs to
+        groups = {}
+        for session in sessions:
+            session_id = session.get('session_id')
+            duration = session.get('duration')
+            if not isinstance(session_id, str) or not session_id or len(session_id) > 100:
+                rejected.append({'session_id': session_id, 'error': 'Missing session id'})
+                continue
+            if not isinstance(duration, (int, float)) or isinstance(duration, bool) or not session.get('date'):
+                rejected.append({'session_id': session_id, 'error': 'Missing required fields'})
+                continue
+
+            # Resource ids are unique, so this still works if the subject was renamed since
+            found = find_resource(session.get('resource_id'))
+            if not found:
+                rejected.append({'session_id': session_id, 'error': 'Resource not found'})
+                continue
+
+            subject_name, test, topic, resource = found
+            groups.setdefault((subject_name, test['id']), []).append((session, topic, resource))
+
+        # One read and one write per test
+        for (subject_name, test_id), group in groups.items():
+            for attempt in range(SAVE_RETRIES):
+                # The save is a compare-and-swap on this version, so a concurrent sync of the
+                # same sessions makes it fail and the duplicate check is done again
+                aggregates = load_progress_aggregates(subject_name, test_id)
+                version = document_version(aggregates)
+                existing_ids = {record.get('id')
+                                for record in load_progress_records(subject_name, test_id).get('records', [])}
+                completed_counts = dict(aggregates['by_resource'])
+                test_synced = []
+                test_duplicates = []
+                added = []
+
+                for session, topic, resource in group:
+                    session_id = session['session_id']
+                    if session_id in existing_ids:
+                        test_duplicates.append(session_id)
                         continue
-                    
-                    topic_entry = {
-                        "id": topic['id'],
-                        "name": topic['name'],
-                        "resources": []
-                    }
-                    
-                    # Process resources
-                    for resource in topic.get('resources', []):
-                        # Skip invalid resources
-                        if not isinstance(resource, dict) or 'id' not in resource or 'name' not in resource:
-                            continue
-                        
-                        # Count completed instances
-                        completed = 0
-                        for record in progress_records.get('records', []):
-                            if record.get('resource_id') == resource['id']:
-                                completed += 1
-                        
-                        count = resource.get('count', 1)
-                        
-                        # Only add if not fully completed
-                        if completed < count:
-                            resource_entry = {
-                                "id": resource['id'],
-                                "name": resource['name'],
-                                "count": count,
-                                "completed": completed
-                            }
-                            topic_entry["resources"].append(resource_entry)
-                    
-                    # Only add topics with resources
-                    if topic_entry["resources"]:
-                        test_entry["topics"].append(topic_entry)
-                
-                # Only add tests with topics
-                if test_entry["topics"]:
-                    subject_entry["tests"].append(test_entry)
-            
-            # Only add subjects with tests
-            if subject_entry["tests"]:
-                result.append(subject_entry)
-        
+
+                    # Auto-complete only while the resource isn't complete yet
+                    completed = completed_counts.get(resource['id'], 0)
+                    complete = bool(session.get('auto_complete')) and completed < resource.get('count', 1)
+                    if complete:
+                        completed_counts[resource['id']] = completed + 1
+
+                    added.append(study_session_record(session_id, topic['id'], topic['name'], resource,
+                                                      session['duration'] / (1000 * 60), session['date'], complete))
+                    existing_ids.add(session_id)
+                    test_synced.append(session_id)
+
+                if not added:
+                    break
+                try:
+                    update_progress_records(subject_name, test_id, added, {}, expected_version=version)
+                    break
+                except VersionConflict:
+                    continue
+            else:
+                raise VersionConflict(
+                    f"Gave up syncing sessions for test {test_id} after {SAVE_RETRIES} conflicting saves")
+
+            synced.extend(test_synced)
+            duplicates.extend(test_duplicates)
+
         return jsonify({
             "success": True,
-            "subjects": result
+            "synced": synced,
+            "duplicates": duplicates,
+            "rejected": rejected
         })
+
+    except VersionConflict:
+        raise
+    except Exception as e:
+        print(f"Error syncing study sessions: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@bp.route('/get-resources')  # Notice: NO /api prefix
+def get_resources():
+    """Get all resources for the study timer dropdown"""
+    try:
+        return timer_resources_response()
     except Exception as e:
         print(f"Error in get_resources: {str(e)}")
         return jsonify({
@@ -2651,9 +3273,97 @@ def get_resources():
             "error": str(e)
         }), 500
 
+@bp.cli.command('rebuild-index')
+def rebuild_index_command():
+    """
+    Rebuild the resource/topic/test id index from the subject details.
+
+    Run it as: flask --app wsgi rebuild-index
+    """
+    index = rebuild_resource_index()
+    click.echo(f"Indexed {len(index['tests'])} tests, {len(index['topics'])} topics and "
+               f"{len(index['resources'])} resources")
+
+
+@bp.cli.command('rebuild-dashboard')
+def rebuild_dashboard_command():
+    """
+    Recompute the home page snapshot from scratch and report any drift in the stored one.
+
+    Run it as: flask --app wsgi rebuild-dashboard
+    """
+    stored = {subject_name: dashboard.stored_section(get_storage().load_document(dashboard.section_document(subject_name)))
+              for subject_name in load_subjects()}
+    sections = rebuild_dashboard()
+
+    for subject_name, section in sections.items():
+        if not dashboard.same_section(stored.get(subject_name), section):
+            click.echo(f"Snapshot for {subject_name} was out of date")
+    click.echo(f"Rebuilt the dashboard snapshot for {len(sections)} subjects")
+
+
+@bp.cli.command('benchmark-emails')
+@click.option('--count', default=1000, help='Renders per template.')
+@click.option('--tests', default=50, help='Tests in the upcoming-tests digest.')
+def benchmark_emails_command(count, tests):
+    """
+    Time rendering each email body from sample data.
+
+    Run it as: flask --app wsgi benchmark-emails
+    """
+    today = date.today()
+    records = [{'topic_name': f'Topic {i}', 'resource_name': f'Resource {i}'} for i in range(10)]
+    digest = [{'name': f'Test {i}', 'subject_name': 'Subject', 'days_remaining': i % 14, 'progress': 50.0,
+               'date': (today + timedelta(days=i % 14)).strftime('%Y-%m-%d')} for i in range(tests)]
+    cases = [
+        ('test_reminder.html', {'subject_name': 'Subject', 'test_name': 'Test', 'test_date': today.strftime('%Y-%m-%d'),
+                                'days_remaining': 3, 'progress': 42.5}),
+        ('daily_progress.html', {'subject_name': 'Subject', 'test_name': 'Test', 'today': today.strftime('%Y-%m-%d'),
+                                 'resources_completed': records}),
+        ('test_complete.html', {'subject_name': 'Subject', 'test_name': 'Test', 'today': today.strftime('%Y-%m-%d'),
+                                'progress': 100.0, 'completed_resources': 20, 'total_resources': 20,
+                                'completion_percentage': 100.0}),
+        ('upcoming_summary.html', {'upcoming_tests': digest}),
+    ]
+
+    for template_name, context in cases:
+        # The first render compiles the template; only cached renders are timed
+        render_email(template_name, **context)
+        start = time.perf_counter()
+        for _ in range(count):
+            render_email(template_name, **context)
+        elapsed = time.perf_counter() - start
+        click.echo(f"{template_name:24} {elapsed / count * 1e6:8.1f} us per render")
+
+
+@bp.cli.command('migrate-to-sqlite')
+@click.option('--force', is_flag=True, help='Copy even if the database already holds subjects.')
+def migrate_to_sqlite(force):
+    """
+    Copy the subject_details/ and progress_records/ JSON data into the SQLite database.
+
+    Run it as: flask --app wsgi migrate-to-sqlite
+    """
+    source = create_storage(dict(current_app.config, STORAGE_BACKEND='json'))
+    target = SqliteStorage(current_app.config['SQLITE_PATH'])
+
+    try:
+        if target.has_subjects() and not force:
+            click.echo(f"{current_app.config['SQLITE_PATH']} already has data; use --force to migrate anyway.")
+            return
+
+        copied = migrate_storage(source, target)
+        click.echo(f"Migrated {copied['subjects']} subjects, {copied['tests']} tests and "
+                   f"{copied['records']} progress records to {current_app.config['SQLITE_PATH']}")
+        click.echo("Set STORAGE_BACKEND=sqlite to use the database.")
+    finally:
+        target.close()
+
 if __name__ == '__main__':
     try:
-        ensure_file_structure()
+        app = create_app()
+        with app.app_context():
+            ensure_file_structure()
         print("Starting Neko Study Quest...")
         print("Ensuring file structure... Success")
         
@@ -2662,8 +3372,10 @@ if __name__ == '__main__':
             print(f"Email configured for: {app.config['MAIL_USERNAME']}")
         
         print("Starting server...")
-        # Run the app on all network interfaces (0.0.0.0) and port 5000
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        # Development server on all network interfaces; the debugger only with FLASK_DEBUG=true.
+        # Use wsgi.py with a production WSGI server otherwise.
+        app.run(host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', 5000)),
+                debug=os.getenv('FLASK_DEBUG', 'false').lower() == 'true')
         print("Server is running! Other devices can access it at:")
         print("http://<your-computer-ip>:5000")
     except Exception as e:
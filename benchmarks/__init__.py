@@ -0,0 +1 @@
+"""Scripts for timing the app; run them with python -m benchmarks.<name> from the repo root."""
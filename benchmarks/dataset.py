@@ -0,0 +1,155 @@
+"""
+Generate a synthetic study dataset: subjects, each with dated tests made of
+topics and resources, and a progress history for every resource (completions,
+some with scores, and timed study sessions).
+
+    python -m benchmarks.dataset path/to/data --subjects 20 --tests 6 --topics 10 --resources 5 --records 8
+
+The data is written through the app's storage backend, so it has the same
+layout the app itself writes. Point DATA_DIR at the directory to use it.
+"""
+import argparse
+import os
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+from app import create_app, get_backend
+
+RESOURCE_KINDS = ['Textbook chapter', 'Past paper', 'Lecture notes', 'Worksheet', 'Flashcards', 'Video']
+
+
+def new_id(rng):
+    """A random UUID drawn from rng, so a seed always gives the same dataset"""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def make_resource(rng, index, records):
+    """A resource whose count leaves room for most of its completions"""
+    return {
+        'id': new_id(rng),
+        'name': f"{rng.choice(RESOURCE_KINDS)} {index + 1}",
+        'count': max(1, records - rng.randint(0, max(1, records // 2)) + rng.randint(0, 3)),
+        'completed': 0,
+        'scores': []
+    }
+
+
+def make_records(rng, topic, resource, records, start, end):
+    """
+    A resource's progress history between start and end: completions (about half
+    with a score) and timed study sessions, some of which complete the resource.
+    """
+    history = []
+    span = max(0, (end - start).days)
+    for _ in range(records):
+        day = start + timedelta(days=rng.randint(0, span))
+        moment = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randint(8 * 3600, 23 * 3600))
+        record = {
+            'id': new_id(rng),
+            'topic_id': topic['id'],
+            'topic_name': topic['name'],
+            'resource_id': resource['id'],
+            'resource_name': resource['name'],
+            'notes': '',
+            'date': day.strftime('%Y-%m-%d'),
+            'timestamp': moment.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        kind = rng.random()
+        if kind < 0.25:
+            # A timed study session
+            duration = round(rng.uniform(5, 90), 1)
+            record['study_duration'] = duration
+            if kind < 0.1:
+                record['notes'] = f"Completed after studying for {duration:.1f} minutes"
+                record['auto_completed'] = True
+            else:
+                record['notes'] = f"Studied for {duration:.1f} minutes"
+                record['study_only'] = True
+        elif kind < 0.65:
+            record['score'] = float(rng.randint(35, 100))
+
+        history.append(record)
+
+    return history
+
+
+def generate_dataset(subjects=5, tests=4, topics=8, resources=4, records=10, seed=0, today=None):
+    """
+    Write a dataset through the current app's storage backend. Test dates are
+    spread over the past and next two months, so there are past and upcoming
+    tests. Returns the number of progress records written.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    backend = get_backend()
+
+    subject_names = [f"Subject {i + 1:03d}" for i in range(subjects)]
+    backend.save_subjects(subject_names)
+
+    written = 0
+    for subject_name in subject_names:
+        details = {'resources': [], 'tests': [], 'study_materials': []}
+        history = {}
+
+        for t in range(tests):
+            test_date = today + timedelta(days=rng.randint(-60, 60))
+            test = {
+                'id': new_id(rng),
+                'name': f"Test {t + 1}",
+                'date': test_date.strftime('%Y-%m-%d'),
+                'topics': []
+            }
+            # Progress is recorded in the month before the test, up to today
+            start = test_date - timedelta(days=30)
+            end = min(test_date, today)
+            test_records = []
+
+            for p in range(topics):
+                topic = {'id': new_id(rng), 'name': f"Topic {p + 1}", 'resources': []}
+                for r in range(resources):
+                    resource = make_resource(rng, r, records)
+                    resource_records = make_records(rng, topic, resource, records, start, end) if start <= end else []
+                    completions = [record for record in resource_records if not record.get('study_only')]
+                    resource['completed'] = min(len(completions), resource['count'])
+                    resource['scores'] = [record['score'] for record in completions if 'score' in record]
+                    topic['resources'].append(resource)
+                    test_records.extend(resource_records)
+                test['topics'].append(topic)
+
+            details['tests'].append(test)
+            history[test['id']] = test_records
+
+        backend.save_subject_details(subject_name, details)
+        for test_id, test_records in history.items():
+            test_records.sort(key=lambda r: r['timestamp'])
+            backend.save_progress_records(subject_name, test_id, {'records': test_records})
+            written += len(test_records)
+
+    backend.bump_data_version()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic study dataset.')
+    parser.add_argument('data_dir', help='Directory to write the data to (DATA_DIR).')
+    parser.add_argument('--backend', default='json', choices=['json', 'sqlite'], help='Storage backend.')
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--tests', type=int, default=4, help='Tests per subject.')
+    parser.add_argument('--topics', type=int, default=8, help='Topics per test.')
+    parser.add_argument('--resources', type=int, default=4, help='Resources per topic.')
+    parser.add_argument('--records', type=int, default=10, help='Progress records per resource.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    app = create_app({'DATA_DIR': args.data_dir, 'STORAGE_BACKEND': args.backend, 'REMINDER_SCHEDULER_ENABLED': False})
+    with app.app_context():
+        written = generate_dataset(args.subjects, args.tests, args.topics, args.resources, args.records, args.seed)
+    print(f"Wrote {args.subjects} subjects, {args.subjects * args.tests} tests and {written} progress records "
+          f"to {args.data_dir} ({args.backend})")
+
+
+if __name__ == '__main__':
+    main()
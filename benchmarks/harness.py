@@ -0,0 +1,202 @@
+"""
+Drive the main pages and endpoints through Flask's test client and report,
+per route, latency percentiles and the I/O each request does: bytes read and
+written and files opened.
+
+    python -m benchmarks.harness --subjects 20 --tests 6 --records 8 --requests 200
+    python -m benchmarks.harness --data-dir path/to/data --backend sqlite
+
+Without --data-dir a synthetic dataset (see benchmarks.dataset) is generated
+in a temporary directory. Bytes come from /proc (Linux only) and count every
+read and write the request thread makes; files opened counts Python-level
+opens, so SQLite's own files aren't included.
+
+The *_etag routes send back the ETag of the previous response in If-None-Match,
+so they time the 304 Not Modified answers a browser gets for an unchanged page.
+The per-test track-progress page isn't timed: it has been broken since before
+these benchmarks (its template, track_progress.html, is missing), so
+/test-statistics stands in for a single-test page.
+"""
+import argparse
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from app import create_app, get_backend, load_subject_details, load_subjects
+from benchmarks.dataset import generate_dataset
+
+# Opens seen while a request is being measured, keyed by thread id
+_open_counts = {}
+
+
+def _count_opens(event, args):
+    if event == 'open':
+        ident = threading.get_ident()
+        if ident in _open_counts:
+            _open_counts[ident] += 1
+
+
+sys.addaudithook(_count_opens)
+
+
+def io_counters():
+    """(bytes read, bytes written) so far by this thread, or by the process if per-thread numbers aren't available"""
+    for path in ('/proc/thread-self/io', '/proc/self/io'):
+        try:
+            with open(path) as file:
+                fields = dict(line.split(': ') for line in file.read().splitlines())
+            return int(fields['rchar']), int(fields['wchar'])
+        except (OSError, KeyError, ValueError):
+            continue
+    return None
+
+
+def measure(send):
+    """Run send() and return (status code, seconds, bytes read, bytes written, files opened)"""
+    ident = threading.get_ident()
+    # Read the counters first so their own reads don't count against the request
+    before = io_counters()
+    _open_counts[ident] = 0
+    start = time.perf_counter()
+    try:
+        status = send().status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        opened = _open_counts.pop(ident)
+    after = io_counters()
+
+    if before is None or after is None:
+        return status, elapsed, None, None, opened
+    return status, elapsed, after[0] - before[0], after[1] - before[1], opened
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def build_scenarios(client, rng):
+    """
+    Return [(route name, send function)]; each send picks a subject, test or
+    resource at random so requests spread over the whole dataset.
+    """
+    tests = []
+    resources = []
+    for subject_name in load_subjects():
+        for test in load_subject_details(subject_name).get('tests', []):
+            tests.append((subject_name, test['id']))
+            for topic in test.get('topics', []):
+                resources.extend(resource['id'] for resource in topic.get('resources', []))
+
+    subject_names = [subject_name for subject_name, _ in tests] or load_subjects()
+
+    def conditional_get(path):
+        """GET path with the ETag of the last full response, as a browser revisiting the page would"""
+        etag = {}
+
+        def send():
+            response = client.get(path, headers={'If-None-Match': etag['value']} if etag else {})
+            if response.headers.get('ETag'):
+                etag['value'] = response.headers['ETag']
+            return response
+        return send
+
+    def update_progress():
+        # Alternate completions and undos so the data stays about the same size
+        return client.post('/update-progress', json={'resource_id': rng.choice(resources),
+                                                     'change': rng.choice([1, -1])})
+
+    scenarios = [
+        ('index', lambda: client.get('/')),
+        ('all_statistics', lambda: client.get('/all-statistics')),
+        ('past_tests', lambda: client.get('/past-tests')),
+        ('subject_details', lambda: client.get(f'/subject/{rng.choice(subject_names)}')),
+        ('get_resources', lambda: client.get('/get-resources')),
+        ('index_etag', conditional_get('/')),
+        ('statistics_etag', conditional_get('/all-statistics')),
+        ('past_tests_etag', conditional_get('/past-tests')),
+        ('resources_etag', conditional_get('/get-resources')),
+    ]
+    if tests:
+        scenarios.append(('test_statistics', lambda: client.get('/test-statistics/%s/%s' % rng.choice(tests))))
+    if resources:
+        scenarios.append(('update_progress', update_progress))
+    return scenarios
+
+
+def run(app, requests, warmup, seed):
+    """Time each scenario; returns [(route name, [(status, seconds, read, written, opened)])]"""
+    rng = random.Random(seed)
+    client = app.test_client()
+    with app.app_context():
+        scenarios = build_scenarios(client, rng)
+
+    results = []
+    for name, send in scenarios:
+        # Warm-up requests fill the caches and compile the templates
+        for _ in range(warmup):
+            send()
+        results.append((name, [measure(send) for _ in range(requests)]))
+    return results
+
+
+def report(results):
+    print(f"{'route':16} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'KB read':>9} {'KB written':>10} "
+          f"{'files':>6} {'errors':>6}")
+    for name, samples in results:
+        times = [sample[1] * 1000 for sample in samples]
+        errors = sum(1 for sample in samples if sample[0] >= 400)
+        read = [sample[2] for sample in samples if sample[2] is not None]
+        written = [sample[3] for sample in samples if sample[3] is not None]
+        opened = sum(sample[4] for sample in samples) / len(samples)
+        read_kb = f"{sum(read) / len(read) / 1024:9.1f}" if read else f"{'n/a':>9}"
+        written_kb = f"{sum(written) / len(written) / 1024:10.1f}" if written else f"{'n/a':>10}"
+        print(f"{name:16} {len(samples):5} {percentile(times, 50):8.2f} {percentile(times, 95):8.2f} "
+              f"{percentile(times, 99):8.2f} {read_kb} {written_kb} {opened:6.1f} {errors:6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the main routes against a dataset.')
+    parser.add_argument('--data-dir', help='Existing data to use (default: generate a dataset in a temporary directory).')
+    parser.add_argument('--backend', default='json', choices=['json', 'sqlite'], help='Storage backend.')
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per route first.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--tests', type=int, default=4, help='Tests per subject.')
+    parser.add_argument('--topics', type=int, default=8, help='Topics per test.')
+    parser.add_argument('--resources', type=int, default=4, help='Resources per topic.')
+    parser.add_argument('--records', type=int, default=10, help='Progress records per resource.')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='neko_bench_')
+    app = create_app({'DATA_DIR': data_dir, 'STORAGE_BACKEND': args.backend, 'MAIL_SUPPRESS_SEND': True,
+                      'REMINDER_SCHEDULER_ENABLED': False})
+    # Failed requests show up in the errors column instead of as tracebacks
+    app.logger.setLevel(logging.CRITICAL)
+    try:
+        if not args.data_dir:
+            with app.app_context():
+                written = generate_dataset(args.subjects, args.tests, args.topics, args.resources, args.records,
+                                           args.seed)
+            print(f"Generated {args.subjects} subjects, {args.subjects * args.tests} tests and {written} "
+                  f"progress records in {data_dir}")
+
+        results = run(app, args.requests, args.warmup, args.seed)
+        print(f"{args.backend} storage, {args.requests} requests per route after {args.warmup} warm-up")
+        report(results)
+    finally:
+        with app.app_context():
+            get_backend().close()
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Time a cold start: each run starts a fresh Python process that imports app,
+creates the app, bootstraps the data directory and serves its first request.
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --data-dir path/to/data --prewarm --path /all-statistics
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints the time of each startup step in seconds
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+marks = {}
+
+import app as app_module
+marks['import'] = time.perf_counter()
+
+app = app_module.create_app()
+marks['create_app'] = time.perf_counter()
+
+with app.app_context():
+    app_module.ensure_file_structure()
+marks['file_structure'] = time.perf_counter()
+
+client = app.test_client()
+status = client.get(sys.argv[1]).status_code
+marks['first_response'] = time.perf_counter()
+
+client.get(sys.argv[1])
+marks['second_response'] = time.perf_counter()
+
+print(json.dumps({'status': status, 'marks': {name: mark - start for name, mark in marks.items()}}))
+'''
+
+STEPS = ['import', 'create_app', 'file_structure', 'first_response', 'second_response']
+
+
+def run_once(path, data_dir, prewarm):
+    """Start one child process; returns (wall seconds, child status and step times)"""
+    env = dict(os.environ, DATA_DIR=data_dir, PREWARM_CACHES='true' if prewarm else 'false',
+               REMINDER_SCHEDULER_ENABLED='false')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    # The app prints its own messages; the timings are the last line
+    return wall, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time import-to-first-response for the app.')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts to time.')
+    parser.add_argument('--path', default='/', help='Page requested first.')
+    parser.add_argument('--data-dir', help='Data directory to use (default: a new empty one per run).')
+    parser.add_argument('--prewarm', action='store_true', help='Start the app with PREWARM_CACHES on.')
+    args = parser.parse_args()
+
+    walls = []
+    steps = {name: [] for name in STEPS}
+    for _ in range(args.runs):
+        data_dir = args.data_dir or tempfile.mkdtemp(prefix='neko_startup_')
+        try:
+            wall, result = run_once(args.path, os.path.abspath(data_dir), args.prewarm)
+        finally:
+            if not args.data_dir:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+        if result['status'] != 200:
+            print(f"GET {args.path} returned {result['status']}")
+        walls.append(wall)
+        for name in STEPS:
+            steps[name].append(result['marks'][name])
+
+    print(f"{args.runs} cold starts, GET {args.path}" + (' (pre-warming)' if args.prewarm else ''))
+    print(f"{'step (ms since import started)':32} {'median':>8} {'min':>8} {'max':>8}")
+    for name in STEPS:
+        times = [t * 1000 for t in steps[name]]
+        print(f"{name:32} {statistics.median(times):8.1f} {min(times):8.1f} {max(times):8.1f}")
+    times = [t * 1000 for t in walls]
+    print(f"{'process start to exit':32} {statistics.median(times):8.1f} {min(times):8.1f} {max(times):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import hashlib
+
+from services.test_service import required_resources
+
+# Each subject's section is its own document, so a change only rewrites that subject's section
+SECTION_DOCUMENT_PREFIX = 'dashboard_'
+
+# The single snapshot document used before sections were split out
+OLD_SNAPSHOT_DOCUMENT = 'dashboard'
+
+# Bump when the section layout changes so stored sections get rebuilt
+DASHBOARD_LAYOUT = 5
+
+
+def section_document(subject_name):
+    """Name of the document holding a subject's section (subject names aren't safe file names)"""
+    return SECTION_DOCUMENT_PREFIX + hashlib.sha1(subject_name.encode('utf-8')).hexdigest()[:20]
+
+
+def section_data(subject_name, section):
+    """A section as it is stored: {"layout": DASHBOARD_LAYOUT, "subject": subject_name, "section": section}"""
+    return {'layout': DASHBOARD_LAYOUT, 'subject': subject_name, 'section': section}
+
+
+def stored_section(document):
+    """The section in a stored document, or None if it is missing or in an older layout"""
+    if document is None or document.get('layout') != DASHBOARD_LAYOUT:
+        return None
+    return document['section']
+
+
+def empty_section():
+    """
+    Materialised data for the home page and statistics, one section (rollup) per
+    subject: a summary per test (in details order) plus the subject's totals over
+    all of its tests.
+    """
+    return {
+        'tests': [],
+        'completed': 0,
+        'required': 0,
+        'topics': 0,
+        'score_sum': 0.0,
+        'score_count': 0,
+        'by_date': {}
+    }
+
+
+def test_entry(test, aggregates):
+    """
+    Summarise a test and its progress aggregates for the snapshot; 'version' is
+    the progress version the numbers were taken at.
+    """
+    entry = {
+        'id': test['id'],
+        'version': aggregates.get('version', 0),
+        'required': required_resources(test),
+        'topics': len(test['topics']) if isinstance(test.get('topics'), list) else 0,
+        'completed': aggregates['total'],
+        'score_sum': aggregates['score_sum'],
+        'score_count': aggregates['score_count'],
+        'by_date': dict(aggregates['by_date'])
+    }
+    # Keep missing names and dates missing, as they are in the details
+    for key in ('name', 'date'):
+        if key in test:
+            entry[key] = test[key]
+    return entry
+
+
+def _apply(section, entry, sign):
+    """Add (sign=1) or take away (sign=-1) a test's contribution to its subject's totals"""
+    section['completed'] += sign * entry['completed']
+    section['required'] += sign * entry['required']
+    section['topics'] += sign * entry['topics']
+    section['score_sum'] += sign * entry['score_sum']
+    section['score_count'] += sign * entry['score_count']
+
+    by_date = section['by_date']
+    for record_date, count in entry['by_date'].items():
+        by_date[record_date] = by_date.get(record_date, 0) + sign * count
+        if by_date[record_date] <= 0:
+            del by_date[record_date]
+
+
+def build_section(entries):
+    """Build a subject's section from its test entries"""
+    section = empty_section()
+    for entry in entries:
+        section['tests'].append(entry)
+        _apply(section, entry, 1)
+    return section
+
+
+def update_test_progress(section, test_id, aggregates):
+    """
+    Refresh one test's progress numbers after its records changed.
+    Returns False if the test isn't in the section.
+    """
+    entry = next((e for e in section['tests'] if e['id'] == test_id), None)
+    if entry is None:
+        return False
+
+    _apply(section, entry, -1)
+    entry['version'] = aggregates.get('version', 0)
+    entry['completed'] = aggregates['total']
+    entry['score_sum'] = aggregates['score_sum']
+    entry['score_count'] = aggregates['score_count']
+    entry['by_date'] = dict(aggregates['by_date'])
+    _apply(section, entry, 1)
+    return True
+
+
+def merge_sections(sections):
+    """Add up subject sections into overall totals"""
+    totals = {'tests': 0, 'completed': 0, 'required': 0, 'topics': 0,
+              'score_sum': 0.0, 'score_count': 0, 'by_date': {}}
+
+    for section in sections:
+        totals['tests'] += len(section['tests'])
+        for key in ('completed', 'required', 'topics', 'score_sum', 'score_count'):
+            totals[key] += section[key]
+        for record_date, count in section['by_date'].items():
+            totals['by_date'][record_date] = totals['by_date'].get(record_date, 0) + count
+
+    return totals
+
+
+def same_section(stored, rebuilt):
+    """Compare a stored section with a freshly built one, allowing for float rounding in score sums"""
+    if stored is None:
+        return False
+    return (abs(stored['score_sum'] - rebuilt['score_sum']) < 1e-6 and
+            {k: v for k, v in stored.items() if k != 'score_sum'} ==
+            {k: v for k, v in rebuilt.items() if k != 'score_sum'})
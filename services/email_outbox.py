@@ -0,0 +1,212 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+"""
+
+# How long delivered messages are kept around for the dashboard counts
+SENT_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+
+class EmailOutbox:
+    """
+    Persistent queue of outgoing emails in a small SQLite database.
+    Messages are 'pending' until delivered ('sent') or until they have failed
+    max_attempts times, at which point they are dead-lettered ('dead').
+    """
+
+    def __init__(self, path, max_attempts=5, base_delay=30, max_delay=60 * 60, claim_seconds=10 * 60):
+        self.path = path
+        self.max_attempts = max_attempts
+        # Retry after base_delay, then twice that, and so on up to max_delay (seconds)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # A claimed message that was never settled (its worker died) becomes due again after this long
+        self.claim_seconds = claim_seconds
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _message(row):
+        return {
+            'id': row['id'],
+            'subject': row['subject'],
+            'recipients': json.loads(row['recipients']),
+            'html': row['html'],
+            'attempts': row['attempts']
+        }
+
+    def enqueue(self, subject, recipients, html):
+        """Queue a message for delivery and return its id"""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute('INSERT INTO outbox (subject, recipients, html, next_attempt_at, created_at) '
+                                'VALUES (?, ?, ?, ?, ?)',
+                                (subject, json.dumps(recipients), html, now, now)).lastrowid
+
+    def due_messages(self, limit=50, now=None):
+        """
+        Claim the pending messages whose next attempt is due, oldest first. Claimed
+        messages are held back for claim_seconds, so a worker in another process
+        draining the same outbox doesn't send them too; mark_sent or mark_failed
+        settles them before then.
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading so two workers can't claim the same rows
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ? '
+                                'ORDER BY next_attempt_at, id LIMIT ?', ('pending', now, limit)).fetchall()
+            conn.executemany('UPDATE outbox SET next_attempt_at = ? WHERE id = ?',
+                             [(now + self.claim_seconds, row['id']) for row in rows])
+        return [self._message(row) for row in rows]
+
+    def next_due_in(self, now=None):
+        """Seconds until the next pending message is due (0 if one is due now), or None if none are pending"""
+        now = time.time() if now is None else now
+        row = self._connect().execute('SELECT MIN(next_attempt_at) AS due FROM outbox WHERE status = ?',
+                                      ('pending',)).fetchone()
+        if row['due'] is None:
+            return None
+        return max(row['due'] - now, 0)
+
+    def mark_sent(self, message_id):
+        with self._connect() as conn:
+            conn.execute('UPDATE outbox SET status = ?, sent_at = ?, last_error = NULL WHERE id = ?',
+                         ('sent', time.time(), message_id))
+
+    def mark_failed(self, message_id, error):
+        """Record a failed attempt, scheduling a retry with backoff or dead-lettering the message"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT attempts FROM outbox WHERE id = ?', (message_id,)).fetchone()
+            if row is None:
+                return
+
+            attempts = row['attempts'] + 1
+            if attempts >= self.max_attempts:
+                conn.execute('UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE id = ?',
+                             ('dead', attempts, error, message_id))
+            else:
+                delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+                conn.execute('UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                             (attempts, now + delay, error, message_id))
+
+    def retry(self, message_id):
+        """Put a dead-lettered message back in the queue; returns False if there was no such message"""
+        with self._connect() as conn:
+            return conn.execute('UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? '
+                                'WHERE id = ? AND status = ?',
+                                ('pending', time.time(), message_id, 'dead')).rowcount > 0
+
+    def prune_sent(self, older_than=SENT_RETENTION_SECONDS):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM outbox WHERE status = ? AND sent_at < ?', ('sent', time.time() - older_than))
+
+    def stats(self):
+        """Return message counts by status: {'pending': n, 'sent': n, 'dead': n, 'retrying': n}"""
+        conn = self._connect()
+        counts = {'pending': 0, 'sent': 0, 'dead': 0}
+        for row in conn.execute('SELECT status, COUNT(*) AS n FROM outbox GROUP BY status'):
+            counts[row['status']] = row['n']
+        counts['retrying'] = conn.execute('SELECT COUNT(*) FROM outbox WHERE status = ? AND attempts > 0',
+                                          ('pending',)).fetchone()[0]
+        return counts
+
+    def failures(self, limit=20):
+        """Return the most recent dead-lettered or retrying messages with their last error"""
+        rows = self._connect().execute('SELECT id, subject, status, attempts, last_error, created_at FROM outbox '
+                                       'WHERE status = ? OR (status = ? AND attempts > 0) '
+                                       'ORDER BY id DESC LIMIT ?', ('dead', 'pending', limit)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class OutboxWorker(threading.Thread):
+    """
+    Background thread that drains an EmailOutbox in batches through a
+    send_batch(messages) callable, which returns {message id: error message,
+    or None if it was delivered} so one bad message doesn't fail the rest.
+    """
+
+    def __init__(self, outbox, send_batch, poll_interval=30, batch_size=50, linger=0.5):
+        super().__init__(name='email-outbox', daemon=True)
+        self.outbox = outbox
+        self.send_batch = send_batch
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        # After being woken, wait this long so a burst of messages goes out as one batch
+        self.linger = linger
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def notify(self):
+        """Wake the worker early, e.g. right after a message was queued"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self.drain()
+                self.outbox.prune_sent()
+                due_in = self.outbox.next_due_in()
+            except Exception as e:
+                print(f"Email outbox error: {str(e)}")
+                due_in = None
+
+            # Sleep until the next retry is due, a new message arrives or the poll interval passes
+            timeout = self.poll_interval if due_in is None else min(due_in, self.poll_interval)
+            if self._wake.wait(timeout) and not self._stopping.is_set():
+                self._stopping.wait(self.linger)
+            self._wake.clear()
+
+    def drain(self):
+        """Send every message that is due; returns the number delivered"""
+        delivered = 0
+        while not self._stopping.is_set():
+            messages = self.outbox.due_messages(self.batch_size)
+            if not messages:
+                break
+
+            results = self.send_batch(messages)
+            for message in messages:
+                error = results.get(message['id'], 'Message was not sent')
+                if error is None:
+                    self.outbox.mark_sent(message['id'])
+                    delivered += 1
+                else:
+                    print(f"Email send attempt {message['attempts'] + 1} failed: {error}")
+                    self.outbox.mark_failed(message['id'], error)
+        return delivered
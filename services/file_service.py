@@ -0,0 +1,208 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows); file_lock then only guards against other threads
+    fcntl = None
+
+# Default maximum number of parsed JSON documents kept in memory
+JSON_CACHE_SIZE = 256
+
+
+def _file_signature(path):
+    """
+    Return the (inode, mtime_ns, ctime_ns, size) used to validate a cache entry.
+    Atomic writes replace the file, so the inode changes even when a rewrite
+    lands within the filesystem's timestamp granularity at the same size.
+    """
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size
+
+
+def _parse_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def _parse_json_lines(path):
+    entries = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn write can leave a partial last line; ignore it
+                continue
+    return entries
+
+
+class JsonFiles:
+    """
+    Reads and writes JSON files through a cache of parsed documents, holding at
+    most size of them. Each storage backend has its own, so apps in one process
+    can size theirs differently; the functions below share a default one.
+    """
+
+    def __init__(self, size=JSON_CACHE_SIZE):
+        self.size = size
+        # path -> (file signature, pickled document), least recently used first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_cached(self, path, loader):
+        """Run loader on path, reusing its result while the file is unchanged"""
+        key = os.path.abspath(path)
+        signature = _file_signature(key)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == signature:
+                self._cache.move_to_end(key)
+                # Hand out a fresh copy so callers can mutate it freely
+                return pickle.loads(entry[1])
+
+        data = loader(key)
+
+        # Only cache if the file didn't change while we were reading it
+        if _file_signature(key) == signature:
+            blob = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                self._cache[key] = (signature, blob)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+
+        return data
+
+    def read_json(self, path):
+        """
+        Load a JSON file, reusing the parsed document while the file is unchanged.
+        Raises the same errors as open() and json.load() so callers keep their
+        own handling for missing or corrupted files.
+        """
+        return self._load_cached(path, _parse_json)
+
+    def read_json_lines(self, path):
+        """Load a JSON-lines file as a list of entries, skipping unreadable lines"""
+        return self._load_cached(path, _parse_json_lines)
+
+    def append_json_line(self, path, entry):
+        """Append one entry to a JSON-lines file"""
+        self.append_json_lines(path, [entry])
+
+    def append_json_lines(self, path, entries):
+        """Append entries to a JSON-lines file with a single write"""
+        line = ''.join(json.dumps(entry) + '\n' for entry in entries).encode('utf-8')
+        with open(path, 'ab+') as file:
+            # Start on a fresh line if an earlier write was cut short
+            if file.seek(0, os.SEEK_END) > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    line = b'\n' + line
+            file.write(line)
+        self.invalidate(path)
+
+    def write_json(self, path, data):
+        """
+        Write a JSON file and drop any cached copy of it. The data goes to a temporary
+        file that then replaces the old one, so readers see either the old or the new
+        document, never a half-written one.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(data, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.invalidate(path)
+
+    def invalidate(self, path=None):
+        """Forget the cached copy of a file, or of every file if no path is given"""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(os.path.abspath(path), None)
+
+    def invalidate_dir(self, path):
+        """Forget the cached copies of every file under a directory"""
+        prefix = os.path.join(os.path.abspath(path), '')
+        with self._lock:
+            for key in [k for k in self._cache if k.startswith(prefix)]:
+                del self._cache[key]
+
+
+_default_files = JsonFiles()
+read_json = _default_files.read_json
+read_json_lines = _default_files.read_json_lines
+append_json_line = _default_files.append_json_line
+append_json_lines = _default_files.append_json_lines
+write_json = _default_files.write_json
+invalidate = _default_files.invalidate
+invalidate_dir = _default_files.invalidate_dir
+
+
+# Locks held by the current thread: lock file path -> nesting depth
+_held_locks = threading.local()
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold an advisory lock for a read-modify-write cycle on path, across threads and
+    processes. The lock lives in a '<path>.lock' file next to it (path itself gets
+    replaced by write_json). Nested use on the same path by one thread is allowed;
+    the outermost lock's mode applies, so don't take an exclusive lock inside a shared one.
+    """
+    lock_path = os.path.abspath(path) + '.lock'
+    held = getattr(_held_locks, 'paths', None)
+    if held is None:
+        held = _held_locks.paths = {}
+
+    if lock_path in held:
+        held[lock_path] += 1
+        try:
+            yield
+        finally:
+            held[lock_path] -= 1
+        return
+
+    if fcntl is None:
+        with _thread_locks_lock:
+            lock = _thread_locks.setdefault(lock_path, threading.RLock())
+        with lock:
+            held[lock_path] = 1
+            try:
+                yield
+            finally:
+                del held[lock_path]
+        return
+
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        held[lock_path] = 1
+        try:
+            yield
+        finally:
+            del held[lock_path]
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,75 @@
+SUMMARIES_DOCUMENT = 'past_test_summaries'
+
+
+def empty_summaries():
+    """
+    Frozen record summaries for tests whose date has passed:
+    {"subjects": {subject_name: {test_id: summary}}} (see summarize_records); each
+    summary's 'version' is the progress version it was made from
+    """
+    return {'subjects': {}}
+
+
+def summarize_records(records):
+    """
+    Boil a test's progress records down to what the past tests page shows:
+    study dates, completions per date and per topic (in first-seen order) and scores.
+    """
+    date_counts = {}
+    topic_counts = {}
+    scores = []
+
+    for record in records:
+        record_date = record.get('date')
+        if record_date:
+            date_counts[record_date] = date_counts.get(record_date, 0) + 1
+
+        topic_name = record.get('topic_name')
+        topic_counts[topic_name] = topic_counts.get(topic_name, 0) + 1
+
+        if 'score' in record and record['score'] is not None:
+            scores.append(record['score'])
+
+    return {
+        'unique_dates': sorted(date_counts),
+        'date_counts': date_counts,
+        'topic_counts': topic_counts,
+        'scores': scores,
+        'avg_score': sum(scores) / len(scores) if scores else 0
+    }
+
+
+def get_summary(summaries, subject_name, test_id):
+    return summaries['subjects'].get(subject_name, {}).get(test_id)
+
+
+def summary_version(summary):
+    """The progress version a summary was made from (-1 for summaries frozen before they had one)"""
+    return summary.get('version', -1)
+
+
+def set_summary(summaries, subject_name, test_id, summary):
+    summaries['subjects'].setdefault(subject_name, {})[test_id] = summary
+
+
+def freeze_summary(summaries, subject_name, test_id, summary):
+    """
+    Store a summary unless one made from newer progress is already there.
+    Returns the summaries, or None if they were left alone.
+    """
+    summaries = summaries or empty_summaries()
+    stored = get_summary(summaries, subject_name, test_id)
+    if stored is not None and summary_version(stored) >= summary_version(summary):
+        return None
+    set_summary(summaries, subject_name, test_id, summary)
+    return summaries
+
+
+def rename_subject(summaries, old_name, new_name):
+    subject_summaries = summaries['subjects'].pop(old_name, None)
+    if subject_summaries is not None:
+        summaries['subjects'][new_name] = subject_summaries
+
+
+def remove_subject(summaries, subject_name):
+    summaries['subjects'].pop(subject_name, None)
@@ -0,0 +1,170 @@
+import heapq
+import threading
+from datetime import date, datetime, timedelta
+
+# Reminders go out this many days before a test
+REMINDER_DAYS = (7, 3, 1)
+
+SENT_REMINDERS_DOCUMENT = 'sent_reminders'
+
+
+def empty_sent_reminders():
+    """
+    Which reminders have gone out, so a restart doesn't send them again:
+    {"subjects": {subject_name: {test_id: {"date": test_date, "days": [7, 3, ...]}}}}
+    A test whose date changes starts over with no reminders sent.
+    """
+    return {'subjects': {}}
+
+
+def was_sent(sent, subject_name, test_id, test_date, days):
+    entry = sent['subjects'].get(subject_name, {}).get(test_id)
+    return entry is not None and entry['date'] == test_date and days in entry['days']
+
+
+def mark_sent(sent, subject_name, test_id, test_date, days):
+    tests = sent['subjects'].setdefault(subject_name, {})
+    entry = tests.get(test_id)
+    if entry is None or entry['date'] != test_date:
+        entry = tests[test_id] = {'date': test_date, 'days': []}
+    if days not in entry['days']:
+        entry['days'].append(days)
+
+
+def unmark_sent(sent, subject_name, test_id, test_date, days):
+    """Take back a reminder that was marked sent but couldn't be queued"""
+    entry = sent['subjects'].get(subject_name, {}).get(test_id)
+    if entry is not None and entry['date'] == test_date and days in entry['days']:
+        entry['days'].remove(days)
+
+
+def rename_subject(sent, old_name, new_name):
+    tests = sent['subjects'].pop(old_name, None)
+    if tests is not None:
+        sent['subjects'][new_name] = tests
+
+
+def remove_subject(sent, subject_name):
+    sent['subjects'].pop(subject_name, None)
+
+
+class ReminderSchedule:
+    """
+    Min-heap of upcoming reminders, (due date ordinal, subject, test id, days before, test date ordinal),
+    plus the subject manifest entry (name, date, ordinal, required) of every scheduled test.
+
+    Changing a subject's tests only pushes the new reminders; entries for the
+    old dates stay in the heap and are dropped when they reach the top, so
+    each change and each due reminder costs O(log n).
+    """
+
+    def __init__(self):
+        self._heap = []
+        # subject_name -> {test_id: manifest entry}, with the current dates
+        self._subjects = {}
+        self._lock = threading.Lock()
+
+    def set_subject(self, subject_name, entries, today=None):
+        """Schedule reminders for a subject's tests, given as {test_id: manifest entry}"""
+        today = (today or date.today()).toordinal()
+        with self._lock:
+            old = self._subjects.get(subject_name, {})
+            self._subjects[subject_name] = dict(entries)
+            for test_id, entry in entries.items():
+                ordinal = entry['ordinal']
+                if test_id in old and old[test_id]['ordinal'] == ordinal or ordinal <= today:
+                    continue
+                for days in REMINDER_DAYS:
+                    heapq.heappush(self._heap, (ordinal - days, subject_name, test_id, days, ordinal))
+
+    def remove_subject(self, subject_name):
+        with self._lock:
+            self._subjects.pop(subject_name, None)
+
+    def rename_subject(self, old_name, new_name):
+        with self._lock:
+            entries = self._subjects.pop(old_name, None)
+        if entries is not None:
+            self.set_subject(new_name, entries)
+
+    def _current_entry(self, item):
+        """Return the test's entry if the heap item is for its current date, else None"""
+        due, subject_name, test_id, days, ordinal = item
+        entry = self._subjects.get(subject_name, {}).get(test_id)
+        return entry if entry is not None and entry['ordinal'] == ordinal else None
+
+    def pop_due(self, today=None):
+        """
+        Take every reminder due by today for a test that hasn't happened yet.
+        Returns [(subject_name, test_id, days, manifest entry)].
+        """
+        today = (today or date.today()).toordinal()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= today:
+                item = heapq.heappop(self._heap)
+                entry = self._current_entry(item)
+                if entry is not None and entry['ordinal'] > today:
+                    due.append((item[1], item[2], item[3], entry))
+        return due
+
+    def requeue(self, reminders):
+        """Put reminders taken by pop_due back, e.g. ones that couldn't be sent, for the next check"""
+        with self._lock:
+            for subject_name, test_id, days, entry in reminders:
+                heapq.heappush(self._heap, (entry['ordinal'] - days, subject_name, test_id, days, entry['ordinal']))
+
+
+class ReminderScheduler(threading.Thread):
+    """
+    Background thread that hands due reminders to send_due(reminders) once a
+    day (shortly after midnight) and whenever the schedule changes. send_due
+    returns (number sent, reminders that couldn't be sent); those go back in the
+    schedule and are tried again at the next check.
+    """
+
+    def __init__(self, schedule, send_due, poll_interval=60 * 60):
+        super().__init__(name='reminder-scheduler', daemon=True)
+        self.schedule = schedule
+        self.send_due = send_due
+        self.poll_interval = poll_interval
+        self._check_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def notify(self):
+        """Wake the scheduler early, e.g. after a test date changed"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def check(self, today=None):
+        """Send whatever is due now; returns the number of reminders sent"""
+        with self._check_lock:
+            due = self.schedule.pop_due(today)
+            if not due:
+                return 0
+
+            try:
+                sent, failed = self.send_due(due)
+            except Exception:
+                # The sent-reminders record keeps anything that did go out from being sent twice
+                self.schedule.requeue(due)
+                raise
+            self.schedule.requeue(failed)
+            return sent
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Reminder scheduler error: {str(e)}")
+
+            # Everything due today has been handled, so sleep until just after midnight or until woken
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            self._wake.wait(min((midnight - now).total_seconds() + 1, self.poll_interval))
+            self._wake.clear()
@@ -0,0 +1,88 @@
+INDEX_DOCUMENT = 'resource_index'
+
+
+def empty_index():
+    """
+    Reverse index from test, topic and resource ids to their owners:
+    {"tests": {test_id: subject_name},
+     "topics": {topic_id: [subject_name, test_id]},
+     "resources": {resource_id: [subject_name, test_id, topic_id]}}
+    """
+    return {'tests': {}, 'topics': {}, 'resources': {}}
+
+
+def add_test(index, subject_name, test):
+    """Index a test together with all of its topics and resources"""
+    if not isinstance(test, dict) or 'id' not in test:
+        return
+
+    index['tests'][test['id']] = subject_name
+    if isinstance(test.get('topics'), list):
+        for topic in test['topics']:
+            add_topic(index, subject_name, test['id'], topic)
+
+
+def add_topic(index, subject_name, test_id, topic):
+    """Index a topic together with its resources"""
+    if not isinstance(topic, dict) or 'id' not in topic:
+        return
+
+    index['topics'][topic['id']] = [subject_name, test_id]
+    if isinstance(topic.get('resources'), list):
+        for resource in topic['resources']:
+            add_resource(index, subject_name, test_id, topic['id'], resource)
+
+
+def add_resource(index, subject_name, test_id, topic_id, resource):
+    if isinstance(resource, dict) and 'id' in resource:
+        index['resources'][resource['id']] = [subject_name, test_id, topic_id]
+
+
+def remove_resource(index, resource_id):
+    index['resources'].pop(resource_id, None)
+
+
+def remove_topic(index, topic_id):
+    """Drop a topic and every resource filed under it"""
+    index['topics'].pop(topic_id, None)
+    for resource_id in [r for r, owner in index['resources'].items() if owner[2] == topic_id]:
+        del index['resources'][resource_id]
+
+
+def remove_test(index, test_id):
+    """Drop a test and every topic and resource filed under it"""
+    index['tests'].pop(test_id, None)
+    for topic_id in [t for t, owner in index['topics'].items() if owner[1] == test_id]:
+        del index['topics'][topic_id]
+    for resource_id in [r for r, owner in index['resources'].items() if owner[1] == test_id]:
+        del index['resources'][resource_id]
+
+
+def remove_subject(index, subject_name):
+    """Drop everything filed under a subject"""
+    for section in ('tests', 'topics', 'resources'):
+        entries = index[section]
+        for key in [k for k, owner in entries.items() if _owner_subject(owner) == subject_name]:
+            del entries[key]
+
+
+def rename_subject(index, old_name, new_name):
+    """Point everything filed under old_name at new_name"""
+    for section in ('tests', 'topics', 'resources'):
+        entries = index[section]
+        for key, owner in entries.items():
+            if _owner_subject(owner) == old_name:
+                entries[key] = new_name if isinstance(owner, str) else [new_name] + owner[1:]
+
+
+def build_index(subjects_details):
+    """Build a complete index from (subject_name, details) pairs"""
+    index = empty_index()
+    for subject_name, details in subjects_details:
+        for test in details.get('tests', []):
+            add_test(index, subject_name, test)
+    return index
+
+
+def _owner_subject(owner):
+    return owner if isinstance(owner, str) else owner[0]
@@ -0,0 +1,557 @@
+import json
+import sqlite3
+import threading
+
+from services.storage import DATA_VERSION_DOCUMENT, Storage, SubjectExists, VersionConflict
+from services.test_service import (add_record_to_aggregates, empty_progress_aggregates,
+                                   remove_record_from_aggregates)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    position INTEGER,
+    details TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tests (
+    row_id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    raw INTEGER NOT NULL DEFAULT 0,
+    id TEXT,
+    name TEXT,
+    date TEXT,
+    extra TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tests_subject ON tests(subject_id, position);
+
+CREATE TABLE IF NOT EXISTS topics (
+    row_id INTEGER PRIMARY KEY,
+    test_row_id INTEGER NOT NULL REFERENCES tests(row_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    raw INTEGER NOT NULL DEFAULT 0,
+    id TEXT,
+    name TEXT,
+    extra TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_topics_test ON topics(test_row_id, position);
+
+CREATE TABLE IF NOT EXISTS resources (
+    row_id INTEGER PRIMARY KEY,
+    topic_row_id INTEGER NOT NULL REFERENCES topics(row_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    raw INTEGER NOT NULL DEFAULT 0,
+    id TEXT,
+    name TEXT,
+    count INTEGER,
+    extra TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_resources_topic ON resources(topic_row_id, position);
+CREATE INDEX IF NOT EXISTS idx_resources_id ON resources(id);
+
+CREATE TABLE IF NOT EXISTS progress_records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    test_id TEXT NOT NULL,
+    id TEXT,
+    resource_id TEXT,
+    topic_name TEXT,
+    date TEXT,
+    score REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_progress_resource ON progress_records(subject_id, test_id, resource_id);
+CREATE INDEX IF NOT EXISTS idx_progress_date ON progress_records(subject_id, test_id, date);
+CREATE INDEX IF NOT EXISTS idx_progress_id ON progress_records(id);
+
+CREATE TABLE IF NOT EXISTS progress_aggregates (
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    test_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (subject_id, test_id)
+);
+"""
+
+# Keys stored in their own columns; anything else is kept in the row's extra JSON
+TEST_COLUMNS = ('id', 'name', 'date')
+TOPIC_COLUMNS = ('id', 'name')
+RESOURCE_COLUMNS = ('id', 'name', 'count')
+
+
+def _split_item(item, columns, children_key=None):
+    """
+    Split a test/topic/resource dict into (raw, column values, extra JSON, children).
+    Non-dict items are kept verbatim so a save/load round trip is lossless.
+    """
+    if not isinstance(item, dict):
+        return 1, [None] * len(columns), json.dumps(item), []
+
+    values = []
+    extra = dict(item)
+    for column in columns:
+        value = item.get(column)
+        # Only plain values go in columns, so a missing key stays missing on load
+        if column == 'count':
+            usable = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            usable = isinstance(value, str)
+        if usable:
+            values.append(value)
+            del extra[column]
+        else:
+            values.append(None)
+
+    children = []
+    if children_key and isinstance(extra.get(children_key), list):
+        children = extra.pop(children_key)
+    elif children_key:
+        children = None
+
+    return 0, values, json.dumps(extra), children
+
+
+def _join_item(row, columns, children_key=None, children=None):
+    """Rebuild a dict from a row produced by _split_item"""
+    if row['raw']:
+        return json.loads(row['extra'])
+
+    item = {}
+    for column in columns:
+        if row[column] is not None:
+            item[column] = row[column]
+    item.update(json.loads(row['extra']))
+    if children_key and children_key not in item:
+        item[children_key] = children if children is not None else []
+    return item
+
+
+class SqliteStorage(Storage):
+    """
+    Single SQLite database in WAL mode. Subject details are broken out into
+    tests/topics/resources tables and progress records are indexed by
+    resource and date so counts are answered by SQL.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Only this thread uses it, but close() may run on another one
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def _subject_id(self, conn, subject_name, create=False):
+        row = conn.execute('SELECT id FROM subjects WHERE name = ?', (subject_name,)).fetchone()
+        if row is not None:
+            return row['id']
+        if not create:
+            return None
+        return conn.execute('INSERT INTO subjects (name) VALUES (?)', (subject_name,)).lastrowid
+
+    # ----- Subjects -----
+
+    def has_subjects(self):
+        row = self._connect().execute("SELECT 1 FROM meta WHERE key = 'subjects_saved'").fetchone()
+        return row is not None
+
+    def load_subjects(self):
+        if not self.has_subjects():
+            return None
+        rows = self._connect().execute(
+            'SELECT name FROM subjects WHERE position IS NOT NULL ORDER BY position').fetchall()
+        return [row['name'] for row in rows]
+
+    def save_subjects(self, subjects):
+        with self._connect() as conn:
+            conn.execute('UPDATE subjects SET position = NULL')
+            for position, subject_name in enumerate(subjects):
+                conn.execute('INSERT INTO subjects (name, position) VALUES (?, ?) '
+                             'ON CONFLICT(name) DO UPDATE SET position = excluded.position',
+                             (subject_name, position))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('subjects_saved', '1')")
+
+    def has_subject_details(self, subject_name):
+        row = self._connect().execute(
+            'SELECT 1 FROM subjects WHERE name = ? AND details IS NOT NULL', (subject_name,)).fetchone()
+        return row is not None
+
+    def load_subject_details(self, subject_name):
+        conn = self._connect()
+        subject = conn.execute('SELECT id, details FROM subjects WHERE name = ?', (subject_name,)).fetchone()
+        if subject is None or subject['details'] is None:
+            return None
+
+        details = json.loads(subject['details'])
+        if 'tests' in details:
+            return details
+
+        test_rows = conn.execute('SELECT * FROM tests WHERE subject_id = ? ORDER BY position',
+                                 (subject['id'],)).fetchall()
+        topic_rows = conn.execute(
+            'SELECT topics.* FROM topics JOIN tests ON tests.row_id = topics.test_row_id '
+            'WHERE tests.subject_id = ? ORDER BY topics.position', (subject['id'],)).fetchall()
+        resource_rows = conn.execute(
+            'SELECT resources.* FROM resources '
+            'JOIN topics ON topics.row_id = resources.topic_row_id '
+            'JOIN tests ON tests.row_id = topics.test_row_id '
+            'WHERE tests.subject_id = ? ORDER BY resources.position', (subject['id'],)).fetchall()
+
+        resources_by_topic = {}
+        for row in resource_rows:
+            resources_by_topic.setdefault(row['topic_row_id'], []).append(
+                _join_item(row, RESOURCE_COLUMNS))
+
+        topics_by_test = {}
+        for row in topic_rows:
+            topics_by_test.setdefault(row['test_row_id'], []).append(
+                _join_item(row, TOPIC_COLUMNS, 'resources', resources_by_topic.get(row['row_id'])))
+
+        details['tests'] = [_join_item(row, TEST_COLUMNS, 'topics', topics_by_test.get(row['row_id']))
+                            for row in test_rows]
+        return details
+
+    def save_subject_details(self, subject_name, details, expected_version=None):
+        with self._connect() as conn:
+            # Take the write lock before reading the version so the check and the save are one step
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT json_extract(details, '$.version') FROM subjects WHERE name = ?",
+                               (subject_name,)).fetchone()
+            version = (row[0] or 0) if row is not None else 0
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"{subject_name} is at version {version}, not {expected_version}")
+            details['version'] = version + 1
+
+            details = dict(details)
+            tests = details.pop('tests', [])
+            if not isinstance(tests, list):
+                # Keep unexpected shapes verbatim instead of breaking them into rows
+                details['tests'] = tests
+                tests = []
+
+            subject_id = self._subject_id(conn, subject_name, create=True)
+            conn.execute('UPDATE subjects SET details = ? WHERE id = ?', (json.dumps(details), subject_id))
+            conn.execute('DELETE FROM tests WHERE subject_id = ?', (subject_id,))
+
+            for test_position, test in enumerate(tests):
+                raw, values, extra, topics = _split_item(test, TEST_COLUMNS, 'topics')
+                test_row_id = conn.execute(
+                    'INSERT INTO tests (subject_id, position, raw, id, name, date, extra) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', (subject_id, test_position, raw, *values, extra)).lastrowid
+
+                for topic_position, topic in enumerate(topics or []):
+                    raw, values, extra, resources = _split_item(topic, TOPIC_COLUMNS, 'resources')
+                    topic_row_id = conn.execute(
+                        'INSERT INTO topics (test_row_id, position, raw, id, name, extra) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', (test_row_id, topic_position, raw, *values, extra)).lastrowid
+
+                    conn.executemany(
+                        'INSERT INTO resources (topic_row_id, position, raw, id, name, count, extra) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        [(topic_row_id, resource_position, *self._resource_row(resource))
+                         for resource_position, resource in enumerate(resources or [])])
+
+    @staticmethod
+    def _resource_row(resource):
+        raw, values, extra, _ = _split_item(resource, RESOURCE_COLUMNS)
+        return (raw, *values, extra)
+
+    def rename_subject(self, old_name, new_name):
+        with self._connect() as conn:
+            old_id = self._subject_id(conn, old_name)
+            if old_id is None:
+                return
+
+            # save_subjects may already have listed the new name; take over its place
+            existing = conn.execute('SELECT id, position, details FROM subjects WHERE name = ?', (new_name,)).fetchone()
+            if existing is not None:
+                if existing['details'] is not None or conn.execute(
+                        'SELECT 1 FROM progress_aggregates WHERE subject_id = ? LIMIT 1', (existing['id'],)).fetchone():
+                    raise SubjectExists(f'Data for "{new_name}" is already stored')
+                conn.execute('DELETE FROM subjects WHERE id = ?', (existing['id'],))
+                conn.execute('UPDATE subjects SET name = ?, position = ? WHERE id = ?',
+                             (new_name, existing['position'], old_id))
+            else:
+                conn.execute('UPDATE subjects SET name = ? WHERE id = ?', (new_name, old_id))
+
+    def delete_subject(self, subject_name):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM subjects WHERE name = ?', (subject_name,))
+
+    # ----- Progress records -----
+
+    @staticmethod
+    def _record_row(subject_id, test_id, record):
+        score = record.get('score')
+        if not isinstance(score, (int, float)) or isinstance(score, bool):
+            score = None
+        return (subject_id, test_id, record.get('id'), record.get('resource_id'),
+                record.get('topic_name'), record.get('date'), score, json.dumps(record))
+
+    def load_progress_records(self, subject_name, test_id):
+        conn = self._connect()
+        subject_id = self._subject_id(conn, subject_name)
+        if subject_id is None:
+            return {"records": []}
+
+        # Version first: if records are added in between, a save at this version fails instead of losing them
+        version = self._progress_version(conn, subject_id, test_id)
+        rows = conn.execute('SELECT data FROM progress_records WHERE subject_id = ? AND test_id = ? ORDER BY seq',
+                            (subject_id, test_id)).fetchall()
+        return {"records": [json.loads(row['data']) for row in rows], "version": version}
+
+    @staticmethod
+    def _progress_version(conn, subject_id, test_id):
+        row = conn.execute("SELECT json_extract(data, '$.version') FROM progress_aggregates "
+                           "WHERE subject_id = ? AND test_id = ?", (subject_id, test_id)).fetchone()
+        return (row[0] or 0) if row is not None else 0
+
+    def _check_progress_version(self, conn, subject_id, test_id, expected_version):
+        """Raise VersionConflict if a test's progress isn't at expected_version (inside a write transaction)"""
+        if expected_version is None:
+            return
+        version = self._progress_version(conn, subject_id, test_id) if subject_id is not None else 0
+        if version != expected_version:
+            raise VersionConflict(f"Progress for test {test_id} is at version {version}, not {expected_version}")
+
+    def save_progress_records(self, subject_name, test_id, progress_data, expected_version=None):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            subject_id = self._subject_id(conn, subject_name, create=True)
+            self._check_progress_version(conn, subject_id, test_id, expected_version)
+            conn.execute('DELETE FROM progress_records WHERE subject_id = ? AND test_id = ?', (subject_id, test_id))
+            conn.executemany(
+                'INSERT INTO progress_records (subject_id, test_id, id, resource_id, topic_name, date, score, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._record_row(subject_id, test_id, record) for record in progress_data.get('records', [])])
+            self._save_aggregates(conn, subject_id, test_id, self._build_aggregates(conn, subject_id, test_id))
+            progress_data['version'] = self._progress_version(conn, subject_id, test_id)
+
+    def append_progress_record(self, subject_name, test_id, record):
+        with self._connect() as conn:
+            # Write lock first: the aggregates are read, changed and written back in this transaction
+            conn.execute('BEGIN IMMEDIATE')
+            subject_id = self._subject_id(conn, subject_name, create=True)
+            aggregates = self._load_aggregates(conn, subject_id, test_id)
+            conn.execute(
+                'INSERT INTO progress_records (subject_id, test_id, id, resource_id, topic_name, date, score, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self._record_row(subject_id, test_id, record))
+            add_record_to_aggregates(aggregates, record)
+            self._save_aggregates(conn, subject_id, test_id, aggregates)
+
+    def delete_progress_record(self, subject_name, test_id, record):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            subject_id = self._subject_id(conn, subject_name)
+            if subject_id is None:
+                return
+            aggregates = self._load_aggregates(conn, subject_id, test_id)
+            deleted = conn.execute('DELETE FROM progress_records WHERE subject_id = ? AND test_id = ? AND id = ?',
+                                   (subject_id, test_id, record['id'])).rowcount
+            if deleted:
+                remove_record_from_aggregates(aggregates, record)
+                self._save_aggregates(conn, subject_id, test_id, aggregates)
+
+    def remove_latest_progress_record(self, subject_name, test_id, resource_id):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            subject_id = self._subject_id(conn, subject_name)
+            if subject_id is None:
+                return None
+
+            row = conn.execute('SELECT seq, data FROM progress_records '
+                               'WHERE subject_id = ? AND test_id = ? AND resource_id = ? '
+                               'ORDER BY seq DESC LIMIT 1', (subject_id, test_id, resource_id)).fetchone()
+            if row is None:
+                return None
+
+            aggregates = self._load_aggregates(conn, subject_id, test_id)
+            conn.execute('DELETE FROM progress_records WHERE seq = ?', (row['seq'],))
+            record = json.loads(row['data'])
+            remove_record_from_aggregates(aggregates, record)
+            self._save_aggregates(conn, subject_id, test_id, aggregates)
+            return record
+
+    def update_progress_records(self, subject_name, test_id, added, removed, expected_version=None):
+        deleted = []
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            subject_id = self._subject_id(conn, subject_name, create=bool(added))
+            self._check_progress_version(conn, subject_id, test_id, expected_version)
+            if subject_id is None:
+                return deleted
+            aggregates = self._load_aggregates(conn, subject_id, test_id)
+
+            for resource_id, count in removed.items():
+                rows = conn.execute('SELECT seq, data FROM progress_records '
+                                    'WHERE subject_id = ? AND test_id = ? AND resource_id = ? '
+                                    'ORDER BY seq DESC LIMIT ?', (subject_id, test_id, resource_id, count)).fetchall()
+                conn.executemany('DELETE FROM progress_records WHERE seq = ?', [(row['seq'],) for row in rows])
+                deleted.extend(json.loads(row['data']) for row in rows)
+
+            conn.executemany(
+                'INSERT INTO progress_records (subject_id, test_id, id, resource_id, topic_name, date, score, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [self._record_row(subject_id, test_id, record) for record in added])
+
+            for record in deleted:
+                remove_record_from_aggregates(aggregates, record)
+            for record in added:
+                add_record_to_aggregates(aggregates, record)
+            self._save_aggregates(conn, subject_id, test_id, aggregates)
+        return deleted
+
+    def load_progress_aggregates(self, subject_name, test_id):
+        conn = self._connect()
+        subject_id = self._subject_id(conn, subject_name)
+        if subject_id is None:
+            return empty_progress_aggregates()
+
+        row = conn.execute('SELECT data FROM progress_aggregates WHERE subject_id = ? AND test_id = ?',
+                           (subject_id, test_id)).fetchone()
+        if row is not None:
+            return json.loads(row['data'])
+
+        with conn:
+            # Build under the write lock so records added meanwhile aren't left out of the saved totals
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT data FROM progress_aggregates WHERE subject_id = ? AND test_id = ?',
+                               (subject_id, test_id)).fetchone()
+            if row is not None:
+                return json.loads(row['data'])
+            aggregates = self._build_aggregates(conn, subject_id, test_id)
+            self._save_aggregates(conn, subject_id, test_id, aggregates)
+        return aggregates
+
+    def _load_aggregates(self, conn, subject_id, test_id):
+        """Read a test's aggregates for an update; call inside a BEGIN IMMEDIATE transaction"""
+        row = conn.execute('SELECT data FROM progress_aggregates WHERE subject_id = ? AND test_id = ?',
+                           (subject_id, test_id)).fetchone()
+        if row is not None:
+            return json.loads(row['data'])
+        return self._build_aggregates(conn, subject_id, test_id)
+
+    @staticmethod
+    def _save_aggregates(conn, subject_id, test_id, aggregates):
+        """Store a test's aggregates, moving its progress version on"""
+        conn.execute("INSERT INTO progress_aggregates (subject_id, test_id, data) "
+                     "VALUES (?, ?, json_set(?, '$.version', 1)) "
+                     "ON CONFLICT(subject_id, test_id) DO UPDATE SET data = json_set(excluded.data, '$.version', "
+                     "COALESCE(json_extract(progress_aggregates.data, '$.version'), 0) + 1)",
+                     (subject_id, test_id, json.dumps(aggregates)))
+
+    @staticmethod
+    def _build_aggregates(conn, subject_id, test_id):
+        """Compute a test's aggregates from its records with GROUP BY queries"""
+        aggregates = empty_progress_aggregates()
+        where = 'WHERE subject_id = ? AND test_id = ?'
+        params = (subject_id, test_id)
+
+        for field, key in (('resource_id', 'by_resource'), ('date', 'by_date'), ('topic_name', 'by_topic')):
+            rows = conn.execute(f'SELECT {field}, COUNT(*) FROM progress_records {where} AND {field} IS NOT NULL '
+                                f'GROUP BY {field} ORDER BY MIN(seq)', params).fetchall()
+            aggregates[key] = {row[0]: row[1] for row in rows}
+
+        for row in conn.execute(f"SELECT resource_id, id, json_extract(data, '$.score') FROM progress_records "
+                                f"{where} AND resource_id IS NOT NULL AND json_type(data, '$.score') IS NOT NULL "
+                                f"ORDER BY seq", params):
+            aggregates['scores'].setdefault(row[0], []).append([row[1], row[2]])
+
+        totals = conn.execute(f"SELECT COUNT(*), SUM(score), COUNT(score), "
+                              f"SUM(json_extract(data, '$.study_duration')) FROM progress_records {where}",
+                              params).fetchone()
+        aggregates['total'] = totals[0]
+        aggregates['score_sum'] = float(totals[1] or 0)
+        aggregates['score_count'] = totals[2]
+        aggregates['study_minutes'] = float(totals[3] or 0)
+        return aggregates
+
+    # ----- Documents -----
+
+    def bump_data_version(self):
+        # One statement, so concurrent writers can't both read the same version
+        with self._connect() as conn:
+            conn.execute("INSERT INTO documents (name, data) VALUES (?, json_object('version', 1)) "
+                         "ON CONFLICT(name) DO UPDATE SET "
+                         "data = json_set(data, '$.version', json_extract(data, '$.version') + 1)",
+                         (DATA_VERSION_DOCUMENT,))
+        return self.load_data_version()
+
+    def load_document(self, name):
+        row = self._connect().execute('SELECT data FROM documents WHERE name = ?', (name,)).fetchone()
+        return json.loads(row['data']) if row is not None else None
+
+    def save_document(self, name, data, expected_version=None):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT json_extract(data, '$.version') FROM documents WHERE name = ?",
+                               (name,)).fetchone()
+            version = (row[0] or 0) if row is not None else 0
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"{name} is at version {version}, not {expected_version}")
+            data['version'] = version + 1
+            conn.execute('INSERT OR REPLACE INTO documents (name, data) VALUES (?, ?)', (name, json.dumps(data)))
+
+    def delete_document(self, name):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM documents WHERE name = ?', (name,))
+
+
+def migrate_storage(source, target):
+    """
+    Copy every listed subject, its details and the progress records of its
+    tests from one storage backend into another. Returns counts of what was copied.
+    """
+    copied = {'subjects': 0, 'tests': 0, 'records': 0}
+
+    subjects = source.load_subjects() or []
+    target.save_subjects(subjects)
+
+    for subject_name in subjects:
+        details = source.load_subject_details(subject_name)
+        if details is None:
+            continue
+
+        target.save_subject_details(subject_name, details)
+        copied['subjects'] += 1
+
+        for test in details.get('tests', []):
+            if isinstance(test, dict) and 'id' in test:
+                progress_data = source.load_progress_records(subject_name, test['id'])
+                target.save_progress_records(subject_name, test['id'], progress_data)
+                copied['tests'] += 1
+                copied['records'] += len(progress_data.get('records', []))
+
+    return copied
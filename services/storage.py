@@ -0,0 +1,679 @@
+import json
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+
+from services import file_service
+from services.test_service import (add_record_to_aggregates, build_progress_aggregates, empty_progress_aggregates,
+                                   remove_record_from_aggregates)
+
+# Bookkeeping document holding the data version (see Storage.load_data_version)
+DATA_VERSION_DOCUMENT = 'data_version'
+
+# How many times update_document re-applies a change that lost a compare-and-swap
+DOCUMENT_RETRIES = 5
+
+
+class VersionConflict(Exception):
+    """A compare-and-swap save found the document at another version than the caller loaded"""
+
+
+class SubjectExists(Exception):
+    """A subject was renamed to a name that already has stored details or progress"""
+
+
+def document_version(document):
+    """
+    Return the version of subject details or progress records as loaded (0 if they
+    have never been saved). Every save moves it on by one.
+    """
+    return document.get('version', 0) if isinstance(document, dict) else 0
+
+
+class Storage:
+    """
+    Interface for the persistence layer behind the data model functions in app.py.
+    Subject details and progress records are plain dicts shaped like the JSON files.
+    """
+
+    def has_subjects(self):
+        """Return True once a subject list has been stored"""
+        raise NotImplementedError
+
+    def load_subjects(self):
+        """Return the subject list, or None if it has never been stored"""
+        raise NotImplementedError
+
+    def save_subjects(self, subjects):
+        raise NotImplementedError
+
+    def has_subject_details(self, subject_name):
+        raise NotImplementedError
+
+    def load_subject_details(self, subject_name):
+        """Return the details dict for a subject, or None if there isn't a usable one"""
+        raise NotImplementedError
+
+    def save_subject_details(self, subject_name, details, expected_version=None):
+        """
+        Save a subject's details and set details['version'] to their new version. With
+        expected_version, only save if the stored details are still at that version
+        and raise VersionConflict otherwise.
+        """
+        raise NotImplementedError
+
+    def rename_subject(self, old_name, new_name):
+        """
+        Move a subject's details and progress records to a new name. Raises
+        SubjectExists rather than replace data already stored under the new name.
+        """
+        raise NotImplementedError
+
+    def delete_subject(self, subject_name):
+        """Remove a subject's details and progress records"""
+        raise NotImplementedError
+
+    def load_progress_records(self, subject_name, test_id):
+        """Return {"records": [...], "version": n} for a test"""
+        raise NotImplementedError
+
+    def save_progress_records(self, subject_name, test_id, progress_data, expected_version=None):
+        """Replace a test's records; versioned like save_subject_details"""
+        raise NotImplementedError
+
+    def append_progress_record(self, subject_name, test_id, record):
+        raise NotImplementedError
+
+    def delete_progress_record(self, subject_name, test_id, record):
+        raise NotImplementedError
+
+    def remove_latest_progress_record(self, subject_name, test_id, resource_id):
+        """Remove the newest record for a resource and return it, or None if there is none"""
+        raise NotImplementedError
+
+    def update_progress_records(self, subject_name, test_id, added, removed, expected_version=None):
+        """
+        Apply a batch of changes to a test's records in one write: remove the newest
+        removed[resource_id] records of each resource, then append the added records.
+        Returns the records that were removed. With expected_version, raise
+        VersionConflict instead if the records have moved on since.
+        """
+        raise NotImplementedError
+
+    def load_progress_aggregates(self, subject_name, test_id):
+        """
+        Return the running totals kept beside a test's records (see test_service).
+        Their 'version' is the version of the test's progress records.
+        """
+        raise NotImplementedError
+
+    def load_document(self, name):
+        """Return a stored bookkeeping document (indexes and the like), or None if missing"""
+        raise NotImplementedError
+
+    def save_document(self, name, data, expected_version=None):
+        """Save a bookkeeping document; versioned like save_subject_details"""
+        raise NotImplementedError
+
+    def delete_document(self, name):
+        """Remove a bookkeeping document; its owner builds it again when it is next needed"""
+        raise NotImplementedError
+
+    def update_document(self, name, change):
+        """
+        Apply change(document) to a stored document and save the result with a
+        compare-and-swap, loading it again and re-applying the change if another
+        save got in first. change gets None for a missing document and returns the
+        document to save, or None to leave it as it is. Returns the document as stored.
+        """
+        for attempt in range(DOCUMENT_RETRIES):
+            document = self.load_document(name)
+            updated = change(document)
+            if updated is None:
+                return document
+            try:
+                self.save_document(name, updated, expected_version=document_version(document))
+            except VersionConflict:
+                continue
+            return updated
+
+        raise VersionConflict(f"Gave up updating {name} after {DOCUMENT_RETRIES} conflicting saves")
+
+    def load_data_version(self):
+        """Return a number that goes up every time the study data changes (0 if it never has)"""
+        document = self.load_document(DATA_VERSION_DOCUMENT)
+        return document['version'] if document else 0
+
+    def bump_data_version(self):
+        """Move the data version on after a change; returns the new version"""
+        # Every save of a document moves its version on by one
+        document = {}
+        self.save_document(DATA_VERSION_DOCUMENT, document)
+        return document['version']
+
+    def close(self):
+        pass
+
+
+def safe_subject_name(subject_name):
+    """Turn a subject name into something usable in a file name"""
+    return re.sub(r'[^\w]', '_', subject_name)
+
+
+class JsonStorage(Storage):
+    """
+    JSON files, one directory per subject:
+
+        <data_dir>/subject_ids.json             subject name -> subject id
+        <data_dir>/<subject id>/details.json
+        <data_dir>/<subject id>/progress/<test id>.json            records (last compaction)
+        <data_dir>/<subject id>/progress/<test id>.jsonl           append-only log since then
+        <data_dir>/<subject id>/progress/<test id>_aggregates.json running totals
+
+    Directories are named by a stable id rather than the display name, so renaming a
+    subject only updates subject_ids.json and deleting one removes a single directory.
+    Subjects still stored in the old flat details_dir/progress_dir layout are moved
+    over the first time they are touched; progress files none of their tests claim
+    are put aside in progress_dir/legacy.
+
+    Files are replaced atomically, and every read-modify-write cycle (the subject id
+    registry, a test's progress files, the data version) holds a file_service.file_lock,
+    so several worker processes can share one data directory.
+    """
+
+    def __init__(self, subjects_file, details_dir, progress_dir, meta_dir, data_dir,
+                 log_compact_bytes=256 * 1024, json_cache_size=file_service.JSON_CACHE_SIZE):
+        self.subjects_file = subjects_file
+        self.details_dir = details_dir
+        self.progress_dir = progress_dir
+        self.meta_dir = meta_dir
+        self.data_dir = data_dir
+        # Fold a test's progress log back into its records file once it grows past this size
+        self.log_compact_bytes = log_compact_bytes
+        # Parsed documents are cached per backend, so each app sizes its own cache
+        self.files = file_service.JsonFiles(json_cache_size)
+
+    # ----- Subject directories -----
+
+    def get_subject_ids_file(self):
+        return os.path.join(self.data_dir, 'subject_ids.json')
+
+    def load_subject_ids(self):
+        """Return the subject name -> subject id mapping"""
+        file_path = self.get_subject_ids_file()
+        if os.path.exists(file_path):
+            return self.files.read_json(file_path)
+        return {}
+
+    def save_subject_ids(self, subject_ids):
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.files.write_json(self.get_subject_ids_file(), subject_ids)
+
+    def subject_ids_lock(self):
+        """Lock the subject id registry for a read-modify-write cycle"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        return file_service.file_lock(self.get_subject_ids_file())
+
+    def get_subject_dir(self, subject_name, create=False):
+        """
+        Get the directory holding a subject's files, or None if the subject has
+        nothing stored yet (and create is False).
+        """
+        subject_id = self.load_subject_ids().get(subject_name)
+        if subject_id is not None:
+            return os.path.join(self.data_dir, subject_id)
+
+        has_legacy_files = os.path.exists(self.get_legacy_details_file(subject_name))
+        if not create and not has_legacy_files:
+            return None
+
+        with self.subject_ids_lock():
+            # Another worker may have registered the subject while we waited
+            subject_ids = self.load_subject_ids()
+            subject_id = subject_ids.get(subject_name)
+            if subject_id is not None:
+                return os.path.join(self.data_dir, subject_id)
+
+            subject_id = str(uuid.uuid4())
+            subject_dir = os.path.join(self.data_dir, subject_id)
+            os.makedirs(os.path.join(subject_dir, 'progress'), exist_ok=True)
+
+            if os.path.exists(self.get_legacy_details_file(subject_name)):
+                self.adopt_legacy_files(subject_name, subject_dir)
+
+            subject_ids[subject_name] = subject_id
+            self.save_subject_ids(subject_ids)
+            return subject_dir
+
+    # ----- Paths -----
+
+    def get_subject_details_file(self, subject_name, create=False):
+        """Get the path to the subject details JSON file"""
+        subject_dir = self.get_subject_dir(subject_name, create)
+        return subject_dir and os.path.join(subject_dir, 'details.json')
+
+    def get_progress_records_file(self, subject_name, test_id, create=False):
+        """Get the path to the progress records JSON file for a specific test"""
+        subject_dir = self.get_subject_dir(subject_name, create)
+        return subject_dir and os.path.join(subject_dir, 'progress', f"{test_id}.json")
+
+    def get_progress_log_file(self, subject_name, test_id, create=False):
+        """Get the path to the append-only progress log for a specific test"""
+        subject_dir = self.get_subject_dir(subject_name, create)
+        return subject_dir and os.path.join(subject_dir, 'progress', f"{test_id}.jsonl")
+
+    def get_progress_aggregates_file(self, subject_name, test_id, create=False):
+        """Get the path to the running totals kept beside a test's progress records"""
+        subject_dir = self.get_subject_dir(subject_name, create)
+        return subject_dir and os.path.join(subject_dir, 'progress', f"{test_id}_aggregates.json")
+
+    @contextmanager
+    def progress_lock(self, subject_name, test_id):
+        """Lock a test's records, log and aggregates files for a read-modify-write cycle"""
+        file_path = self.get_progress_records_file(subject_name, test_id, create=True)
+        with file_service.file_lock(file_path):
+            # Re-read them rather than trust the cache: two saves can share an mtime and size
+            for path in (file_path, self.get_progress_log_file(subject_name, test_id),
+                         self.get_progress_aggregates_file(subject_name, test_id)):
+                self.files.invalidate(path)
+            yield
+
+    def get_document_file(self, name):
+        """Get the path to a bookkeeping document"""
+        return os.path.join(self.meta_dir, f"{name}.json")
+
+    # ----- Old flat layout -----
+
+    def get_legacy_details_file(self, subject_name):
+        return os.path.join(self.details_dir, f"{safe_subject_name(subject_name)}.json")
+
+    def adopt_legacy_files(self, subject_name, subject_dir):
+        """Move a subject's files from the flat layout into its directory"""
+        legacy_details = self.get_legacy_details_file(subject_name)
+        try:
+            details = self.files.read_json(legacy_details)
+        except (json.JSONDecodeError, IOError):
+            details = {}
+
+        # Only the files of this subject's own tests; a prefix match on the safe
+        # name could also pick up another subject's files
+        safe_name = safe_subject_name(subject_name)
+        tests = details.get('tests', []) if isinstance(details, dict) else []
+        for test in tests:
+            if not isinstance(test, dict) or 'id' not in test:
+                continue
+
+            test_id = test['id']
+            moves = [(f"{safe_name}_{test_id}_progress.json", f"{test_id}.json"),
+                     (f"{safe_name}_{test_id}_progress.jsonl", f"{test_id}.jsonl"),
+                     (f"{safe_name}_{test_id}_aggregates.json", f"{test_id}_aggregates.json")]
+            for old_name, new_name in moves:
+                old_path = os.path.join(self.progress_dir, old_name)
+                if os.path.exists(old_path):
+                    os.replace(old_path, os.path.join(subject_dir, 'progress', new_name))
+                    self.files.invalidate(old_path)
+
+        os.replace(legacy_details, os.path.join(subject_dir, 'details.json'))
+        self.files.invalidate(legacy_details)
+
+        # Once no details are left in the flat layout, the progress files still there belong to no test
+        if not any(name.endswith('.json') for name in os.listdir(self.details_dir)):
+            self.set_aside_legacy_progress()
+
+    def set_aside_legacy_progress(self):
+        """Move progress files no subject claimed out of the flat layout, into progress_dir/legacy"""
+        if not os.path.isdir(self.progress_dir):
+            return
+
+        legacy_dir = os.path.join(self.progress_dir, 'legacy')
+        for name in sorted(os.listdir(self.progress_dir)):
+            old_path = os.path.join(self.progress_dir, name)
+            if not name.endswith(('.json', '.jsonl')) or not os.path.isfile(old_path):
+                continue
+            os.makedirs(legacy_dir, exist_ok=True)
+            os.replace(old_path, os.path.join(legacy_dir, name))
+            self.files.invalidate(old_path)
+            print(f"Moved progress file {name}, which no subject's tests claim, to {legacy_dir}")
+
+    # ----- Subjects -----
+
+    def has_subjects(self):
+        return os.path.exists(self.subjects_file)
+
+    def load_subjects(self):
+        if not os.path.exists(self.subjects_file):
+            return None
+        return self.files.read_json(self.subjects_file)
+
+    def save_subjects(self, subjects):
+        self.files.write_json(self.subjects_file, subjects)
+
+    def has_subject_details(self, subject_name):
+        file_path = self.get_subject_details_file(subject_name)
+        return file_path is not None and os.path.exists(file_path)
+
+    def load_subject_details(self, subject_name):
+        file_path = self.get_subject_details_file(subject_name)
+
+        if file_path is not None and os.path.exists(file_path):
+            try:
+                return self.files.read_json(file_path)
+            except (json.JSONDecodeError, IOError):
+                # Treat a corrupted file like a missing one
+                return None
+        return None
+
+    def save_subject_details(self, subject_name, details, expected_version=None):
+        file_path = self.get_subject_details_file(subject_name, create=True)
+        with file_service.file_lock(file_path):
+            # Re-read rather than trust the cache: two saves can share an mtime and size
+            self.files.invalidate(file_path)
+            version = document_version(self.load_subject_details(subject_name))
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"{subject_name} is at version {version}, not {expected_version}")
+
+            details['version'] = version + 1
+            self.files.write_json(file_path, details)
+
+    def rename_subject(self, old_name, new_name):
+        with self.subject_ids_lock():
+            # Make sure the subject has a directory (moving it out of the flat layout if needed)
+            if self.get_subject_dir(old_name) is None:
+                return
+            new_dir = self.get_subject_dir(new_name)
+            if new_dir is not None and os.path.exists(new_dir):
+                raise SubjectExists(f'Data for "{new_name}" is already stored')
+
+            subject_ids = self.load_subject_ids()
+            subject_ids[new_name] = subject_ids.pop(old_name)
+            self.save_subject_ids(subject_ids)
+
+    def delete_subject(self, subject_name):
+        with self.subject_ids_lock():
+            subject_dir = self.get_subject_dir(subject_name)
+            if subject_dir is None:
+                return
+
+            subject_ids = self.load_subject_ids()
+            self.remove_subject_dir(subject_ids.pop(subject_name))
+            self.save_subject_ids(subject_ids)
+
+    def remove_subject_dir(self, subject_id):
+        subject_dir = os.path.join(self.data_dir, subject_id)
+        shutil.rmtree(subject_dir, ignore_errors=True)
+        self.files.invalidate_dir(subject_dir)
+
+    # ----- Progress records -----
+
+    def load_progress_records(self, subject_name, test_id):
+        """
+        The records file holds the last compacted state; any entries in the
+        progress log since then are replayed on top of it.
+        """
+        file_path = self.get_progress_records_file(subject_name, test_id)
+        if file_path is None:
+            return {"records": []}
+
+        # Shared, so a compaction can't swap the files between reading the records and the log
+        with file_service.file_lock(file_path, shared=True):
+            progress_data = self.read_progress_files(file_path, self.get_progress_log_file(subject_name, test_id))
+            version = self.read_progress_version(subject_name, test_id)
+            if version is not None:
+                progress_data['version'] = version
+        return progress_data
+
+    def read_progress_files(self, file_path, log_path):
+        """
+        Merge a records file and its log. The version is worked out from them too,
+        for when the aggregates are lost: every change since the records file was
+        written added at least one log entry, so it is never below the real one.
+        """
+        if os.path.exists(file_path):
+            try:
+                progress_data = self.files.read_json(file_path)
+            except (json.JSONDecodeError, IOError):
+                # Start from an empty structure if file is corrupted
+                progress_data = {"records": []}
+        else:
+            # Start from an empty structure if file doesn't exist
+            progress_data = {"records": []}
+
+        if os.path.exists(log_path):
+            try:
+                log_entries = self.files.read_json_lines(log_path)
+            except IOError:
+                log_entries = []
+
+            records = progress_data.get('records', [])
+            deleted_ids = set()
+            for entry in log_entries:
+                if entry.get('op') == 'add':
+                    records.append(entry['record'])
+                elif entry.get('op') == 'delete':
+                    deleted_ids.add(entry.get('id'))
+
+            if deleted_ids:
+                records = [r for r in records if r.get('id') not in deleted_ids]
+            progress_data['records'] = records
+            progress_data['version'] = document_version(progress_data) + len(log_entries)
+
+        return progress_data
+
+    def save_progress_records(self, subject_name, test_id, progress_data, expected_version=None):
+        """Rewrite the records file, replacing any pending log"""
+        with self.progress_lock(subject_name, test_id):
+            version = self.check_progress_version(subject_name, test_id, expected_version)
+            file_path = self.get_progress_records_file(subject_name, test_id, create=True)
+            log_path = self.get_progress_log_file(subject_name, test_id)
+
+            # The aggregates hold the current version; the records file keeps the one it was written at
+            progress_data['version'] = version + 1
+            self.files.write_json(file_path, progress_data)
+
+            # Everything in the log is now part of the records file
+            if os.path.exists(log_path):
+                os.remove(log_path)
+                self.files.invalidate(log_path)
+
+            aggregates = build_progress_aggregates(progress_data.get('records', []))
+            aggregates['version'] = version + 1
+            self.files.write_json(self.get_progress_aggregates_file(subject_name, test_id), aggregates)
+
+    def append_progress_record(self, subject_name, test_id, record):
+        with self.progress_lock(subject_name, test_id):
+            aggregates = self.load_progress_aggregates(subject_name, test_id)
+
+            log_path = self.get_progress_log_file(subject_name, test_id, create=True)
+            self.files.append_json_line(log_path, {'op': 'add', 'record': record})
+
+            add_record_to_aggregates(aggregates, record)
+            aggregates['version'] = document_version(aggregates) + 1
+            self.files.write_json(self.get_progress_aggregates_file(subject_name, test_id), aggregates)
+
+            self.compact_progress_log(subject_name, test_id)
+
+    def delete_progress_record(self, subject_name, test_id, record):
+        with self.progress_lock(subject_name, test_id):
+            aggregates = self.load_progress_aggregates(subject_name, test_id)
+
+            log_path = self.get_progress_log_file(subject_name, test_id, create=True)
+            self.files.append_json_line(log_path, {'op': 'delete', 'id': record['id']})
+
+            remove_record_from_aggregates(aggregates, record)
+            aggregates['version'] = document_version(aggregates) + 1
+            self.files.write_json(self.get_progress_aggregates_file(subject_name, test_id), aggregates)
+
+            self.compact_progress_log(subject_name, test_id)
+
+    def remove_latest_progress_record(self, subject_name, test_id, resource_id):
+        with self.progress_lock(subject_name, test_id):
+            progress_data = self.load_progress_records(subject_name, test_id)
+            records = progress_data.get('records', [])
+
+            for i in range(len(records) - 1, -1, -1):
+                if records[i].get('resource_id') == resource_id:
+                    removed = records.pop(i)
+                    if removed.get('id'):
+                        self.delete_progress_record(subject_name, test_id, removed)
+                    else:
+                        # Records without an id can't be tombstoned
+                        self.save_progress_records(subject_name, test_id, progress_data)
+                    return removed
+
+            return None
+
+    def update_progress_records(self, subject_name, test_id, added, removed, expected_version=None):
+        with self.progress_lock(subject_name, test_id):
+            self.check_progress_version(subject_name, test_id, expected_version)
+            aggregates = self.load_progress_aggregates(subject_name, test_id)
+
+            deleted = []
+            if removed:
+                progress_data = self.load_progress_records(subject_name, test_id)
+                records = progress_data.get('records', [])
+                for resource_id, count in removed.items():
+                    for i in range(len(records) - 1, -1, -1):
+                        if count <= 0:
+                            break
+                        if records[i].get('resource_id') == resource_id:
+                            deleted.append(records.pop(i))
+                            count -= 1
+
+                if any(not record.get('id') for record in deleted):
+                    # Records without an id can't be tombstoned
+                    progress_data['records'] = records + list(added)
+                    self.save_progress_records(subject_name, test_id, progress_data)
+                    return deleted
+
+            entries = [{'op': 'delete', 'id': record['id']} for record in deleted]
+            entries += [{'op': 'add', 'record': record} for record in added]
+            if not entries:
+                return deleted
+
+            log_path = self.get_progress_log_file(subject_name, test_id, create=True)
+            self.files.append_json_lines(log_path, entries)
+
+            for record in deleted:
+                remove_record_from_aggregates(aggregates, record)
+            for record in added:
+                add_record_to_aggregates(aggregates, record)
+            aggregates['version'] = document_version(aggregates) + 1
+            self.files.write_json(self.get_progress_aggregates_file(subject_name, test_id), aggregates)
+
+            self.compact_progress_log(subject_name, test_id)
+            return deleted
+
+    def load_progress_version(self, subject_name, test_id):
+        version = self.read_progress_version(subject_name, test_id)
+        if version is None:
+            # The version the aggregates get when they are rebuilt
+            return document_version(self.load_progress_records(subject_name, test_id))
+        return version
+
+    def read_progress_version(self, subject_name, test_id):
+        """The version in a test's aggregates file, or None if it is missing or damaged"""
+        aggregates_path = self.get_progress_aggregates_file(subject_name, test_id)
+        if aggregates_path is None or not os.path.exists(aggregates_path):
+            return None
+        try:
+            return document_version(self.files.read_json(aggregates_path))
+        except (json.JSONDecodeError, IOError):
+            return None
+
+    def check_progress_version(self, subject_name, test_id, expected_version):
+        """
+        Return a test's progress version, raising VersionConflict if it isn't
+        expected_version. Call it with the progress lock held.
+        """
+        version = self.load_progress_version(subject_name, test_id)
+        if expected_version is not None and version != expected_version:
+            raise VersionConflict(f"Progress for test {test_id} is at version {version}, not {expected_version}")
+        return version
+
+    def compact_progress_log(self, subject_name, test_id, force=False):
+        """Fold the progress log into the records file once it has grown large enough"""
+        log_path = self.get_progress_log_file(subject_name, test_id)
+
+        try:
+            log_size = os.path.getsize(log_path)
+        except OSError:
+            return False
+
+        if not force and log_size < self.log_compact_bytes:
+            return False
+
+        with self.progress_lock(subject_name, test_id):
+            self.save_progress_records(subject_name, test_id, self.load_progress_records(subject_name, test_id))
+        return True
+
+    def load_progress_aggregates(self, subject_name, test_id):
+        aggregates_path = self.get_progress_aggregates_file(subject_name, test_id)
+        if aggregates_path is None:
+            return empty_progress_aggregates()
+
+        if os.path.exists(aggregates_path):
+            try:
+                return self.files.read_json(aggregates_path)
+            except (json.JSONDecodeError, IOError):
+                pass
+
+        # Tests recorded before aggregates existed (or with a damaged file) get them built once
+        with self.progress_lock(subject_name, test_id):
+            progress_data = self.load_progress_records(subject_name, test_id)
+            aggregates = build_progress_aggregates(progress_data.get('records', []))
+            aggregates['version'] = document_version(progress_data)
+            if aggregates['total'] > 0 or aggregates['version'] > 0:
+                self.files.write_json(aggregates_path, aggregates)
+        return aggregates
+
+    # ----- Documents -----
+
+    def load_document(self, name):
+        file_path = self.get_document_file(name)
+
+        if os.path.exists(file_path):
+            try:
+                return self.files.read_json(file_path)
+            except (json.JSONDecodeError, IOError):
+                # A damaged document is rebuilt by its owner
+                return None
+        return None
+
+    def save_document(self, name, data, expected_version=None):
+        os.makedirs(self.meta_dir, exist_ok=True)
+        file_path = self.get_document_file(name)
+        with file_service.file_lock(file_path):
+            # Re-read rather than trust the cache, as for subject details
+            self.files.invalidate(file_path)
+            version = document_version(self.load_document(name))
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(f"{name} is at version {version}, not {expected_version}")
+            data['version'] = version + 1
+            self.files.write_json(file_path, data)
+
+    def delete_document(self, name):
+        file_path = self.get_document_file(name)
+        with file_service.file_lock(file_path):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            self.files.invalidate(file_path)
+
+
+def create_storage(config):
+    """Build the storage backend named by config['STORAGE_BACKEND']"""
+    backend = config.get('STORAGE_BACKEND', 'json')
+
+    if backend == 'json':
+        return JsonStorage(config['SUBJECTS_FILE'], config['DETAILS_DIR'], config['PROGRESS_DIR'],
+                           config['META_DIR'], config['SUBJECT_DATA_DIR'],
+                           config.get('PROGRESS_LOG_COMPACT_BYTES', 256 * 1024),
+                           config.get('JSON_CACHE_SIZE', file_service.JSON_CACHE_SIZE))
+    if backend == 'sqlite':
+        from services.sqlite_storage import SqliteStorage
+        return SqliteStorage(config['SQLITE_PATH'])
+
+    raise ValueError(f"Unknown storage backend: {backend}")
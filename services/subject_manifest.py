@@ -0,0 +1,74 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from services.test_service import required_resources
+
+MANIFEST_DOCUMENT = 'subject_manifest'
+
+
+def empty_manifest():
+    """
+    Compact listing of every dated test, so date queries don't need the details files:
+    {"subjects": {subject_name: {test_id: {"name", "date", "ordinal", "required"}}},
+     "by_date": [[date_ordinal, subject_name, test_id], ...]}  (kept sorted)
+    """
+    return {'subjects': {}, 'by_date': []}
+
+
+def manifest_entries(tests):
+    """Map test id -> manifest entry for the tests that have an id and a valid date"""
+    entries = {}
+    for test in tests:
+        if not isinstance(test, dict) or 'id' not in test or 'date' not in test:
+            continue
+
+        try:
+            ordinal = datetime.strptime(test['date'], '%Y-%m-%d').date().toordinal()
+        except (ValueError, TypeError):
+            continue
+
+        entries[test['id']] = {
+            'name': test.get('name'),
+            'date': test['date'],
+            'ordinal': ordinal,
+            'required': required_resources(test)
+        }
+    return entries
+
+
+def set_subject(manifest, subject_name, tests):
+    """Replace a subject's entries with ones built from its tests"""
+    remove_subject(manifest, subject_name)
+
+    entries = manifest_entries(tests)
+    manifest['subjects'][subject_name] = entries
+    for test_id, entry in entries.items():
+        insort(manifest['by_date'], [entry['ordinal'], subject_name, test_id])
+
+
+def remove_subject(manifest, subject_name):
+    if manifest['subjects'].pop(subject_name, None) is not None:
+        manifest['by_date'] = [row for row in manifest['by_date'] if row[1] != subject_name]
+
+
+def rename_subject(manifest, old_name, new_name):
+    entries = manifest['subjects'].pop(old_name, None)
+    if entries is not None:
+        manifest['subjects'][new_name] = entries
+        manifest['by_date'] = sorted([row[0], new_name if row[1] == old_name else row[1], row[2]]
+                                     for row in manifest['by_date'])
+
+
+def tests_between(manifest, start_date, end_date):
+    """
+    Yield (subject_name, test_id, entry) for tests dated start_date..end_date inclusive,
+    in date order (same-day tests by subject name).
+    """
+    rows = manifest['by_date']
+    i = bisect_left(rows, [start_date.toordinal()])
+    end_ordinal = end_date.toordinal()
+
+    while i < len(rows) and rows[i][0] <= end_ordinal:
+        ordinal, subject_name, test_id = rows[i]
+        yield subject_name, test_id, manifest['subjects'][subject_name][test_id]
+        i += 1
@@ -0,0 +1,107 @@
+def empty_progress_aggregates():
+    """
+    Running totals over a test's progress records:
+    total records, counts per resource_id / date / topic_name,
+    [record_id, score] pairs per resource, score sum/count and study minutes.
+    """
+    return {
+        'total': 0,
+        'by_resource': {},
+        'by_date': {},
+        'by_topic': {},
+        'scores': {},
+        'score_sum': 0.0,
+        'score_count': 0,
+        'study_minutes': 0.0
+    }
+
+
+def _bump(counts, key, change):
+    if key is None:
+        return
+    counts[key] = counts.get(key, 0) + change
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def add_record_to_aggregates(aggregates, record):
+    """Count one new progress record"""
+    aggregates['total'] += 1
+    _bump(aggregates['by_resource'], record.get('resource_id'), 1)
+    _bump(aggregates['by_date'], record.get('date'), 1)
+    _bump(aggregates['by_topic'], record.get('topic_name'), 1)
+
+    if 'score' in record and record.get('resource_id') is not None:
+        aggregates['scores'].setdefault(record['resource_id'], []).append([record.get('id'), record['score']])
+
+    if _is_number(record.get('score')):
+        aggregates['score_sum'] += record['score']
+        aggregates['score_count'] += 1
+
+    if _is_number(record.get('study_duration')):
+        aggregates['study_minutes'] += record['study_duration']
+
+
+def remove_record_from_aggregates(aggregates, record):
+    """Uncount a progress record that has been deleted"""
+    aggregates['total'] = max(aggregates['total'] - 1, 0)
+    _bump(aggregates['by_resource'], record.get('resource_id'), -1)
+    _bump(aggregates['by_date'], record.get('date'), -1)
+    _bump(aggregates['by_topic'], record.get('topic_name'), -1)
+
+    resource_scores = aggregates['scores'].get(record.get('resource_id'))
+    if 'score' in record and resource_scores:
+        for i in range(len(resource_scores) - 1, -1, -1):
+            if resource_scores[i][0] == record.get('id'):
+                del resource_scores[i]
+                break
+        if not resource_scores:
+            del aggregates['scores'][record['resource_id']]
+
+    if _is_number(record.get('score')):
+        aggregates['score_sum'] -= record['score']
+        aggregates['score_count'] = max(aggregates['score_count'] - 1, 0)
+
+    if _is_number(record.get('study_duration')):
+        aggregates['study_minutes'] -= record['study_duration']
+
+
+def build_progress_aggregates(records):
+    """Compute the aggregates for a full list of progress records"""
+    aggregates = empty_progress_aggregates()
+    for record in records:
+        add_record_to_aggregates(aggregates, record)
+    return aggregates
+
+
+def resource_scores(aggregates, resource_id):
+    """Return the scores recorded for a resource, oldest first"""
+    return [score for _, score in aggregates['scores'].get(resource_id, [])]
+
+
+def required_resources(test):
+    """Count how many resource completions a test needs in total"""
+    total_required = 0
+
+    # Check if topics is a list of dictionaries or a string
+    if isinstance(test.get('topics', []), list):
+        for topic in test.get('topics', []):
+            # Make sure topic is a dictionary with resources
+            if isinstance(topic, dict) and 'resources' in topic:
+                for resource in topic.get('resources', []):
+                    total_required += resource.get('count', 1)
+
+    return total_required
+
+
+def progress_percentage(completed, total_required):
+    """Percentage of required completions done, rounded to one decimal place"""
+    if total_required > 0:
+        percentage = (completed / total_required) * 100
+        return round(percentage, 1)
+    else:
+        return 0
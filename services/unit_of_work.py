@@ -0,0 +1,247 @@
+import pickle
+
+from services.storage import Storage, VersionConflict, document_version
+from services.test_service import add_record_to_aggregates, remove_record_from_aggregates
+
+
+class UnitOfWork(Storage):
+    """
+    Request-scoped cache in front of a storage backend.
+
+    Each item is loaded from the backend at most once and the same object is
+    handed to every caller for the rest of the request. Everything the request
+    decides - the subject list, subject details, progress records - is written
+    straight through to the backend, so a failed compare-and-swap reaches the
+    caller before anything else happens, and the cached copies are updated to match.
+
+    Only the bookkeeping documents derived from that data (dashboard, manifest,
+    indexes) are held back: changes made with update_document are applied to the
+    request's copy straight away and replayed on the stored document by flush(),
+    so they merge with other requests' changes. That is best effort: a document
+    that can't be updated is deleted so it is rebuilt when next read.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        # key -> loaded (or saved) data
+        self._loaded = {}
+        # ('document', name) -> pickled snapshot taken at save time, in save order
+        self._dirty = {}
+        # document name -> version it was loaded at
+        self._document_versions = {}
+        # document name -> changes passed to update_document, in order
+        self._document_changes = {}
+
+    def _get(self, key, loader):
+        if key not in self._loaded:
+            self._loaded[key] = loader()
+        return self._loaded[key]
+
+    def _put(self, key, data):
+        self._loaded[key] = data
+        self._dirty.pop(key, None)
+        self._dirty[key] = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+    def flush(self):
+        """
+        Write the documents saved or changed during the request. Returns
+        [(document name, error)] for those that couldn't be written; they are
+        deleted instead, so they get rebuilt from the stored data.
+        """
+        failed = []
+        while self._dirty:
+            key = next(iter(self._dirty))
+            data = pickle.loads(self._dirty.pop(key))
+            name = key[1]
+            try:
+                self.backend.save_document(name, data, expected_version=self._document_versions.get(name))
+                self._document_versions[name] = data['version']
+            except Exception as e:
+                failed.append((name, e))
+
+        while self._document_changes:
+            name = next(iter(self._document_changes))
+            changes = self._document_changes.pop(name)
+            try:
+                document = self.backend.update_document(name, lambda document: _replay(changes, document))
+            except Exception as e:
+                failed.append((name, e))
+                continue
+            self._loaded[('document', name)] = document
+            self._document_versions[name] = document_version(document)
+
+        for name, error in failed:
+            self._loaded.pop(('document', name), None)
+            self._document_versions.pop(name, None)
+            try:
+                self.backend.delete_document(name)
+            except Exception as e:
+                failed.append((name, e))
+        return failed
+
+    def discard(self):
+        """Forget everything loaded or saved during the request"""
+        self._loaded.clear()
+        self._dirty.clear()
+        self._document_versions.clear()
+        self._document_changes.clear()
+
+    # ----- Subjects -----
+
+    def has_subjects(self):
+        return self.backend.has_subjects()
+
+    def load_subjects(self):
+        return self._get(('subjects',), self.backend.load_subjects)
+
+    def save_subjects(self, subjects):
+        self.backend.save_subjects(subjects)
+        self._loaded[('subjects',)] = subjects
+
+    def has_subject_details(self, subject_name):
+        return self.backend.has_subject_details(subject_name)
+
+    def load_subject_details(self, subject_name):
+        return self._get(('details', subject_name), lambda: self.backend.load_subject_details(subject_name))
+
+    def save_subject_details(self, subject_name, details, expected_version=None):
+        key = ('details', subject_name)
+        try:
+            self.backend.save_subject_details(subject_name, details, expected_version)
+        except VersionConflict:
+            # Load the current details next time
+            self._loaded.pop(key, None)
+            raise
+        self._loaded[key] = details
+        self._dirty.pop(key, None)
+
+    def rename_subject(self, old_name, new_name):
+        self.backend.rename_subject(old_name, new_name)
+        self._forget_subject(old_name)
+        self._forget_subject(new_name)
+
+    def delete_subject(self, subject_name):
+        self.backend.delete_subject(subject_name)
+        self._forget_subject(subject_name)
+
+    def _forget_subject(self, subject_name):
+        for key in [k for k in self._loaded if k[0] != 'document' and k[1:2] == (subject_name,)]:
+            del self._loaded[key]
+
+    # ----- Progress records -----
+
+    def load_progress_records(self, subject_name, test_id):
+        return self._get(('records', subject_name, test_id),
+                         lambda: self.backend.load_progress_records(subject_name, test_id))
+
+    def save_progress_records(self, subject_name, test_id, progress_data, expected_version=None):
+        try:
+            self.backend.save_progress_records(subject_name, test_id, progress_data, expected_version)
+        except VersionConflict:
+            self._forget_progress(subject_name, test_id)
+            raise
+        self._loaded[('records', subject_name, test_id)] = progress_data
+        self._loaded.pop(('aggregates', subject_name, test_id), None)
+
+    def append_progress_record(self, subject_name, test_id, record):
+        self.backend.append_progress_record(subject_name, test_id, record)
+
+        records = self._loaded.get(('records', subject_name, test_id))
+        if records is not None:
+            records.setdefault('records', []).append(record)
+        aggregates = self._loaded.get(('aggregates', subject_name, test_id))
+        if aggregates is not None:
+            add_record_to_aggregates(aggregates, record)
+
+    def delete_progress_record(self, subject_name, test_id, record):
+        self.backend.delete_progress_record(subject_name, test_id, record)
+        self._forget_progress_record(subject_name, test_id, record)
+
+    def remove_latest_progress_record(self, subject_name, test_id, resource_id):
+        removed = self.backend.remove_latest_progress_record(subject_name, test_id, resource_id)
+        if removed is not None:
+            self._forget_progress_record(subject_name, test_id, removed)
+        return removed
+
+    def update_progress_records(self, subject_name, test_id, added, removed, expected_version=None):
+        try:
+            deleted = self.backend.update_progress_records(subject_name, test_id, added, removed, expected_version)
+        except VersionConflict:
+            self._forget_progress(subject_name, test_id)
+            raise
+        for record in deleted:
+            self._forget_progress_record(subject_name, test_id, record)
+
+        records = self._loaded.get(('records', subject_name, test_id))
+        if records is not None:
+            records.setdefault('records', []).extend(added)
+        aggregates = self._loaded.get(('aggregates', subject_name, test_id))
+        if aggregates is not None:
+            for record in added:
+                add_record_to_aggregates(aggregates, record)
+        return deleted
+
+    def _forget_progress(self, subject_name, test_id):
+        self._loaded.pop(('records', subject_name, test_id), None)
+        self._loaded.pop(('aggregates', subject_name, test_id), None)
+
+    def _forget_progress_record(self, subject_name, test_id, record):
+        records = self._loaded.get(('records', subject_name, test_id))
+        if records is not None:
+            if record.get('id'):
+                records['records'] = [r for r in records.get('records', []) if r.get('id') != record['id']]
+            else:
+                del self._loaded[('records', subject_name, test_id)]
+
+        aggregates = self._loaded.get(('aggregates', subject_name, test_id))
+        if aggregates is not None:
+            remove_record_from_aggregates(aggregates, record)
+
+    def load_progress_aggregates(self, subject_name, test_id):
+        return self._get(('aggregates', subject_name, test_id),
+                         lambda: self.backend.load_progress_aggregates(subject_name, test_id))
+
+    # ----- Documents -----
+
+    def load_data_version(self):
+        # Always current: the version is how other requests notice changes
+        return self.backend.load_data_version()
+
+    def bump_data_version(self):
+        return self.backend.bump_data_version()
+
+    def load_document(self, name):
+        key = ('document', name)
+        if key not in self._loaded:
+            document = self._loaded[key] = self.backend.load_document(name)
+            self._document_versions[name] = document_version(document)
+        return self._loaded[key]
+
+    def save_document(self, name, data):
+        self._put(('document', name), data)
+
+    def update_document(self, name, change):
+        document = change(self.load_document(name))
+        if document is not None:
+            self._loaded[('document', name)] = document
+        self._document_changes.setdefault(name, []).append(change)
+        return self._loaded[('document', name)]
+
+    def delete_document(self, name):
+        # Straight through: changes queued before it would only bring the document back
+        self.backend.delete_document(name)
+        self._loaded[('document', name)] = None
+        self._dirty.pop(('document', name), None)
+        self._document_changes.pop(name, None)
+        self._document_versions[name] = 0
+
+
+def _replay(changes, document):
+    """Apply a request's update_document changes in turn; None if none of them changed anything"""
+    changed = False
+    for change in changes:
+        updated = change(document)
+        if updated is not None:
+            document = updated
+            changed = True
+    return document if changed else None
@@ -0,0 +1,44 @@
+import pytest
+
+from app import create_app, get_backend
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app on a fresh data directory, with the background threads off and email suppressed"""
+    apps = []
+
+    def make(**config):
+        app = create_app({'DATA_DIR': str(tmp_path / 'data'), 'MAIL_SUPPRESS_SEND': True,
+                          'REMINDER_SCHEDULER_ENABLED': False, **config})
+        apps.append(app)
+        return app
+
+    yield make
+
+    for app in apps:
+        with app.app_context():
+            get_backend().close()
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def app(request, make_app):
+    """An app on each storage backend"""
+    return make_app(STORAGE_BACKEND=request.param)
+
+
+@pytest.fixture
+def study_data(app):
+    """One subject with one test, one topic and two resources (count 3) and no progress; returns their ids"""
+    with app.app_context():
+        backend = get_backend()
+        backend.save_subjects(['Maths'])
+        backend.save_subject_details('Maths', {'resources': [], 'study_materials': [], 'tests': [{
+            'id': 'test-1', 'name': 'Algebra', 'date': '2030-01-01', 'topics': [{
+                'id': 'topic-1', 'name': 'Equations', 'resources': [
+                    {'id': 'resource-1', 'name': 'Worksheet', 'count': 3, 'completed': 0, 'scores': []},
+                    {'id': 'resource-2', 'name': 'Past paper', 'count': 3, 'completed': 0, 'scores': []}
+                ]
+            }]
+        }]})
+    return {'subject': 'Maths', 'test': 'test-1', 'topic': 'topic-1', 'resources': ['resource-1', 'resource-2']}
@@ -0,0 +1,21 @@
+from app import get_backend
+from services import file_service
+
+
+def test_an_app_starts_on_a_data_directory_that_does_not_exist_yet(make_app):
+    app = make_app()
+
+    with app.app_context():
+        get_backend().save_subjects(['Maths'])
+    assert app.test_client().get('/').status_code == 200
+
+
+def test_each_app_sizes_its_own_json_cache(make_app):
+    small = make_app(JSON_CACHE_SIZE=2)
+    default = make_app()
+
+    with small.app_context():
+        assert get_backend().files.size == 2
+    with default.app_context():
+        assert get_backend().files.size == file_service.JSON_CACHE_SIZE
+    assert file_service.JSON_CACHE_SIZE == 256
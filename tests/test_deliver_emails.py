@@ -0,0 +1,149 @@
+import socketserver
+import tempfile
+import threading
+import unittest
+
+from app import create_app, deliver_emails
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP for smtplib: refuses recipients at refused.example.com and
+    drops the connection instead of answering the DATA of a message whose body
+    contains DROP.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+
+        self.reply('220 stub ESMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stub')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if 'refused.example.com' in command:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(command)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = b''
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b'.\r\n':
+                        break
+                    body += data_line
+                if b'DROP' in body:
+                    return
+                with server.lock:
+                    server.delivered.append(body)
+                self.reply('250 Queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.delivered = []
+
+
+class DeliverEmailsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubSMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'DATA_DIR': self.data_dir.name,
+            'MAIL_SERVER': '127.0.0.1',
+            'MAIL_PORT': self.server.server_address[1],
+            'MAIL_USE_TLS': False,
+            'MAIL_USERNAME': 'study@example.com',
+            'MAIL_PASSWORD': None,
+            'MAIL_SUPPRESS_SEND': False,
+            'REMINDER_SCHEDULER_ENABLED': False
+        })
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.data_dir.cleanup()
+
+    def deliver(self, messages):
+        with self.app.app_context():
+            return deliver_emails(messages)
+
+    def test_sends_a_batch_over_one_connection(self):
+        results = self.deliver([{'id': i, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': f'<p>{i}</p>'}
+                                for i in range(3)])
+
+        self.assertEqual(results, {0: None, 1: None, 2: None})
+        self.assertEqual(len(self.server.delivered), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_refused_recipient_keeps_the_connection(self):
+        results = self.deliver([
+            {'id': 1, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': '<p>one</p>'},
+            {'id': 2, 'subject': 'Hello', 'recipients': ['nobody@refused.example.com'], 'html': '<p>two</p>'},
+            {'id': 3, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': '<p>three</p>'}
+        ])
+
+        self.assertIsNone(results[1])
+        self.assertIn('nobody@refused.example.com', results[2])
+        self.assertIsNone(results[3])
+        self.assertEqual(len(self.server.delivered), 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_dropped_connection_reconnects_for_the_rest(self):
+        results = self.deliver([
+            {'id': 1, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': '<p>one</p>'},
+            {'id': 2, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': '<p>DROP</p>'},
+            {'id': 3, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': '<p>three</p>'}
+        ])
+
+        self.assertIsNone(results[1])
+        self.assertIsNotNone(results[2])
+        self.assertIsNone(results[3])
+        self.assertEqual(len(self.server.delivered), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_no_connection_fails_every_message(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        results = self.deliver([{'id': i, 'subject': 'Hello', 'recipients': ['me@example.com'], 'html': f'<p>{i}</p>'}
+                                for i in range(3)])
+
+        self.assertEqual(sorted(results), [0, 1, 2])
+        self.assertTrue(all(results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+
+from services import file_service
+
+
+def test_a_rewrite_with_the_same_size_and_mtime_is_not_served_from_the_cache(tmp_path):
+    path = str(tmp_path / 'doc.json')
+    file_service.write_json(path, {'value': 1})
+    stat = os.stat(path)
+    assert file_service.read_json(path) == {'value': 1}
+
+    # An atomic rewrite that lands on the same timestamp and size
+    file_service.write_json(path, {'value': 2})
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.path.getsize(path) == stat.st_size
+    assert file_service.read_json(path) == {'value': 2}
+
+    # An in-place write, keeping the inode
+    stat = os.stat(path)
+    with open(path, 'w') as file:
+        file.write('{"value": 3}')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert file_service.read_json(path) == {'value': 3}
+
+
+def test_cached_documents_can_be_changed_by_the_caller(tmp_path):
+    path = str(tmp_path / 'doc.json')
+    file_service.write_json(path, {'items': [1]})
+
+    file_service.read_json(path)['items'].append(2)
+    assert file_service.read_json(path) == {'items': [1]}
@@ -0,0 +1,40 @@
+import pytest
+
+from app import get_backend
+from services.test_service import build_progress_aggregates
+
+
+def assert_aggregates_match_records(backend):
+    aggregates = dict(backend.load_progress_aggregates('Maths', 'test-1'))
+    aggregates.pop('version', None)
+    records = backend.load_progress_records('Maths', 'test-1')['records']
+    assert aggregates == build_progress_aggregates(records)
+
+
+@pytest.mark.parametrize('backend_name', ['json', 'sqlite'])
+@pytest.mark.parametrize('compact_bytes', [1, 256 * 1024])
+def test_aggregates_follow_the_records(make_app, backend_name, compact_bytes):
+    app = make_app(STORAGE_BACKEND=backend_name, PROGRESS_LOG_COMPACT_BYTES=compact_bytes)
+    with app.app_context():
+        backend = get_backend()
+        backend.save_subjects(['Maths'])
+        backend.save_subject_details('Maths', {'tests': [{'id': 'test-1', 'topics': []}]})
+
+        for i in range(6):
+            backend.append_progress_record('Maths', 'test-1', {
+                'id': f'r{i}', 'resource_id': f'resource-{i % 2}', 'topic_name': 'Equations',
+                'date': f'2030-01-0{i % 3 + 1}', 'score': i * 10, 'study_duration': 5})
+        assert_aggregates_match_records(backend)
+
+        backend.delete_progress_record('Maths', 'test-1', {'id': 'r2', 'resource_id': 'resource-0',
+                                                          'topic_name': 'Equations', 'date': '2030-01-03',
+                                                          'score': 20, 'study_duration': 5})
+        backend.remove_latest_progress_record('Maths', 'test-1', 'resource-1')
+        backend.update_progress_records('Maths', 'test-1', [{'id': 'r9', 'resource_id': 'resource-1'}],
+                                        {'resource-0': 1})
+        assert_aggregates_match_records(backend)
+        assert backend.load_progress_aggregates('Maths', 'test-1')['total'] == 4
+
+        if backend_name == 'json':
+            backend.compact_progress_log('Maths', 'test-1', force=True)
+            assert_aggregates_match_records(backend)
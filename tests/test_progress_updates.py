@@ -0,0 +1,56 @@
+import app as app_module
+from app import get_backend
+
+
+def completed(app, resource_id):
+    with app.app_context():
+        return get_backend().load_progress_aggregates('Maths', 'test-1')['by_resource'].get(resource_id, 0)
+
+
+def test_a_batch_with_a_bad_operation_changes_nothing(app, study_data):
+    response = app.test_client().post('/update-progress-batch', json={'operations': [
+        {'resource_id': 'resource-1', 'change': 1},
+        {'resource_id': 'resource-2', 'change': 1},
+        {'resource_id': 'resource-2', 'change': 1, 'score': 'high'}
+    ]})
+
+    assert response.status_code == 400
+    assert 'Operation 3' in response.get_json()['message']
+    assert completed(app, 'resource-1') == 0
+    assert completed(app, 'resource-2') == 0
+
+
+def test_update_progress_takes_any_integer_change(app, study_data):
+    client = app.test_client()
+
+    # Only the sign counts: one record is added or removed at a time
+    assert client.post('/update-progress', json={'resource_id': 'resource-1', 'change': 2}).status_code == 200
+    assert completed(app, 'resource-1') == 1
+    assert client.post('/update-progress', json={'resource_id': 'resource-1'}).get_json()['success'] is True
+    assert completed(app, 'resource-1') == 1
+    assert client.post('/update-progress', json={'resource_id': 'resource-1', 'change': -5}).status_code == 200
+    assert completed(app, 'resource-1') == 0
+
+    for change in ('1', 1.5, True):
+        response = client.post('/update-progress', json={'resource_id': 'resource-1', 'change': change})
+        assert response.status_code == 400
+
+
+def test_unknown_resources_rebuild_the_index_once_per_request(app, study_data, monkeypatch):
+    with app.test_request_context():
+        app_module.load_resource_index()
+
+    rebuilds = []
+    rebuild_resource_index = app_module.rebuild_resource_index
+
+    def counting_rebuild():
+        rebuilds.append(1)
+        return rebuild_resource_index()
+
+    monkeypatch.setattr(app_module, 'rebuild_resource_index', counting_rebuild)
+    response = app.test_client().post('/update-progress-batch', json={'operations': [
+        {'resource_id': f'missing-{i}', 'change': 1} for i in range(5)
+    ]})
+
+    assert response.get_json()['not_found'] == [f'missing-{i}' for i in range(5)]
+    assert len(rebuilds) == 1
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+
+import app as app_module
+from services.reminders import ReminderSchedule, ReminderScheduler
+
+
+def test_check_upcoming_tests_does_not_start_the_disabled_scheduler(make_app):
+    app = make_app()
+    response = app.test_client().get('/check-upcoming-tests')
+
+    assert response.status_code == 302
+    scheduler = app.extensions['neko_study_quest'].reminder_scheduler
+    assert scheduler is not None
+    assert not scheduler.is_alive()
+
+
+def test_reminders_that_fail_to_send_are_tried_again(make_app, monkeypatch):
+    app = make_app(EMAIL_RECIPIENTS='me@example.com')
+    today = date.today()
+    test_date = today + timedelta(days=3)
+    schedule = ReminderSchedule()
+    schedule.set_subject('Maths', {'t1': {'name': 'Algebra', 'date': test_date.isoformat(),
+                                          'ordinal': test_date.toordinal(), 'required': 4}}, today)
+
+    attempts = []
+
+    def send_email(subject_name, test_name, test_date, progress):
+        attempts.append(test_name)
+        return len(attempts) > 1
+
+    monkeypatch.setattr(app_module, 'send_test_reminder_email', send_email)
+    scheduler = ReminderScheduler(schedule, app_module.send_due_reminders)
+
+    with app.app_context():
+        assert scheduler.check(today) == 0
+        assert scheduler.check(today) == 1
+        assert scheduler.check(today) == 0
+
+    assert attempts == ['Algebra', 'Algebra']
@@ -0,0 +1,44 @@
+import threading
+
+from app import get_backend
+
+
+def session(session_id):
+    return {'session_id': session_id, 'resource_id': 'resource-1', 'duration': 25 * 60 * 1000,
+            'date': '2030-01-01', 'auto_complete': True}
+
+
+def test_a_session_posted_twice_is_recorded_once(app, study_data):
+    client = app.test_client()
+
+    first = client.post('/api/sync-study-sessions', json={'sessions': [session('s1'), session('s1')]}).get_json()
+    assert first['synced'] == ['s1']
+    assert first['duplicates'] == ['s1']
+
+    again = client.post('/api/sync-study-sessions', json={'sessions': [session('s1'), session('s2')]}).get_json()
+    assert again['synced'] == ['s2']
+    assert again['duplicates'] == ['s1']
+
+    with app.app_context():
+        records = get_backend().load_progress_records('Maths', 'test-1')['records']
+    assert sorted(record['id'] for record in records) == ['s1', 's2']
+
+
+def test_concurrent_syncs_of_the_same_sessions_record_them_once(app, study_data):
+    sessions = [session(f's{i}') for i in range(5)]
+    barrier = threading.Barrier(4)
+
+    def sync():
+        client = app.test_client()
+        barrier.wait()
+        client.post('/api/sync-study-sessions', json={'sessions': sessions})
+
+    threads = [threading.Thread(target=sync) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        records = get_backend().load_progress_records('Maths', 'test-1')['records']
+    assert sorted(record['id'] for record in records) == [f's{i}' for i in range(5)]
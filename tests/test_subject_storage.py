@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from app import get_backend
+from services.storage import SubjectExists
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+
+def test_subjects_in_the_flat_layout_are_moved_to_their_own_directory(make_app):
+    app = make_app(STORAGE_BACKEND='json')
+    with app.app_context():
+        backend = get_backend()
+        write_json(os.path.join(backend.details_dir, 'Maths_A.json'), {'tests': [{'id': 't1', 'topics': []}]})
+        write_json(os.path.join(backend.progress_dir, 'Maths_A_t1_progress.json'),
+                   {'records': [{'id': 'r1', 'resource_id': 'resource-1'}]})
+        write_json(os.path.join(backend.progress_dir, 'Maths_A_t2_progress.json'),
+                   {'records': [{'id': 'r2', 'resource_id': 'resource-1'}]})
+
+        assert backend.load_subject_details('Maths A')['tests'][0]['id'] == 't1'
+        assert backend.load_progress_records('Maths A', 't1')['records'] == [{'id': 'r1', 'resource_id': 'resource-1'}]
+        assert backend.load_progress_aggregates('Maths A', 't1')['total'] == 1
+
+        subject_dir = backend.get_subject_dir('Maths A')
+        assert os.path.dirname(subject_dir) == backend.data_dir
+        assert not os.path.exists(os.path.join(backend.details_dir, 'Maths_A.json'))
+
+        # t2 isn't one of the subject's tests, so its file is put aside rather than left behind
+        assert not os.path.exists(os.path.join(backend.progress_dir, 'Maths_A_t1_progress.json'))
+        assert not os.path.exists(os.path.join(backend.progress_dir, 'Maths_A_t2_progress.json'))
+        assert os.path.exists(os.path.join(backend.progress_dir, 'legacy', 'Maths_A_t2_progress.json'))
+
+
+def test_rename_moves_the_subject_data(app, study_data):
+    with app.app_context():
+        backend = get_backend()
+        backend.append_progress_record('Maths', 'test-1', {'id': 'r1', 'resource_id': 'resource-1'})
+
+        backend.rename_subject('Maths', 'Mathematics')
+
+        assert backend.load_subject_details('Maths') is None
+        assert backend.load_subject_details('Mathematics')['tests'][0]['id'] == 'test-1'
+        assert backend.load_progress_aggregates('Mathematics', 'test-1')['total'] == 1
+
+
+def test_rename_does_not_replace_stored_data(app, study_data):
+    with app.app_context():
+        backend = get_backend()
+        backend.save_subject_details('Physics', {'tests': [{'id': 'test-9', 'topics': []}]})
+
+        with pytest.raises(SubjectExists):
+            backend.rename_subject('Maths', 'Physics')
+        assert backend.load_subject_details('Physics')['tests'][0]['id'] == 'test-9'
+        assert backend.load_subject_details('Maths')['tests'][0]['id'] == 'test-1'
+
+    # Physics isn't in the subject list, but the route still refuses
+    response = app.test_client().post('/edit-subject-name', data={
+        'original_subject_name': 'Maths', 'new_subject_name': 'Physics'}, headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert response.get_json()['success'] is False
+    with app.app_context():
+        assert get_backend().load_subjects() == ['Maths']
@@ -0,0 +1,27 @@
+from app import get_backend
+from services import dashboard
+
+
+def test_a_document_that_cannot_be_updated_is_rebuilt_instead_of_failing_the_request(app, study_data, monkeypatch):
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+
+    with app.app_context():
+        backend = get_backend()
+    section_document = dashboard.section_document('Maths')
+    assert backend.load_document(section_document) is not None
+
+    def fail(name, change):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(backend, 'update_document', fail)
+    response = client.post('/update-progress', json={'resource_id': 'resource-1', 'change': 1})
+    monkeypatch.undo()
+
+    # The progress was saved, so the request succeeds; the stale section is dropped
+    assert response.status_code == 200
+    assert backend.load_progress_aggregates('Maths', 'test-1')['total'] == 1
+    assert backend.load_document(section_document) is None
+
+    assert client.get('/').status_code == 200
+    assert dashboard.stored_section(backend.load_document(section_document))['completed'] == 1
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from app import get_backend, get_storage
+from services.storage import VersionConflict
+
+
+def test_a_stale_expected_version_is_refused(app, study_data):
+    with app.app_context():
+        backend = get_backend()
+
+        details = backend.load_subject_details('Maths')
+        backend.save_subject_details('Maths', details, expected_version=details['version'])
+        with pytest.raises(VersionConflict):
+            backend.save_subject_details('Maths', details, expected_version=details['version'] - 1)
+
+        record = {'id': 'r1', 'resource_id': 'resource-1', 'date': '2030-01-01'}
+        backend.update_progress_records('Maths', 'test-1', [record], {}, expected_version=0)
+        with pytest.raises(VersionConflict):
+            backend.update_progress_records('Maths', 'test-1', [dict(record, id='r2')], {}, expected_version=0)
+        with pytest.raises(VersionConflict):
+            backend.save_progress_records('Maths', 'test-1', {'records': []}, expected_version=0)
+        assert backend.load_progress_aggregates('Maths', 'test-1')['total'] == 1
+
+        backend.save_document('notes', {'text': 'one'})
+        with pytest.raises(VersionConflict):
+            backend.save_document('notes', {'text': 'two'}, expected_version=0)
+        assert backend.load_document('notes')['text'] == 'one'
+
+
+def test_lost_aggregates_keep_their_version(make_app):
+    app = make_app(STORAGE_BACKEND='json')
+    with app.app_context():
+        backend = get_backend()
+        backend.save_subjects(['Maths'])
+        backend.save_subject_details('Maths', {'tests': [{'id': 'test-1', 'topics': []}]})
+        for i in range(3):
+            backend.append_progress_record('Maths', 'test-1', {'id': f'r{i}', 'resource_id': 'resource-1'})
+        version = backend.load_progress_aggregates('Maths', 'test-1')['version']
+
+        os.remove(backend.get_progress_aggregates_file('Maths', 'test-1'))
+
+        # A client still holding the old version must not get through
+        assert backend.load_progress_version('Maths', 'test-1') >= version
+        with pytest.raises(VersionConflict):
+            backend.save_progress_records('Maths', 'test-1', {'records': []}, expected_version=version - 1)
+        assert backend.load_progress_aggregates('Maths', 'test-1')['version'] >= version
+
+
+def test_document_changes_are_replayed_on_the_stored_document_at_flush(app):
+    with app.test_request_context():
+        storage = get_storage()
+        storage.update_document('counts', lambda document: {'items': (document or {}).get('items', []) + ['mine']})
+
+        # Another request saves in the meantime
+        get_backend().save_document('counts', {'items': ['theirs']})
+
+        assert storage.flush() == []
+        assert get_backend().load_document('counts')['items'] == ['theirs', 'mine']
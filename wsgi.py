@@ -0,0 +1,15 @@
+"""
+Entry point for production WSGI servers, e.g.
+
+    gunicorn --workers 4 --threads 8 wsgi:app
+
+Each worker process opens its own storage and starts its own background
+threads on first use. Configure the app through the environment (.env);
+PREWARM_CACHES=true loads the data in the background as each worker starts.
+"""
+from app import create_app, ensure_file_structure
+
+app = create_app()
+
+with app.app_context():
+    ensure_file_structure()